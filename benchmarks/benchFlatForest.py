@@ -0,0 +1,50 @@
+"""Compare the time of the flattened Random Forest and of scikit-learn to classify batches of CNVs, with the forest
+parameters of DigCNV. Run from the repository root: python benchmarks/benchFlatForest.py
+"""
+from digcnv.digCnvModel import DigCnvModel
+from digcnv.flatForest import FlatForest
+from sklearn.ensemble import RandomForestClassifier
+import numpy as np
+import time
+
+BATCH_SIZES = [10, 100, 500, 2000, 20000]
+
+
+def timeBest(function, X: np.ndarray, repeats: int = 3) -> tuple:
+    """Give the best time of several calls of a function and its result
+
+    :param function: function called on X
+    :type function: function
+    :param X: features of the CNVs
+    :type X: np.ndarray
+    :param repeats: number of calls, defaults to 3
+    :type repeats: int, optional
+    :return: best time in seconds and result of the function
+    :rtype: tuple
+    """
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(X)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(20000, 6)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] + rng.normal(scale=0.7, size=X.shape[0]) > 0).astype(int)
+    forest = RandomForestClassifier(random_state=0, **DigCnvModel().rf_params).fit(X, y)
+    flat_forest = FlatForest.fromRandomForest(forest)
+    X_test = rng.normal(size=(max(BATCH_SIZES), 6)).astype(np.float32)
+    print("nb_cnvs\tscikit-learn (s)\tflat forest (s)\tratio")
+    for nb_cnvs in BATCH_SIZES:
+        sklearn_time, sklearn_proba = timeBest(forest.predict_proba, X_test[:nb_cnvs])
+        flat_time, flat_proba = timeBest(flat_forest.predictProba, X_test[:nb_cnvs])
+        if not np.allclose(flat_proba, sklearn_proba):
+            raise Exception("Flattened forest and scikit-learn give different probabilities for {} CNVs".format(nb_cnvs))
+        print("{}\t{:.3f}\t{:.3f}\t{:.2f}".format(nb_cnvs, sklearn_time, flat_time, flat_time / sklearn_time))
+
+
+if __name__ == "__main__":
+    main()
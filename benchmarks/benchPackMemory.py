@@ -0,0 +1,88 @@
+"""Measure the memory used by each of several worker processes classifying CNVs with the same model, opened from a pkl file
+or from a model pack. Memory is read from /proc (Linux only). Run from the repository root: python benchmarks/benchPackMemory.py
+"""
+from digcnv.digCnvModel import DigCnvModel
+import multiprocessing
+import pandas as pd
+import numpy as np
+import tempfile
+import os
+
+DIMENSIONS = ["WF", "Score_SNP", "DENSITY", "CallRate", "overlapCNV_SegDup", "TwoAlgs", "Nb_Probe_tech"]
+NB_WORKERS = [1, 4]
+
+
+def createCnvs(nb_cnvs: int, seed: int) -> tuple:
+    """Simulate CNVs and their classes
+
+    :param nb_cnvs: number of CNVs
+    :type nb_cnvs: int
+    :param seed: seed of the random generator
+    :type seed: int
+    :return: dataframe of the CNVs and series of their classes
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    cnvs = pd.DataFrame(rng.normal(size=(nb_cnvs, len(DIMENSIONS))), columns=DIMENSIONS)
+    cnvs["TwoAlgs"] = rng.integers(0, 101, nb_cnvs)
+    classes = pd.Series((cnvs.WF + cnvs.Score_SNP + rng.normal(scale=0.5, size=nb_cnvs) > 0).astype(int))
+    return cnvs, classes
+
+
+def readMemory() -> dict:
+    """Give the resident memory of the process, its proportional share of memory shared with other processes and its private memory
+
+    :return: dictionary of memory sizes in MB
+    :rtype: dict
+    """
+    values = {}
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == "kB":
+                values[fields[0].rstrip(":")] = int(fields[1]) / 1024
+    return {"rss": values["Rss"], "pss": values["Pss"], "private": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def classifyInWorker(model_path: str, barrier, results):
+    """Open the model and classify CNVs, then give the memory added once all workers classified theirs"""
+    # Modules imported by the pkl model are loaded first, so only the memory of the model is measured
+    import sklearn.ensemble, sklearn.svm, sklearn.neighbors  # noqa: F401
+
+    cnvs = createCnvs(2000, seed=1)[0]
+    before = readMemory()
+    model = DigCnvModel()
+    model.openPreTrainedDigCnvModel(model_path)
+    model.predictCnvClasses(cnvs)
+    barrier.wait()
+    after = readMemory()
+    results.put({key: after[key] - before[key] for key in after})
+    # Memory shared with other workers is only measured while they are still alive
+    barrier.wait()
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model = DigCnvModel()
+        model.createDigCnvClassifier()
+        model.trainDigCnvModel(*createCnvs(20000, seed=0), coreset_size=4000)
+        model_paths = {"pkl": os.path.join(tmp_dir, "model.pkl"), "pack": os.path.join(tmp_dir, "pack")}
+        model.saveDigCnvModelToPkl(model_paths["pkl"])
+        model.saveDigCnvModelPack(model_paths["pack"])
+        print("model\tnb_workers\tRSS (MB)\tPSS (MB)\tprivate (MB)")
+        for name, model_path in model_paths.items():
+            for nb_workers in NB_WORKERS:
+                barrier, results = context.Barrier(nb_workers), context.Queue()
+                workers = [context.Process(target=classifyInWorker, args=(model_path, barrier, results)) for _ in range(nb_workers)]
+                for worker in workers:
+                    worker.start()
+                memories = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                print("{}\t{}\t{:.1f}\t{:.1f}\t{:.1f}".format(name, nb_workers, *[np.mean([memory[key] for memory in memories])
+                                                                               for key in ["rss", "pss", "private"]]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,52 @@
 from digcnv.digCNV_logger import logger as dc_logger
 
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
-from os.path import split, join, exists
-from subprocess import Popen, PIPE
+import heapq
+import shutil
+import gzip
+import glob
+import re
+import os
+from os.path import split, join, exists, isdir
+from subprocess import Popen, PIPE, STDOUT
 import pandas as pd
+import numpy as np
+
+# Columns written by the CNVision `--PNformat` and `--QTformat` steps
+CNVISION_FORMAT_COLUMNS = ["FID", "SampleID", "Chr", "Start", "Stop", "Type", "Conf", "NbProbes", "Size", "StartSNP", "StopSNP"]
+
+# Columns of the `Sum_CNVisionMerged` file written by the CNVision `--merge` step
+CNVISION_MERGED_COLUMNS = ["FID", "SampleID", "CHR", "START", "STOP", "Type", "SCORE", "SNP", "Size",
+                           "#Algos", "Algos", "%Three Algs", "TwoAlgs", "%One Alg"]
+
+# Number of lines of a calling output parsed at a time
+PARSE_CHUNK_ROWS = 1 << 18
+
+# Directory backed by RAM where the files of the CNVision steps are written when it has enough room
+RAM_TMP_DIR = "/dev/shm"
+
+# Tags given by CNVision to each calling algorithm (first two letters of the formatted file names)
+CNVISION_ALGORITHM_TAGS = {"PennCNV": "PC", "QuantiSNP": "QS"}
+
+
+def _runCNVisionScript(arguments: list, step_name: str):
+    """Run a step of the CNVision Perl script, streaming its output to the logger line by line as it is printed
+
+    :param arguments: arguments of the CNVision script
+    :type arguments: list
+    :param step_name: name of the step, prefixing its log lines
+    :type step_name: str
+    :raises Exception: If the script fails
+    """
+    this_dir = split(__file__)[0]
+    perl_script = join(this_dir, 'data', "CNVision_format_merge_ukbb.pl")
+    process = Popen(["perl", perl_script] + arguments, stdout=PIPE, stderr=STDOUT, bufsize=1, text=True)
+    # Reading blocks until the script prints a line or exits, the output is never polled
+    for line in process.stdout:
+        dc_logger.info("[{}] {}".format(step_name, line.rstrip()))
+    if process.wait() != 0:
+        raise Exception("CNVision {} step failed with exit code {}".format(step_name, process.returncode))
 
 
 def formatPennCNVforCNVision(pennCNVfile_path: str, output_path: str):
@@ -16,14 +59,7 @@ def formatPennCNVforCNVision(pennCNVfile_path: str, output_path: str):
 
     """
     dc_logger.info("format and filter PennCNV file to CNVision requirements")
-    this_dir = split(__file__)[0]
-    perl_script = join(this_dir, 'data', "CNVision_format_merge_ukbb.pl")
-    proc1 = Popen(["perl", perl_script, "--PNformat", pennCNVfile_path,
-                  output_path, 'tmp'], stdout=PIPE,  bufsize=1, text=True)
-    while proc1.poll() is None:
-        line = proc1.stdout.readline()
-        dc_logger.info(line.rstrip())
-    proc1.wait()
+    _runCNVisionScript(["--PNformat", pennCNVfile_path, output_path, 'tmp'], "PNformat")
     dc_logger.info("PennCNV file formatted for CNVision")
 
 
@@ -36,15 +72,8 @@ def formatQuantiSNPforCNVision(quantiSNP_file_path: str, output_path: str):
     :type output_path: str
     """
     dc_logger.info("format and filter QuantiSNP file to CNVision requirements")
-    this_dir = split(__file__)[0]
-    perl_script = join(this_dir, 'data', "CNVision_format_merge_ukbb.pl")
-    proc1 = Popen(["perl", perl_script, "--QTformat", quantiSNP_file_path,
-                  output_path, 'tmp'], stdout=PIPE, bufsize=1, text=True)
-    while proc1.poll() is None:
-        line = proc1.stdout.readline()
-        dc_logger.info(line.rstrip())
-    proc1.wait()
-    dc_logger.info("PennCNV file formatted for CNVision")
+    _runCNVisionScript(["--QTformat", quantiSNP_file_path, output_path, 'tmp'], "QTformat")
+    dc_logger.info("QuantiSNP file formatted for CNVision")
 
 
 def runMergingScript(formated_data_paths: list, output_path: str):
@@ -55,51 +84,687 @@ def runMergingScript(formated_data_paths: list, output_path: str):
     :param output_path: Pathway where the merged list of CNV will be written with the new algorithm overlap information added.
     :type output_path: str
     """
+    dc_logger.info("merge CNVs formatted for CNVision")
+    _runCNVisionScript(["--merge", formated_data_paths[0], formated_data_paths[1], output_path, 'tmp'], "merge")
+    dc_logger.info("CNVs merged by CNVision")
+
+
+def getHandoffDirectory(input_paths: list):
+    """Give the RAM-backed directory where files of the CNVision steps can be written, if it has room for about three times
+    the size of the inputs (formatted files and merged file). The CNVision script detects the algorithm of a formatted file
+    from its name, so files are handed over by name rather than through pipes.
+
+    :param input_paths: pathways of the calling outputs
+    :type input_paths: list
+    :return: pathway of the RAM-backed directory, None to use the default temporary directory
+    :rtype: str
+    """
+    if not isdir(RAM_TMP_DIR) or not os.access(RAM_TMP_DIR, os.W_OK):
+        return None
+    paths = [path for input_path in input_paths for path in expandCallingOutputPaths(input_path)]
+    # Compressed calling outputs take about five times more room once decompressed
+    needed_bytes = sum((15 if path.lower().endswith(".gz") else 3) * os.path.getsize(path) for path in paths if exists(path))
+    if shutil.disk_usage(RAM_TMP_DIR).free < needed_bytes:
+        dc_logger.info("Not enough room in {} for the CNVision files, the default temporary directory is used".format(RAM_TMP_DIR))
+        return None
+    return RAM_TMP_DIR
+
+
+def isInPARregion(chromosomes: pd.Series, starts: pd.Series, stops: pd.Series) -> np.ndarray:
+    """Flag CNVs overlapping a pseudo-autosomal region of the chromosome X (hg19 coordinates used by CNVision):
+    PAR1 chrX:0-2,699,520, PAR2 chrX:154,931,042-end and PAR3 chrX:88,456,803-92,375,509
+
+    :param chromosomes: chromosome of each CNV, formatted as `chrX`
+    :type chromosomes: pd.Series
+    :param starts: start coordinate of each CNV
+    :type starts: pd.Series
+    :param stops: stop coordinate of each CNV
+    :type stops: pd.Series
+    :return: Boolean array, `True` for CNVs overlapping one of the PAR regions
+    :rtype: np.ndarray
+    """
+    starts = np.asarray(starts)
+    stops = np.asarray(stops)
+    par1 = starts <= 2699520
+    par2 = stops >= 154931042
+    par3 = ((starts >= 88456803) & (starts <= 92375509)) | ((stops >= 88456803) & (stops <= 92375509)) | (
+        (starts < 88456803) & (stops > 92375509))
+    return (np.asarray(chromosomes) == "chrX") & (par1 | par2 | par3)
+
+
+def _formatDistinctValues(values: pd.Series, format_values) -> pd.Series:
+    """Format values having few distinct ones (ex: chromosomes, sample files) once per distinct value"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    formatted = format_values(pd.Series(uniques, dtype=values.dtype))
+    return pd.Series(formatted.to_numpy()[codes], index=values.index, dtype=formatted.dtype)
+
+
+def formatChromosomeNames(chromosomes: pd.Series) -> pd.Series:
+    """Format chromosome names as CNVision does: `chr` prefix, and `M` for the mitochondrial chromosome
+
+    :param chromosomes: list of chromosome names with or without `chr` prefix
+    :type chromosomes: pd.Series
+    :return: list of chromosome names formatted as `chr1`, ..., `chrX`
+    :rtype: pd.Series
+    """
+    def formatNames(names: pd.Series) -> pd.Series:
+        names = names.astype(str).str.strip()
+        names = names.str.replace("MT", "M", case=False, regex=True)
+        return "chr" + names.str.replace("chr", "", case=False, regex=True)
+
+    return _formatDistinctValues(chromosomes, formatNames)
+
+
+def expandCallingOutputPaths(calling_output_paths) -> list:
+    """Give the files of a calling output: a pathway, a glob pattern (ex: `batches/*_PC.txt.gz`) or a list of them.
+    Files matching a pattern are sorted by name.
+
+    :param calling_output_paths: pathway, glob pattern or list of pathways and glob patterns of calling output files
+    :type calling_output_paths: str | list
+    :raises Exception: If a glob pattern matches no file
+    :return: pathways of the calling output files
+    :rtype: list
+    """
+    if isinstance(calling_output_paths, (str, os.PathLike)):
+        calling_output_paths = [calling_output_paths]
+    paths = []
+    for path in calling_output_paths:
+        path = str(path)
+        if glob.has_magic(path):
+            matches = sorted(glob.glob(path))
+            if len(matches) == 0:
+                raise Exception("No calling output file matches {}".format(path))
+            paths.extend(matches)
+        else:
+            paths.append(path)
+    return paths
+
+
+def _parseFilesInParallel(parse_file, paths: list, nb_threads=None) -> list:
+    """Parse files with a pool of threads, the gzip decompression and pandas parser running mostly without the GIL.
+    Parsed files are given in the order of the pathways."""
+    if len(paths) == 1:
+        return [parse_file(paths[0])]
+    nb_threads = min(len(paths), nb_threads or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        return list(executor.map(parse_file, paths))
+
+
+def _removeFieldNames(fields: pd.Series, name_pattern: str) -> pd.Series:
+    """Remove the name of PennCNV fields (ex: `numsnp=`), ignoring its case. The inline flag keeps pandas on its vectorized
+    string kernels where a `case=False` argument falls back to Python."""
+    return fields.str.replace("(?i)" + name_pattern, "", regex=True)
+
+
+def _formatPennCNVChunk(raw: pd.DataFrame) -> pd.DataFrame:
+    """Convert a chunk of PennCNV output lines split in columns into typed CNVision columns, and the sample file of each CNV"""
+    # Locations are split with regular expressions, run by vectorized string kernels unlike `str.split`
+    bounds = raw[0].str.replace(r"^[^:]*:", "", regex=True).str.replace(",", "", regex=False)
+    samples = _formatDistinctValues(raw[4], lambda files: files.str.replace(".Signal.txt", "", case=False, regex=True).str.split("/").str[-1])
+    return pd.DataFrame({
+        "FID": samples,
+        "SampleID": samples,
+        "Chr": formatChromosomeNames(raw[0].str.replace(":.*$", "", regex=True)),
+        "Start": bounds.str.replace("-.*$", "", regex=True).astype(np.int64),
+        "Stop": bounds.str.replace("^[^-]*-", "", regex=True).astype(np.int64),
+        "Type": _removeFieldNames(raw[3], r"state\d+,cn=").astype(np.int64),
+        "Conf": _removeFieldNames(raw[7], "conf=").astype(float),
+        "NbProbes": _removeFieldNames(raw[1], "numsnp=").astype(np.int64),
+        "Size": _removeFieldNames(raw[2], "length=").str.replace(",", "", regex=False).astype(np.int64),
+        "StartSNP": _removeFieldNames(raw[5], "startsnp="),
+        "StopSNP": _removeFieldNames(raw[6], "endsnp="),
+        "SampleFile": raw[4]})
+
+
+def _parsePennCNVFile(path: str) -> pd.DataFrame:
+    """Parse a PennCNV output file chunk by chunk, each chunk being converted to typed columns before the next one is read.
+    An empty file, as PennCNV writes when it calls no CNV, gives no CNV."""
+    try:
+        chunks = [_formatPennCNVChunk(raw) for raw in pd.read_csv(path, sep=r"\s+", header=None, dtype=str, chunksize=PARSE_CHUNK_ROWS)]
+    except pd.errors.EmptyDataError:
+        chunks = []
+    if len(chunks) == 0:
+        return _formatPennCNVChunk(pd.DataFrame({col: pd.Series(dtype=str) for col in range(8)}))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def readPennCNVOutput(pennCNVfile_path, nb_threads=None) -> pd.DataFrame:
+    """Read PennCNV output files and format their CNVs as the CNVision `--PNformat` step does, without writing any file.
+    Files are parsed by chunks straight into typed columns, in parallel, and can be compressed (ex: `.gz`). Several files are read
+    as if they were concatenated. CNVs of copy number 2 overlapping a PAR region of the chromosome X are removed.
+
+    :param pennCNVfile_path: Pathway, glob pattern or list of pathways of the PennCNV output files listing all CNVs with their score. For File format example read README.md page on DigCNV github page.
+    :type pennCNVfile_path: str | list
+    :param nb_threads: maximum number of files parsed at the same time, defaults to None for the number of CPUs
+    :type nb_threads: int, optional
+    :return: CNVs formatted with the CNVision columns (`FID`, `SampleID`, `Chr`, `Start`, `Stop`, `Type`, `Conf`, `NbProbes`, `Size`, `StartSNP`, `StopSNP`)
+    :rtype: pd.DataFrame
+    """
+    dc_logger.info("format and filter PennCNV file to CNVision requirements")
+    formatted = pd.concat(_parseFilesInParallel(_parsePennCNVFile, expandCallingOutputPaths(pennCNVfile_path), nb_threads),
+                          ignore_index=True)
+    # CNVision keeps the order of CNVs within a sample but groups them by sample file
+    formatted = formatted.iloc[np.argsort(pd.factorize(formatted.SampleFile, sort=True)[0], kind="stable")]
+
+    excluded = (formatted.Type.to_numpy() == 2) & isInPARregion(formatted.Chr, formatted.Start, formatted.Stop)
+    formatted = formatted.loc[~excluded, CNVISION_FORMAT_COLUMNS].reset_index(drop=True)
+    dc_logger.info("PennCNV reformatted for {} samples".format(formatted.SampleID.nunique()))
+    return formatted
+
+
+def _formatQuantiSNPChunk(raw: pd.DataFrame) -> pd.DataFrame:
+    """Convert a chunk of QuantiSNP output rows into typed CNVision columns"""
+    chromosomes = raw.iloc[:, 1].str.strip()
+    chromosomes = chromosomes.where(~chromosomes.str.contains("23", regex=False), "X")
+    return pd.DataFrame({
+        "FID": raw.iloc[:, 0],
+        "SampleID": raw.iloc[:, 0],
+        "Chr": formatChromosomeNames(chromosomes),
+        "Start": pd.to_numeric(raw.iloc[:, 2].str.strip()).astype(np.int64),
+        "Stop": pd.to_numeric(raw.iloc[:, 3].str.strip()).astype(np.int64),
+        "Type": pd.to_numeric(raw.iloc[:, 8].str.strip()).astype(np.int64),
+        "Conf": pd.to_numeric(raw.iloc[:, 9].str.strip()).astype(float),
+        "NbProbes": pd.to_numeric(raw.iloc[:, 7].str.strip()).astype(np.int64),
+        "Size": pd.to_numeric(raw.iloc[:, 6].str.strip()).astype(np.int64),
+        "StartSNP": raw.iloc[:, 4],
+        "StopSNP": raw.iloc[:, 5]})
+
+
+def _parseQuantiSNPFile(path: str, min_length: int, min_probes: int, min_score: float) -> tuple:
+    """Parse a QuantiSNP output file chunk by chunk, CNVs failing the quality filters being removed from each chunk
+
+    :return: tuple of the CNVs kept and the set of all samples of the file
+    :rtype: tuple
+    """
+    chunks, samples = [], set()
+    for raw in pd.read_csv(path, sep="\t", dtype=str, chunksize=PARSE_CHUNK_ROWS):
+        samples.update(raw.iloc[:, 0].unique())
+        formatted = _formatQuantiSNPChunk(raw)
+        excluded = (formatted.Size < min_length) | (formatted.NbProbes < min_probes) | (formatted.Conf < min_score)
+        excluded = excluded.to_numpy() | ((formatted.Type.to_numpy() == 2) & isInPARregion(formatted.Chr, formatted.Start, formatted.Stop))
+        chunks.append(formatted[~excluded])
+    if len(chunks) == 0:
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in CNVISION_FORMAT_COLUMNS}), samples
+    return pd.concat(chunks, ignore_index=True), samples
+
+
+def readQuantiSNPOutput(quantiSNP_file_path, min_length=1000, min_probes=3, min_score=15.0, nb_threads=None) -> pd.DataFrame:
+    """Read QuantiSNP output files and format their CNVs as the CNVision `--QTformat` step does, without writing any file.
+    Files are parsed by chunks straight into typed columns, in parallel, and can be compressed (ex: `.gz`). Several files are read
+    as if they were concatenated. CNVs failing the CNVision quality filters or of copy number 2 overlapping a PAR region of the
+    chromosome X are removed.
+
+    :param quantiSNP_file_path: Pathway, glob pattern or list of pathways of the QuantiSNP output files listing all CNVs with their score. For File format example read README.md page on DigCNV github page.
+    :type quantiSNP_file_path: str | list
+    :param min_length: Minimum CNV length in bp, defaults to 1000
+    :type min_length: int, optional
+    :param min_probes: Minimum number of probes in the CNV, defaults to 3
+    :type min_probes: int, optional
+    :param min_score: Minimum Max. Log BF score of the CNV, defaults to 15.0
+    :type min_score: float, optional
+    :param nb_threads: maximum number of files parsed at the same time, defaults to None for the number of CPUs
+    :type nb_threads: int, optional
+    :return: CNVs formatted with the CNVision columns (`FID`, `SampleID`, `Chr`, `Start`, `Stop`, `Type`, `Conf`, `NbProbes`, `Size`, `StartSNP`, `StopSNP`)
+    :rtype: pd.DataFrame
+    """
     dc_logger.info("format and filter QuantiSNP file to CNVision requirements")
-    this_dir = split(__file__)[0]
-    perl_script = join(this_dir, 'data', "CNVision_format_merge_ukbb.pl")
-    proc1 = Popen(["perl", perl_script, "--merge", formated_data_paths[0],
-                  formated_data_paths[1], output_path, 'tmp'], stdout=PIPE, bufsize=1, text=True)
-    while proc1.poll() is None:
-        line = proc1.stdout.readline()
-        dc_logger.info(line.rstrip())
-    proc1.wait()
-    dc_logger.info("PennCNV file formatted for CNVision")
+    parsed_files = _parseFilesInParallel(lambda path: _parseQuantiSNPFile(path, min_length, min_probes, min_score),
+                                         expandCallingOutputPaths(quantiSNP_file_path), nb_threads)
+    formatted = pd.concat([cnvs for cnvs, _ in parsed_files], ignore_index=True)
+    dc_logger.info("QuantiSNP reformatted for {} samples".format(len(set().union(*[samples for _, samples in parsed_files]))))
+    return formatted
+
+
+def _joinFlaggedLabels(masks: np.ndarray, labels: list) -> np.ndarray:
+    """Translate bit masks into the `, ` separated list of labels whose bit is set"""
+    unique_masks, inverse = np.unique(masks, return_inverse=True)
+    joined = np.array([", ".join(label for bit, label in enumerate(labels) if mask >> bit & 1)
+                       for mask in unique_masks], dtype=object)
+    return joined[inverse.reshape(-1)]
 
 
-def mergeMultipleCNVCallingOutputs(list_calling_outputs_path: list, list_calling_softwares: list) -> pd.DataFrame:
-    """Create a dataframe containing merged CNVs comming from the given algorithm outputs. Presently working only with PennCNV and QuantiSNP only.
+def _inferColumnType(column: pd.Series) -> pd.Series:
+    """Give a text column the type pandas would infer when reading it from a file"""
+    try:
+        return pd.to_numeric(column)
+    except (ValueError, TypeError):
+        return column
+
+
+def _prepareFormattedCNVs(cnvs: pd.DataFrame, algo: int) -> pd.DataFrame:
+    """Keep the columns of formatted CNVs used by the merge, with the rank of their algorithm and chromosome names formatted"""
+    cnvs = cnvs.loc[:, ["FID", "SampleID", "Chr", "Start", "Stop", "Type", "Conf", "NbProbes", "Size"]].assign(Algo=algo)
+    cnvs["Chr"] = formatChromosomeNames(cnvs.Chr)
+    return cnvs
+
+
+def _getMergeKeys(cnvs: pd.DataFrame) -> tuple:
+    """Give the keys CNVs are merged by: sample and chromosome, both case insensitive, and start"""
+    return (cnvs.SampleID.astype(str).str.lower().to_numpy(dtype=object), cnvs.Chr.astype(str).str.lower().to_numpy(dtype=object),
+            cnvs.Start.to_numpy(dtype=np.int64))
+
+
+def _getMergeOrder(sample_keys: np.ndarray, chr_keys: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Give the order of CNVs sorted by their merge keys, keeping input order for ties"""
+    sample_codes = pd.factorize(sample_keys, sort=True)[0]
+    chr_codes = pd.factorize(chr_keys, sort=True)[0]
+    return np.lexsort((starts, chr_codes, sample_codes))
+
+
+def _getNewLoci(sample_keys: np.ndarray, chr_keys: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Flag the sorted CNVs starting a new locus: a new sample, chromosome or a CNV starting after all previous CNVs of the locus"""
+    new_block = np.ones(starts.shape[0], dtype=bool)
+    new_block[1:] = (sample_keys[1:] != sample_keys[:-1]) | (chr_keys[1:] != chr_keys[:-1])
+    block_max_stop = pd.Series(stops).groupby(np.cumsum(new_block)).cummax().to_numpy()
+    new_locus = new_block.copy()
+    new_locus[1:] |= starts[1:] > block_max_stop[:-1]
+    return new_locus
+
+
+def _mergeSortedCNVs(cnvs: pd.DataFrame, sorted_tags: list, caller_overlaps=False) -> pd.DataFrame:
+    """Merge CNVs prepared by `_prepareFormattedCNVs` and sorted by their merge keys into loci"""
+    sample_keys, chr_keys, starts = _getMergeKeys(cnvs)
+    stops = cnvs.Stop.to_numpy(dtype=np.int64)
+    nb_cnvs = cnvs.shape[0]
+    nb_tags = len(sorted_tags)
+    # CNVision allows up to two calls on a section, more callers allow one call of each
+    max_calls = max(2, nb_tags)
+
+    new_locus = _getNewLoci(sample_keys, chr_keys, starts, stops)
+    locus_ids = np.cumsum(new_locus) - 1
+    locus_firsts = np.flatnonzero(new_locus)
+    locus_lasts = np.append(locus_firsts[1:], nb_cnvs) - 1
+    nb_loci = locus_firsts.shape[0]
+    locus_sizes = np.diff(np.append(locus_firsts, nb_cnvs))
+
+    types = cnvs.Type.to_numpy()
+    type_values, type_codes = np.unique(types, return_inverse=True)
+    type_codes = type_codes.reshape(-1)
+    loci = pd.DataFrame({
+        "FID": cnvs.FID.to_numpy()[locus_lasts],
+        "SampleID": cnvs.SampleID.to_numpy()[locus_lasts],
+        "CHR": cnvs.Chr.to_numpy()[locus_lasts],
+        "START": np.minimum.reduceat(np.minimum(starts, stops), locus_firsts),
+        "STOP": np.maximum.reduceat(np.maximum(starts, stops), locus_firsts),
+        "Type": _joinFlaggedLabels(np.bitwise_or.reduceat(np.left_shift(1, type_codes), locus_firsts),
+                                   [str(value) for value in type_values]),
+        "SCORE": np.maximum.reduceat(cnvs.Conf.to_numpy(dtype=float), locus_firsts),
+        "SNP": np.maximum.reduceat(cnvs.NbProbes.to_numpy(dtype=np.int64), locus_firsts),
+        "Size": cnvs.Size.to_numpy(dtype=np.int64)[locus_firsts]})
+    loci.loc[locus_sizes > 1, "Size"] = (loci.STOP - loci.START)[locus_sizes > 1]
+
+    # Loci made of a single CNV are covered by one call along their whole size
+    three_algs = np.zeros(nb_loci, dtype=np.int64)
+    two_algs = np.zeros(nb_loci, dtype=np.int64)
+    one_alg = loci.Size.to_numpy(dtype=np.int64).copy()
+    max_algs = np.ones(nb_loci, dtype=np.int64)
+    locus_algos = cnvs.Algo.to_numpy()[locus_firsts]
+    algos_masks = np.left_shift(1, locus_algos)
+    caller_covered = np.zeros((nb_loci, nb_tags), dtype=np.int64)
+    caller_covered[np.arange(nb_loci), locus_algos] = one_alg
+    has_sections = np.ones(nb_loci, dtype=bool)
+
+    multiple = locus_sizes[locus_ids] > 1
+    if multiple.any():
+        # Sweep the boundaries of the CNVs of each locus: +1 call at each start and -1 at each stop
+        nb_multiple = int(multiple.sum())
+        point_loci = np.concatenate([locus_ids[multiple], locus_ids[multiple]])
+        point_coords = np.concatenate([starts[multiple], stops[multiple]])
+        point_deltas = np.zeros((2 * nb_multiple, nb_tags), dtype=np.int64)
+        point_algos = np.concatenate([cnvs.Algo.to_numpy()[multiple]] * 2)
+        point_deltas[np.arange(2 * nb_multiple), point_algos] = np.repeat([1, -1], nb_multiple)
+        point_order = np.lexsort((point_coords, point_loci))
+        point_loci = point_loci[point_order]
+        point_coords = point_coords[point_order]
+        new_point = np.ones(point_loci.shape[0], dtype=bool)
+        new_point[1:] = (point_loci[1:] != point_loci[:-1]) | (point_coords[1:] != point_coords[:-1])
+        point_firsts = np.flatnonzero(new_point)
+        # Boundaries of a locus sum to zero so the cumulative sum never leaks from one locus to the next
+        active = np.cumsum(np.add.reduceat(point_deltas[point_order], point_firsts, axis=0), axis=0)
+        point_loci = point_loci[point_firsts]
+        point_coords = point_coords[point_firsts]
+
+        # A section goes from one boundary to the next within the same locus
+        is_section = np.zeros(point_loci.shape[0], dtype=bool)
+        is_section[:-1] = point_loci[1:] == point_loci[:-1]
+        section_loci = point_loci[is_section]
+        section_sizes = (np.roll(point_coords, -1) - point_coords)[is_section]
+        section_calls = active.sum(axis=1)[is_section]
+        section_callers = active[is_section] > 0
+        section_algos = (section_callers * np.left_shift(1, np.arange(nb_tags))).sum(axis=1)
+        if (section_calls > max_calls).any():
+            raise Exception("A problem was encountered while merging CNVs, it recognised {} algo, the maximum is {}.".format(
+                section_calls.max(), max_calls))
+
+        multiple_loci = np.flatnonzero(locus_sizes > 1)
+        has_sections[multiple_loci] = False
+        has_sections[section_loci] = True
+        three_algs[multiple_loci] = 0
+        two_algs[multiple_loci] = 0
+        one_alg[multiple_loci] = 0
+        caller_covered[multiple_loci] = 0
+        three_algs += np.bincount(section_loci, weights=section_sizes * (section_calls >= 3),
+                                  minlength=nb_loci).astype(np.int64)
+        two_algs += np.bincount(section_loci, weights=section_sizes * (section_calls == 2),
+                                minlength=nb_loci).astype(np.int64)
+        one_alg += np.bincount(section_loci, weights=section_sizes * (section_calls == 1),
+                               minlength=nb_loci).astype(np.int64)
+        for algo in range(nb_tags):
+            caller_covered[:, algo] += np.bincount(section_loci, weights=section_sizes * section_callers[:, algo],
+                                                   minlength=nb_loci).astype(np.int64)
+        # The algorithms reported are those of the last section having the highest number of calls
+        section_firsts = np.flatnonzero(np.append(True, section_loci[1:] != section_loci[:-1]))
+        locus_max = np.maximum.reduceat(section_calls, section_firsts)
+        section_max = np.repeat(locus_max, np.diff(np.append(section_firsts, section_loci.shape[0])))
+        last_max = np.maximum.reduceat(np.where(section_calls == section_max, np.arange(section_loci.shape[0]), -1),
+                                       section_firsts)
+        max_algs[section_loci[section_firsts]] = locus_max
+        algos_masks[section_loci[section_firsts]] = section_algos[last_max]
+
+    loci_sizes = loci.Size.to_numpy(dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent_three = np.where(loci_sizes > 0, np.trunc(three_algs / loci_sizes * 100), 0).astype(np.int64)
+        percent_two = np.where(loci_sizes > 0, np.trunc(two_algs / loci_sizes * 100), 0).astype(np.int64)
+        percent_one = np.where(loci_sizes > 0, np.trunc(one_alg / loci_sizes * 100), 0).astype(np.int64)
+        caller_fractions = np.where(loci_sizes[:, None] > 0, caller_covered / loci_sizes[:, None], 0.0)
+    loci["#Algos"] = max_algs
+    loci["Algos"] = _joinFlaggedLabels(algos_masks, sorted_tags)
+    loci["%Three Algs"] = pd.Series(percent_three).astype(str) + "%"
+    loci["TwoAlgs"] = percent_two
+    loci["%One Alg"] = pd.Series(percent_one).astype(str) + "%"
+    if caller_overlaps:
+        for algo, tag in enumerate(sorted_tags):
+            loci[getCallerOverlapColumn(tag)] = caller_fractions[:, algo]
+    return loci[has_sections].reset_index(drop=True)
+
+
+def getCallerOverlapColumn(algorithm_tag: str) -> str:
+    """Give the name of the column of merged loci giving the fraction of the locus covered by an algorithm, ex: `Overlap_PC`
+
+    :param algorithm_tag: tag of the calling algorithm
+    :type algorithm_tag: str
+    :return: name of the column
+    :rtype: str
+    """
+    return "Overlap_{}".format(algorithm_tag)
+
+
+def mergeFormattedCNVs(formatted_cnvs: list, algorithm_tags: list, caller_overlaps=False) -> pd.DataFrame:
+    """Merge CNVs formatted for CNVision and coming from multiple calling algorithms, as the CNVision `--merge` step does.
+    CNVs are sorted once by sample, chromosome and start, then overlapping CNVs of a same sample and chromosome are grouped
+    into loci. Each locus is cut into sections between consecutive CNV boundaries to compute the part of the locus
+    covered by two calls (`TwoAlgs`), three calls or more (`%Three Algs`) and by each algorithm.
+
+    :param formatted_cnvs: list of CNV dataframes formatted with the CNVision columns, one by calling algorithm
+    :type formatted_cnvs: list
+    :param algorithm_tags: list of algorithm tags (ex: `PC`, `QS`) given in the same order as the list of dataframes
+    :type algorithm_tags: list
+    :param caller_overlaps: add the fraction of each locus covered by each algorithm in `Overlap_<tag>` columns, defaults to False
+    :type caller_overlaps: bool, optional
+    :raises Exception: If two given list haven't same sizes
+    :raises Exception: If a section of a locus is covered by more calls than algorithms (three calls or more with two algorithms)
+    :return: Dataframe containing all merged loci with the `Sum_CNVisionMerged` columns
+    :rtype: pd.DataFrame
+    """
+    if len(formatted_cnvs) != len(algorithm_tags):
+        raise Exception("Both list must have same sizes")
+    dc_logger.info("Merge CNVs coming from {}".format(", ".join(algorithm_tags)))
+    # Algorithms are identified by their rank in alphabetical order, as they are listed in the `Algos` column
+    sorted_tags = sorted(set(algorithm_tags))
+    cnvs = pd.concat([_prepareFormattedCNVs(cnvs, sorted_tags.index(tag)) for cnvs, tag in zip(formatted_cnvs, algorithm_tags)],
+                     ignore_index=True)
+    if cnvs.shape[0] == 0:
+        columns = CNVISION_MERGED_COLUMNS + ([getCallerOverlapColumn(tag) for tag in sorted_tags] if caller_overlaps else [])
+        return pd.DataFrame(columns=columns)
+
+    cnvs = cnvs.iloc[_getMergeOrder(*_getMergeKeys(cnvs))].reset_index(drop=True)
+    loci = _mergeSortedCNVs(cnvs, sorted_tags, caller_overlaps=caller_overlaps)
+    for col in ["FID", "SampleID", "Type"]:
+        loci[col] = _inferColumnType(loci[col])
+    dc_logger.info("{} CNVs merged into {} loci".format(cnvs.shape[0], loci.shape[0]))
+    return loci
+
+
+def sortFormattedCNVs(cnvs: pd.DataFrame) -> pd.DataFrame:
+    """Sort CNVs formatted for CNVision in the order `mergeSortedCNVStreams` reads them: by sample, chromosome (both case insensitive,
+    chromosomes named as `formatChromosomeNames` does) and start
+
+    :param cnvs: CNVs formatted with the CNVision columns
+    :type cnvs: pd.DataFrame
+    :return: the sorted CNVs
+    :rtype: pd.DataFrame
+    """
+    chromosomes = formatChromosomeNames(cnvs.Chr) if cnvs.shape[0] > 0 else cnvs.Chr
+    order = _getMergeOrder(cnvs.SampleID.astype(str).str.lower().to_numpy(dtype=object),
+                           chromosomes.astype(str).str.lower().to_numpy(dtype=object), cnvs.Start.to_numpy(dtype=np.int64))
+    return cnvs.iloc[order].reset_index(drop=True)
+
+
+def _iterCNVChunks(cnv_stream, chunk_rows: int):
+    """Iterate over the non empty dataframes of a stream, a single dataframe being cut into chunks"""
+    if isinstance(cnv_stream, pd.DataFrame):
+        chunks = (cnv_stream.iloc[start:start + chunk_rows] for start in range(0, cnv_stream.shape[0], chunk_rows))
+    else:
+        chunks = cnv_stream
+    for chunk in chunks:
+        if chunk.shape[0] > 0:
+            yield chunk
+
+
+def _splitCompleteLoci(pending: pd.DataFrame, frontier) -> tuple:
+    """Split sorted pending CNVs into the loci no CNV still to read can join, and the others. Every CNV still to read has
+    merge keys greater or equal to the frontier, `None` once all streams are read."""
+    if frontier is None:
+        return pending, pending.iloc[:0]
+    sample_keys, chr_keys, starts = _getMergeKeys(pending)
+    stops = pending.Stop.to_numpy(dtype=np.int64)
+    new_locus = _getNewLoci(sample_keys, chr_keys, starts, stops)
+    locus_firsts = np.flatnonzero(new_locus)
+    locus_max_stops = np.maximum.reduceat(stops, locus_firsts)
+    locus_samples, locus_chrs = sample_keys[locus_firsts], chr_keys[locus_firsts]
+    frontier_sample, frontier_chr, frontier_start = frontier
+    # A CNV joins a locus if it starts before the locus end, loci sorted before the frontier sample and chromosome are complete
+    complete = ((locus_samples < frontier_sample) | ((locus_samples == frontier_sample) & (locus_chrs < frontier_chr)) |
+                ((locus_samples == frontier_sample) & (locus_chrs == frontier_chr) & (locus_max_stops < frontier_start)))
+    nb_complete = int(np.argmin(complete)) if not complete.all() else locus_firsts.shape[0]
+    nb_rows = locus_firsts[nb_complete] if nb_complete < locus_firsts.shape[0] else pending.shape[0]
+    return pending.iloc[:nb_rows], pending.iloc[nb_rows:]
+
+
+def mergeSortedCNVStreams(cnv_streams: list, algorithm_tags: list, caller_overlaps=True, chunk_rows=PARSE_CHUNK_ROWS):
+    """Merge CNVs of any number of calling algorithms in one pass, each algorithm giving a stream of CNVs already sorted as
+    `sortFormattedCNVs` does. Chunks of the streams are read in order of their last CNV using a heap, and loci are merged as soon
+    as no CNV still to read can join them, so memory is bound by the chunks read and the largest locus instead of the whole cohort.
+    Loci are the same as `mergeFormattedCNVs` gives, in the same order.
+
+    :param cnv_streams: list of CNV streams formatted with the CNVision columns, one by calling algorithm. A stream is a dataframe
+        or an iterable of dataframes (ex: chunks of a file)
+    :type cnv_streams: list
+    :param algorithm_tags: list of algorithm tags (ex: `PC`, `QS`, `IP`) given in the same order as the list of streams
+    :type algorithm_tags: list
+    :param caller_overlaps: add the fraction of each locus covered by each algorithm in `Overlap_<tag>` columns, defaults to True
+    :type caller_overlaps: bool, optional
+    :param chunk_rows: number of CNVs read at a time from streams given as dataframes, defaults to PARSE_CHUNK_ROWS
+    :type chunk_rows: int, optional
+    :raises Exception: If two given list haven't same sizes
+    :raises Exception: If a stream isn't sorted
+    :raises Exception: If a section of a locus is covered by more calls than algorithms
+    :yield: dataframes of merged loci with the `Sum_CNVisionMerged` columns, `FID`, `SampleID` and `Type` kept as text
+    :rtype: Iterator[pd.DataFrame]
+    """
+    if len(cnv_streams) != len(algorithm_tags):
+        raise Exception("Both list must have same sizes")
+    dc_logger.info("Merge CNV streams coming from {}".format(", ".join(algorithm_tags)))
+    sorted_tags = sorted(set(algorithm_tags))
+    chunk_iterators = [_iterCNVChunks(stream, chunk_rows) for stream in cnv_streams]
+    nb_read = [0] * len(cnv_streams)
+
+    def readChunk(stream: int):
+        """Read the next chunk of a stream, with the rank of its algorithm and the position of its CNVs in the stream"""
+        chunk = next(chunk_iterators[stream], None)
+        if chunk is None:
+            return None, None, None
+        chunk = _prepareFormattedCNVs(chunk, sorted_tags.index(algorithm_tags[stream]))
+        chunk["Stream"] = stream
+        chunk["Position"] = np.arange(nb_read[stream], nb_read[stream] + chunk.shape[0])
+        keys = _getMergeKeys(chunk)
+        if (_getMergeOrder(*keys) != np.arange(chunk.shape[0])).any():
+            raise Exception("CNVs of {} aren't sorted by sample, chromosome and start".format(algorithm_tags[stream]))
+        nb_read[stream] += chunk.shape[0]
+        return chunk, (keys[0][0], keys[1][0], keys[2][0]), (keys[0][-1], keys[1][-1], keys[2][-1])
+
+    # Heap of the last CNV read from each stream, the stream whose last CNV is the smallest is read next
+    heap, pending = [], []
+    for stream in range(len(cnv_streams)):
+        chunk, _, last_key = readChunk(stream)
+        if chunk is not None:
+            pending.append(chunk)
+            heapq.heappush(heap, (last_key, stream))
+    pending = pd.concat(pending, ignore_index=True) if len(pending) > 0 else None
+    nb_cnvs, nb_loci = 0, 0
+    while len(heap) > 0:
+        last_key, stream = heapq.heappop(heap)
+        chunk, first_key, chunk_last_key = readChunk(stream)
+        if chunk is not None:
+            if first_key < last_key:
+                raise Exception("CNVs of {} aren't sorted by sample, chromosome and start".format(algorithm_tags[stream]))
+            pending = pd.concat([pending, chunk], ignore_index=True)
+            heapq.heappush(heap, (chunk_last_key, stream))
+        # Ties are kept in the order of the streams then of the CNVs in their stream
+        sample_keys, chr_keys, starts = _getMergeKeys(pending)
+        order = np.lexsort((pending.Position.to_numpy(), pending.Stream.to_numpy(), starts,
+                            pd.factorize(chr_keys, sort=True)[0], pd.factorize(sample_keys, sort=True)[0]))
+        pending = pending.iloc[order].reset_index(drop=True)
+        complete, pending = _splitCompleteLoci(pending, heap[0][0] if len(heap) > 0 else None)
+        pending = pending.reset_index(drop=True)
+        if complete.shape[0] > 0:
+            loci = _mergeSortedCNVs(complete, sorted_tags, caller_overlaps=caller_overlaps)
+            nb_cnvs, nb_loci = nb_cnvs + complete.shape[0], nb_loci + loci.shape[0]
+            yield loci
+    dc_logger.info("{} CNVs merged into {} loci".format(nb_cnvs, nb_loci))
+
+
+def _getPennCNVLineSample(line: str) -> str:
+    """Give the sample of a PennCNV output line, as `readPennCNVOutput` reads it"""
+    return re.sub(".Signal.txt", "", line.split()[4], flags=re.IGNORECASE).split("/")[-1]
+
+
+def _getQuantiSNPLineSample(line: str) -> str:
+    """Give the sample of a QuantiSNP output line, as `readQuantiSNPOutput` reads it"""
+    return line.split("\t", 1)[0]
+
+
+def _openCallingOutput(path: str):
+    """Open a calling output file as text, decompressing gzip files"""
+    if str(path).lower().endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def readCallingOutputLines(calling_output_path, calling_software: str) -> tuple:
+    """Read the raw lines of calling outputs with the sample of each CNV line, to split them by sample without formatting their CNVs.
+    Several files are read as if they were concatenated, gzip files are decompressed and blank lines are skipped.
+
+    :param calling_output_path: Pathway, glob pattern or list of pathways of the calling output files
+    :type calling_output_path: str | list
+    :param calling_software: {`PennCNV`, `QuantiSNP`} calling algorithm of the files
+    :type calling_software: str
+    :raises Exception: If the calling algorithm name isn't supported
+    :return: tuple of the header line (`None` for PennCNV outputs, without header), the list of CNV lines and the list of their samples
+    :rtype: tuple
+    """
+    if calling_software not in CNVISION_ALGORITHM_TAGS:
+        raise Exception(
+            "Given calling software: {} in't support by the software please contact us if you want to add this software".format(calling_software))
+    header, lines = None, []
+    for path in expandCallingOutputPaths(calling_output_path):
+        with _openCallingOutput(path) as f:
+            file_lines = [line if line.endswith("\n") else line + "\n" for line in f if line.strip() != ""]
+        # Each QuantiSNP file starts with its header
+        if calling_software == "QuantiSNP" and len(file_lines) > 0:
+            header, file_lines = file_lines[0], file_lines[1:]
+        lines.extend(file_lines)
+    if calling_software == "PennCNV":
+        return None, lines, [_getPennCNVLineSample(line) for line in lines]
+    return header, lines, [_getQuantiSNPLineSample(line) for line in lines]
+
+
+def writePlainCallingOutput(calling_output_path, calling_software: str, output_path: str) -> str:
+    """Write calling outputs, which can be compressed or split in several files, to a single uncompressed file
+
+    :param calling_output_path: Pathway, glob pattern or list of pathways of the calling output files
+    :type calling_output_path: str | list
+    :param calling_software: {`PennCNV`, `QuantiSNP`} calling algorithm of the files
+    :type calling_software: str
+    :param output_path: Pathway of the uncompressed file
+    :type output_path: str
+    :return: Pathway of the uncompressed file
+    :rtype: str
+    """
+    header, lines, _ = readCallingOutputLines(calling_output_path, calling_software)
+    with open(output_path, "w") as f:
+        if header is not None:
+            f.write(header)
+        f.writelines(lines)
+    return output_path
+
+
+def mergeMultipleCNVCallingOutputs(list_calling_outputs_path: list, list_calling_softwares: list, engine="python") -> pd.DataFrame:
+    """Create a dataframe containing merged CNVs comming from the given algorithm outputs. Presently working only with PennCNV and QuantiSNP only,
+    CNVs of other calling algorithms formatted with the CNVision columns can be merged with `mergeSortedCNVStreams`.
     Please indicate the list of pathway and the list of algorithm names in the same order.
 
     :param list_calling_outputs_path: list of calling output pathways
     :type list_calling_outputs_path: list_calling_outputs_path: list
     :param list_calling_softwares: {`PennCNV`, `QuantiSNP`} list of calling algorithm names, indicated in the same order as the list of pathways 
     :type list_calling_softwares: list_calling_softwares: list
+    :param engine: {`python`, `perl`} merge engine, `python` merges CNVs in memory while `perl` runs the original CNVision script, defaults to `python`
+    :type engine: str, optional
     :returns: Dataframe containing all CNVs coming from all caller outputs merged and with their overlap annotated
     :rtype: pd.DataFrame
     :raises Exception: If two given list haven't same sizes
     :raises Exception: If the calling algorithm name isn't supported
+    :raises Exception: If the merge engine isn't supported
 
     """
     if len(list_calling_outputs_path) != len(list_calling_softwares):
         raise Exception("Both list must have same sizes")
-    list_tmp_paths = []
-    with tempfile.TemporaryDirectory() as tmp_dir:
+    for calling_soft in list_calling_softwares:
+        if calling_soft not in CNVISION_ALGORITHM_TAGS:
+            raise Exception(
+                "Given calling software: {} in't support by the software please contact us if you want to add this software".format(calling_soft))
+    if engine == "python":
+        formatted_cnvs = []
         for i, calling_soft in enumerate(list_calling_softwares):
             if calling_soft == 'PennCNV':
-                formatPennCNVforCNVision(list_calling_outputs_path[i], tmp_dir)
-                if exists(join(tmp_dir, 'PC_tmp_CNVisionFormated.txt')):
-                    list_tmp_paths.append(
-                        join(tmp_dir, 'PC_tmp_CNVisionFormated.txt'))
+                formatted_cnvs.append(readPennCNVOutput(list_calling_outputs_path[i]))
             elif calling_soft == 'QuantiSNP':
-                formatQuantiSNPforCNVision(
-                    list_calling_outputs_path[i], tmp_dir)
-                if exists(join(tmp_dir, 'QS_tmp_CNVisionFormated.txt')):
-                    list_tmp_paths.append(
-                        join(tmp_dir, 'QS_tmp_CNVisionFormated.txt'))
-            else:
-                raise Exception(
-                    "Given calling software: {} in't support by the software please contact us if you want to add this software".format(calling_soft))
+                formatted_cnvs.append(readQuantiSNPOutput(list_calling_outputs_path[i]))
+        return mergeFormattedCNVs(formatted_cnvs, [CNVISION_ALGORITHM_TAGS[soft] for soft in list_calling_softwares])
+    elif engine != "perl":
+        raise Exception("Given merge engine: {} isn't supported, use `python` or `perl`".format(engine))
+
+    format_steps = {"PennCNV": formatPennCNVforCNVision, "QuantiSNP": formatQuantiSNPforCNVision}
+    # Checked before any format step starts, a missing step would only fail inside its worker thread
+    for calling_soft in list_calling_softwares:
+        if calling_soft not in format_steps:
+            raise Exception("Given calling software: {} isn't supported by the perl merge engine, use the python engine".format(calling_soft))
+    with tempfile.TemporaryDirectory(dir=getHandoffDirectory(list_calling_outputs_path)) as tmp_dir:
+        # The Perl script only reads single uncompressed files
+        list_calling_outputs_path = list(list_calling_outputs_path)
+        for i, calling_soft in enumerate(list_calling_softwares):
+            paths = expandCallingOutputPaths(list_calling_outputs_path[i])
+            if len(paths) > 1 or paths[0].lower().endswith(".gz"):
+                list_calling_outputs_path[i] = writePlainCallingOutput(paths, calling_soft, join(tmp_dir, "{}_input.txt".format(calling_soft)))
+        # Format steps of the callers are independent, each Perl process runs in its own thread
+        with ThreadPoolExecutor(max_workers=len(list_calling_softwares)) as executor:
+            format_jobs = [executor.submit(format_steps[calling_soft], list_calling_outputs_path[i], tmp_dir)
+                           for i, calling_soft in enumerate(list_calling_softwares)]
+            for job in format_jobs:
+                job.result()
+        list_tmp_paths = [join(tmp_dir, '{}_tmp_CNVisionFormated.txt'.format(CNVISION_ALGORITHM_TAGS[calling_soft]))
+                          for calling_soft in list_calling_softwares]
+        list_tmp_paths = [path for path in list_tmp_paths if exists(path)]
         runMergingScript(list_tmp_paths, tmp_dir)
         CNVs_list = pd.read_csv(
             join(tmp_dir, 'Sum_CNVisionMerged_PC_QS_tmp.txt'), sep='\t')
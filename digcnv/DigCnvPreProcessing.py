@@ -1,9 +1,5 @@
 from digcnv import digCNV_logger
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from imblearn.over_sampling import SMOTE
-from imblearn.under_sampling import RandomUnderSampler
-from imblearn.pipeline import Pipeline
 
 
 def createTrainingTestingDatasets(cnvs:pd.DataFrame, dimensions:list, X_dimension:str, all_data_set=False) -> tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]:
@@ -21,6 +17,8 @@ def createTrainingTestingDatasets(cnvs:pd.DataFrame, dimensions:list, X_dimensio
     :return: A tuple containing 4 objects, the training dataframe and classes in first part and the testing dataframe and classes in second part
     :rtype: tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]
     """
+    from sklearn.model_selection import train_test_split
+
     data = cnvs.loc[:,dimensions + [X_dimension]]
     if all_data_set:
         X_train = data.drop(columns=[X_dimension])
@@ -53,6 +51,10 @@ def uniformizeClassesSizes(X_train:pd.DataFrame, y_train:pd.Series, k_neighbors:
     :return: a tuple containing a dataframe and a series with more balanced classes
     :rtype: tuple[pd.DataFrame, pd.Series]
     """    
+    from imblearn.over_sampling import SMOTE
+    from imblearn.under_sampling import RandomUnderSampler
+    from imblearn.pipeline import Pipeline
+
     digCNV_logger.logger.info("\nTraining dataset classes\n{}".format(y_train.value_counts()))
     over = SMOTE(sampling_strategy=over_sampling, k_neighbors = k_neighbors, random_state=42)
     under = RandomUnderSampler(sampling_strategy=under_sampling, random_state=42)
@@ -1,11 +1,14 @@
-import matplotlib.pyplot as plt
+from __future__ import annotations
+
 import time
 import pandas as pd
+from typing import TYPE_CHECKING
 from digcnv import digCNV_logger
 
-from sklearn.base import BaseEstimator
-from sklearn.experimental import enable_halving_search_cv
-from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV
+# matplotlib and scikit-learn model selection (including the experimental halving search) are imported by the functions using them
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    from sklearn.base import BaseEstimator
 
 def evaluate_param(model:BaseEstimator, parameter:str, X_train:pd.DataFrame, y_train:pd.Series, num_range:list, index:int, validation_score:str) -> tuple[plt.plot, pd.DataFrame]:
     """Plot estimator performance when variating the hyperparameter value
@@ -27,6 +30,9 @@ def evaluate_param(model:BaseEstimator, parameter:str, X_train:pd.DataFrame, y_t
     :return: return two object, first a plot representing model performace based on hyperparamater value, second a dataframe representing these data.
     :rtype: tuple[plt.plot, pd.DataFrame]
     """    
+    import matplotlib.pyplot as plt
+    from sklearn.model_selection import GridSearchCV
+
     grid_search = GridSearchCV(model, param_grid = {parameter: num_range}, n_jobs = -1, scoring = validation_score)
     grid_search.fit(X_train, y_train)
     df = {}
@@ -56,6 +62,8 @@ def evaluateHyperparameterIndividually(model:BaseEstimator, param_dict:dict, X_t
     :param validation_score: Validation score used to evaluate model performance. must be a validation score available in scikit-learn package (`https://scikit-learn.org/stable/modules/model_evaluation.html#scoring-parameter`)
     :type validation_score: str
     """    
+    import matplotlib.pyplot as plt
+
     start_time = time.time()
     index = 1
     plt.figure(figsize=(16,12))
@@ -81,6 +89,9 @@ def evaluateHyperparameterGrid(X_train:pd.DataFrame, y_train:pd.Series, model:Ba
     :return: Dictionnary containing each hyperparameters with and their best values 
     :rtype: dict
     """    
+    from sklearn.experimental import enable_halving_search_cv
+    from sklearn.model_selection import HalvingGridSearchCV
+
     start_time = time.time()
     grid_search = HalvingGridSearchCV(estimator = model, param_grid = param_grid, min_resources=100,
                               cv = 5, n_jobs = -1, verbose = 0, scoring = validation_score, random_state=42)
@@ -1,64 +1,116 @@
 from os.path import split, join
 import pandas as pd
+import argparse
 import sys
-from sklearn import preprocessing
 
 from digcnv import utils
-from digcnv import CNVision
-from digcnv import dataPreparation
-from digcnv import dataVerif
-from digcnv import digCnvModel
+from digcnv import pipeline
+from digcnv import resultsStore
+from digcnv import shardManifest
+from digcnv import tableIO
 from digcnv.digCNV_logger import logger as dc_logger
 from digcnv.digCNV_logger import changeLoggingLevel
 
+# Subcommands running the pipeline by shards of samples
+SUBCOMMANDS = ["shard", "run", "reduce"]
+
+def _positiveInt(value: str) -> int:
+    """Parse a strictly positive integer argument"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("{} isn't a strictly positive integer".format(value))
+    return number
+
+
+def _addPipelineArguments(parser: argparse.ArgumentParser):
+    """Add the arguments tuning how the pipeline runs"""
+    parser.add_argument("--merge-engine", choices=["python", "perl"], default="python",
+                        help="Engine used to merge CNV calling outputs, `perl` runs the original CNVision script (default: python)")
+    parser.add_argument("--workers", type=_positiveInt, default=1,
+                        help="Number of worker processes, samples are split into shards run in parallel (default: 1)")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help="Run every stage of the pipeline instead of reusing the stage outputs cached by previous runs")
+
+
+def parseArguments(args=None) -> argparse.Namespace:
+    """Parse the command line arguments of the one line script. The `shard`, `run` and `reduce` subcommands run the pipeline
+    by shards of samples (ex: as tasks of a job array), otherwise the pipeline runs on the config file given.
+
+    :param args: list of arguments to parse, defaults to None to parse `sys.argv`
+    :type args: list, optional
+    :return: Namespace of parsed arguments, `command` is None when no subcommand is given
+    :rtype: argparse.Namespace
+    """
+    args = sys.argv[1:] if args is None else args
+    if len(args) == 0 or args[0] not in SUBCOMMANDS:
+        parser = argparse.ArgumentParser(prog="digcnv", description="Run DigCNV in one line script. Use `digcnv {shard,run,reduce} -h` "
+                                                                    "to run it by shards of samples.")
+        parser.add_argument("config_path", help="Pathway to the config file. Get example with the function utils.getConfigFileExample")
+        parser.add_argument("verbose", nargs="?", default=False, help="Set to any value to log every step of the pipeline")
+        _addPipelineArguments(parser)
+        parser.add_argument("--incremental", metavar="STORE_DIR", default=None,
+                            help="Results store directory, only samples new or changed since the previous run with this store are classified")
+        arguments = parser.parse_args(args)
+        arguments.command = None
+        return arguments
+
+    parser = argparse.ArgumentParser(prog="digcnv", description="Run DigCNV by shards of samples.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    shard_parser = subparsers.add_parser("shard", help="Split the calling outputs of a config file by sample into shards")
+    shard_parser.add_argument("config_path", help="Pathway to the config file")
+    shard_parser.add_argument("--shards", type=_positiveInt, required=True, help="Number of shards, at most the number of samples")
+    shard_parser.add_argument("--output-dir", required=True, help="Directory where the manifest and the shards are written")
+
+    run_parser = subparsers.add_parser("run", help="Run the pipeline on a shard")
+    run_parser.add_argument("manifest_path", help="Pathway to the manifest written by `digcnv shard`")
+    run_parser.add_argument("--shard", type=int, required=True, help="Index of the shard to run, from 0 (ex: the job array task index)")
+    _addPipelineArguments(run_parser)
+
+    reduce_parser = subparsers.add_parser("reduce", help="Check every shard finished and gather their outputs")
+    reduce_parser.add_argument("manifest_path", help="Pathway to the manifest written by `digcnv shard`")
+    reduce_parser.add_argument("--output", default=None, help="Pathway of the gathered output (default: output of the config file)")
+
+    for subparser in [shard_parser, run_parser, reduce_parser]:
+        subparser.add_argument("-v", "--verbose", action="store_true", help="Log every step of the pipeline")
+    return parser.parse_args(args)
+
+
 def main():
     """Run DigCNV in one line script. 
 
-    :raises Exception: _description_
     :return: Dataframe containing all CNVs with their describing features and the DigCNV prediction.
     :rtype: pd.Dataframe
     """    
-    if len(sys.argv) < 2:
-        raise Exception("You must give at least one argument: the pathway to the config file. Get example with the function ...")
+    arguments = parseArguments()
+    changeLoggingLevel(verbose=arguments.verbose)
+    if arguments.command == "shard":
+        manifest_path = shardManifest.writeShardManifest(arguments.config_path, arguments.shards, arguments.output_dir)
+        print("{} shards written, manifest: {}".format(shardManifest.readShardManifest(manifest_path)["nb_shards"], manifest_path))
+        return
+    if arguments.command == "run":
+        shardManifest.runManifestShard(arguments.manifest_path, arguments.shard, nb_workers=arguments.workers,
+                                       merge_engine=arguments.merge_engine, use_cache=arguments.use_cache)
+        return
+    if arguments.command == "reduce":
+        manifest = shardManifest.readShardManifest(arguments.manifest_path)
+        parameters = utils.readDigCNVConfFile(manifest["config"])
+        output_path = parameters["output"] if arguments.output is None else arguments.output
+        output_format = parameters["output_format"] if arguments.output is None else None
+        shardManifest.reduceManifestShards(arguments.manifest_path, output_path=output_path, output_format=output_format)
+        dc_logger.info("CNVs annotated and classified saved to = {}".format(output_path))
+        return
 
+    parameters = utils.readDigCNVConfFile(arguments.config_path)
+    if arguments.incremental is not None:
+        predicted_cnvs = resultsStore.runIncrementalPipeline(parameters, arguments.incremental, nb_workers=arguments.workers,
+                                                             merge_engine=arguments.merge_engine, use_cache=arguments.use_cache)
     else:
-        if len(sys.argv) == 3:
-            v = sys.argv[2]
-        else:
-            v = False
-        changeLoggingLevel(verbose=v)
-        parameters = utils.readDigCNVConfFile(sys.argv[1])
-        
-        cnvs = CNVision.mergeMultipleCNVCallingOutputs([parameters["PC"],parameters["QS"]], ["PennCNV", "QuantiSNP"])
-        dc_logger.info("CNVs dataframe shape = {}".format(cnvs.shape))
-        
-        cnvs = dataPreparation.addMicroArrayQualityData(cnvs, parameters["QC"])
-        dc_logger.info("CNVs dataframe shape = {}".format(cnvs.shape))
-
-        cnvs = dataPreparation.addDerivedFeatures(cnvs)
-        dc_logger.info("CNVs dataframe shape = {}".format(cnvs.shape))
-
-        cnvs = dataPreparation.addChromosomicAnnotation(cnvs, parameters["centromeres"], parameters["seg_dups"])
-        dc_logger.info("CNVs dataframe shape = {}".format(cnvs.shape))    
-   
-        cnvs = dataPreparation.transformTwoAlgsFeatures(cnvs)
-        dc_logger.info("CNVs dataframe shape = {}".format(cnvs.shape))
-
-        model = digCnvModel.DigCnvModel()
-        model.openPreTrainedDigCnvModel(parameters["DigCnvModel"])
-
-        dataVerif.checkIfMandatoryColumnsExist(cnvs, post_data_preparation=True)
-        dataVerif.checkColumnsformats(cnvs, post_data_preparation=False)
-        cnvs, cnvs_with_na = dataVerif.computeNaPercentage(cnvs, dimensions=model._dimensions, remove_na_data=True)
-
-        print(cnvs.describe())
-        predicted_cnvs = model.predictCnvClasses(cnvs, use_percentage=parameters['output_prob'])
-        cnvs_with_na["DigCNVpred"] = None
-        predicted_cnvs = pd.concat([predicted_cnvs, cnvs_with_na])
-
-        if parameters["save"]:
-            predicted_cnvs.to_csv(parameters["output"], sep="\t")
-            dc_logger.info("CNVs annotated and classified saved to = {}".format(parameters["output"]))    
+        predicted_cnvs = pipeline.runPipeline(parameters, nb_workers=arguments.workers, merge_engine=arguments.merge_engine,
+                                              use_cache=arguments.use_cache)
+
+    if parameters["save"]:
+        tableIO.writeTable(predicted_cnvs, parameters["output"], table_format=parameters["output_format"], index=True)
+        dc_logger.info("CNVs annotated and classified saved to = {}".format(parameters["output"]))    
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,259 @@
+from digcnv.digCNV_logger import logger as dc_logger
+import numpy as np
+import re
+
+# Relative difference of distances, searched in single precision, under which two training CNVs are taken as equidistant from
+# a CNV. Their exact distances are then computed as scikit-learn does and ties are broken as its k-d tree does
+TIE_TOLERANCE = 1e-5
+
+# Number of (CNV, training CNV) distances computed at a time for a member, bounding the memory used to 1 MB
+BLOCK_PAIRS = 1 << 18
+
+# First and last scikit-learn versions (major, minor) whose nearest neighbor classifiers were checked to store their training
+# CNVs and k-d tree as read by `fromBaggingClassifier` and to break ties as `_breakTie` does
+SKLEARN_TESTED_VERSIONS = ((1, 1), (1, 9))
+
+
+def _checkSklearnVersion():
+    """Check the installed scikit-learn version was tested to export a bagging of nearest neighbor classifiers
+
+    :raises Exception: If the scikit-learn version wasn't tested
+    """
+    import sklearn
+
+    version = tuple(int(number) for number in re.findall(r"\d+", sklearn.__version__)[:2])
+    if not SKLEARN_TESTED_VERSIONS[0] <= version <= SKLEARN_TESTED_VERSIONS[1]:
+        raise Exception("Bagging KNN can't be exported with scikit-learn {}, only versions {}.{} to {}.{} were tested. Set "
+                        "`use_bagged_neighbors` to False to classify with scikit-learn".format(
+                            sklearn.__version__, *SKLEARN_TESTED_VERSIONS[0], *SKLEARN_TESTED_VERSIONS[1]))
+
+
+def _sumSquares(values: np.ndarray) -> np.ndarray:
+    """Sum the squares of each row feature by feature, in the order scikit-learn computes distances, so equal distances are found exactly"""
+    sums = np.zeros(values.shape[0])
+    for j in range(values.shape[1]):
+        sums += values[:, j] * values[:, j]
+    return sums
+
+
+class BaggedNearestNeighbors:
+    """Bagging of 1-nearest neighbor classifiers sharing a single training matrix.
+    Each member is only described by the training rows of its bootstrap sample, the features it uses and the nodes of the
+    k-d tree of its scikit-learn version, used to break ties between equidistant training CNVs the same way.
+    Nearest neighbors are searched by brute force over the shared matrix, so no member keeps a copy of its training CNVs.
+    """
+
+    def __init__(self, training_features: np.ndarray, training_classes: np.ndarray, member_tree_rows: list, member_nodes: list,
+                 member_bounds: list, member_features: list, classes: np.ndarray):
+        """Create the bagging from its training matrix and members
+
+        :param training_features: features of the training CNVs, of shape (nb_training_cnvs, nb_features)
+        :type training_features: np.ndarray
+        :param training_classes: index of the class of each training CNV in `classes`
+        :type training_classes: np.ndarray
+        :param member_tree_rows: for each member, rows of the training matrix in its bootstrap sample, in the order of the
+            points of its k-d tree
+        :type member_tree_rows: list
+        :param member_nodes: for each member, array of shape (nb_nodes, 3) of the first point, the point after the last one
+            and if the node is a leaf, for each node of its k-d tree
+        :type member_nodes: list
+        :param member_bounds: for each member, array of shape (2, nb_nodes, nb_member_features) of the lower and upper bounds
+            of the features of each node of its k-d tree
+        :type member_bounds: list
+        :param member_features: for each member, features it uses, a feature used twice counts twice in distances
+        :type member_features: list
+        :param classes: classes predicted by the bagging
+        :type classes: np.ndarray
+        """
+        self.training_features = training_features
+        self.training_classes = training_classes
+        self.member_tree_rows = member_tree_rows
+        self.member_nodes = member_nodes
+        self.member_bounds = member_bounds
+        # Duplicates of a bootstrap sample have the same class, they don't change the nearest neighbor's class
+        self.member_rows = [np.unique(rows) for rows in member_tree_rows]
+        self.member_features = member_features
+        self.classes_ = classes
+
+    @property
+    def nb_members(self) -> int:
+        return len(self.member_rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the training matrix and the members description"""
+        return (self.training_features.nbytes + self.training_classes.nbytes
+                + sum(sum(array.nbytes for array in member_arrays)
+                      for member_arrays in [self.member_tree_rows, self.member_nodes, self.member_bounds, self.member_features]))
+
+    @classmethod
+    def fromBaggingClassifier(cls, bagging) -> "BaggedNearestNeighbors":
+        """Export a fitted scikit-learn bagging of 1-nearest neighbor classifiers. The training matrix is rebuilt from the
+        training rows stored by each member.
+
+        :param bagging: fitted bagging of `KNeighborsClassifier(n_neighbors=1)` using the euclidean distance and a k-d tree or a brute force search
+        :type bagging: BaggingClassifier
+        :raises Exception: If the scikit-learn version wasn't tested, the bagging isn't fitted or its members aren't 1-nearest
+            neighbor classifiers using the euclidean distance and a k-d tree or a brute force search
+        :return: the bagging sharing its training matrix
+        :rtype: BaggedNearestNeighbors
+        """
+        _checkSklearnVersion()
+        if not hasattr(bagging, "estimators_"):
+            raise Exception("Bagging isn't fitted, it can't be exported")
+        for estimator in bagging.estimators_:
+            if (getattr(estimator, "n_neighbors", None) != 1 or estimator.effective_metric_ != "euclidean"
+                    or not hasattr(estimator, "_fit_X") or estimator._fit_method not in ["kd_tree", "brute"]):
+                raise Exception("Only bagging of 1-nearest neighbor classifiers using the euclidean distance and a k-d tree "
+                                "or a brute force search can be exported")
+        all_samples = bagging.estimators_samples_
+        used_rows = np.unique(np.concatenate(all_samples))
+        # Training CNVs never drawn by any member aren't kept, other rows are renumbered
+        training_features = np.full((used_rows.shape[0], bagging.n_features_in_), np.nan)
+        training_classes = np.zeros(used_rows.shape[0], dtype=np.int32)
+        member_tree_rows, member_nodes, member_bounds, member_features = [], [], [], []
+        for estimator, samples, features in zip(bagging.estimators_, all_samples, bagging.estimators_features_):
+            rows = np.searchsorted(used_rows, samples)
+            training_features[rows[:, np.newaxis], features] = estimator._fit_X
+            # Members are fitted with classes encoded by the bagging, their own classes are a subset of them
+            training_classes[rows] = estimator.classes_[estimator._y]
+            if estimator._fit_method == "kd_tree":
+                _, points, nodes, bounds = estimator._tree.get_arrays()
+                member_tree_rows.append(rows[points].astype(np.int32))
+                member_nodes.append(np.stack([nodes["idx_start"], nodes["idx_end"], nodes["is_leaf"]], axis=1).astype(np.int32))
+                member_bounds.append(np.asarray(bounds, dtype=np.float64))
+            else:
+                # A brute force search is a single leaf holding points in the training order
+                member_tree_rows.append(rows.astype(np.int32))
+                member_nodes.append(np.array([[0, rows.shape[0], 1]], dtype=np.int32))
+                member_bounds.append(np.zeros((2, 1, len(features))))
+            member_features.append(np.asarray(features, dtype=np.int32))
+        bagged_neighbors = cls(training_features, training_classes, member_tree_rows, member_nodes, member_bounds, member_features,
+                               np.asarray(bagging.classes_))
+        dc_logger.info("Bagging of {} nearest neighbor classifiers exported with {} training CNVs shared, {:.1f} MB".format(
+            bagged_neighbors.nb_members, used_rows.shape[0], bagged_neighbors.nbytes / 1e6))
+        return bagged_neighbors
+
+    def toArrays(self) -> tuple:
+        """Give the arrays and parameters describing the bagging, to save it. Rows and features of all members are concatenated.
+
+        :return: dictionary of named arrays and dictionary of JSON serializable parameters
+        :rtype: tuple
+        """
+        arrays = {"training_features": self.training_features, "training_classes": self.training_classes, "classes": self.classes_}
+        # Bounds are flattened, their shape is given by the number of nodes and features of the member
+        for name, member_arrays in [("member_tree_rows", self.member_tree_rows), ("member_nodes", self.member_nodes),
+                                    ("member_bounds", [bounds.ravel() for bounds in self.member_bounds]),
+                                    ("member_features", self.member_features)]:
+            arrays[name] = np.concatenate(member_arrays)
+            arrays[name + "_offsets"] = np.cumsum([0] + [len(values) for values in member_arrays])
+        return arrays, {}
+
+    @classmethod
+    def fromArrays(cls, arrays: dict, params: dict) -> "BaggedNearestNeighbors":
+        """Create the bagging from arrays and parameters given by `toArrays`, arrays can be memory-mapped
+
+        :param arrays: dictionary of named arrays
+        :type arrays: dict
+        :param params: dictionary of parameters
+        :type params: dict
+        :return: the bagging sharing its training matrix
+        :rtype: BaggedNearestNeighbors
+        """
+        member_tree_rows, member_nodes, member_bounds, member_features = [
+            np.split(arrays[name], arrays[name + "_offsets"][1:-1])
+            for name in ["member_tree_rows", "member_nodes", "member_bounds", "member_features"]]
+        member_bounds = [bounds.reshape(2, nodes.shape[0], features.shape[0])
+                         for bounds, nodes, features in zip(member_bounds, member_nodes, member_features)]
+        return cls(arrays["training_features"], arrays["training_classes"], member_tree_rows, member_nodes, member_bounds,
+                   member_features, arrays["classes"])
+
+    def kneighbors(self, X: np.ndarray) -> np.ndarray:
+        """Give the nearest training CNV of each CNV for each member. Distances to the training CNVs of a member are computed
+        by blocks of CNVs, as scores `x.t - |t|^2 / 2` whose maximum is the nearest training CNV `t`.
+
+        :param X: features of the CNVs, in the order used to fit the bagging
+        :type X: np.ndarray
+        :raises Exception: If features have missing values
+        :return: rows of the training matrix, of shape (nb_cnvs, nb_members)
+        :rtype: np.ndarray
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if np.isnan(X).any():
+            raise Exception("Nearest neighbors can't be searched for CNVs with missing values")
+        neighbors = np.empty((X.shape[0], self.nb_members), dtype=np.int32)
+        for member in range(self.nb_members):
+            rows, features = self.member_rows[member], self.member_features[member]
+            # Only the training CNVs of the current member are gathered, with their half squared norm as a last feature
+            training = self.training_features[rows[:, np.newaxis], features]
+            squared_norms = _sumSquares(training)
+            training = np.column_stack([training, -0.5 * squared_norms]).T.astype(np.float32)
+            member_X = X[:, features]
+            member_X = np.column_stack([member_X, np.ones(X.shape[0])]).astype(np.float32)
+            # Rounding errors of scores are bounded by the squared norms, which bound the differences of scores taken as ties
+            tolerances = TIE_TOLERANCE * (_sumSquares(member_X[:, :-1]) + squared_norms.max())
+            block_size = max(1, BLOCK_PAIRS // rows.shape[0])
+            for start in range(0, X.shape[0], block_size):
+                scores = member_X[start:start + block_size] @ training
+                cnvs = np.arange(scores.shape[0])
+                nearest = np.argmax(scores, axis=1)
+                lowest_scores = scores[cnvs, nearest] - tolerances[start:start + block_size]
+                neighbors[start:start + block_size, member] = rows[nearest]
+                # Training CNVs other than the nearest one at about the same distance are ties
+                scores[cnvs, nearest] = -np.inf
+                for cnv in np.flatnonzero(scores.max(axis=1) >= lowest_scores):
+                    candidates = np.append(rows[scores[cnv] >= lowest_scores[cnv]], rows[nearest[cnv]])
+                    neighbors[start + cnv, member] = self._breakTie(member, X[start + cnv, features], candidates)
+        return neighbors
+
+    def _breakTie(self, member: int, x: np.ndarray, candidates: np.ndarray) -> int:
+        """Choose the nearest training CNV of a CNV among training CNVs at about the same distance, as the k-d tree of the member
+        in scikit-learn does: it keeps the first nearest point it meets walking down the closest node first
+
+        :param member: index of the member
+        :type member: int
+        :param x: features of the CNV used by the member
+        :type x: np.ndarray
+        :param candidates: rows of the training matrix of the training CNVs at about the same distance
+        :type candidates: np.ndarray
+        :return: row of the training matrix of the nearest training CNV
+        :rtype: int
+        """
+        reduced_distances = _sumSquares(self.training_features[candidates[:, np.newaxis], self.member_features[member]] - x)
+        candidates = candidates[reduced_distances == reduced_distances.min()]
+        if np.unique(self.training_classes[candidates]).shape[0] == 1:
+            return candidates[0]
+        tree_rows, nodes, bounds = self.member_tree_rows[member], self.member_nodes[member], self.member_bounds[member]
+        points = np.flatnonzero(np.isin(tree_rows, candidates))
+        node = 0
+        while not nodes[node, 2]:
+            children = [2 * node + 1, 2 * node + 2]
+            # Lower bound of the distance to each child, computed as scikit-learn does
+            lower_bounds = _sumSquares(0.5 * ((bounds[0, children] - x + np.abs(bounds[0, children] - x))
+                                              + (x - bounds[1, children] + np.abs(x - bounds[1, children]))))
+            first, second = children if lower_bounds[0] <= lower_bounds[1] else children[::-1]
+            in_first = (points >= nodes[first, 0]) & (points < nodes[first, 1])
+            node = first if in_first.any() else second
+        return tree_rows[points[(points >= nodes[node, 0]) & (points < nodes[node, 1])].min()]
+
+    def predictProba(self, X: np.ndarray) -> np.ndarray:
+        """Predict class probabilities of CNVs, the fraction of members whose nearest training CNV is of each class
+
+        :param X: features of the CNVs, in the order used to fit the bagging
+        :type X: np.ndarray
+        :return: class probabilities of shape (nb_cnvs, nb_classes)
+        :rtype: np.ndarray
+        """
+        neighbor_classes = self.training_classes[self.kneighbors(X)]
+        proba = np.stack([np.count_nonzero(neighbor_classes == i, axis=1) for i in range(self.classes_.shape[0])], axis=1)
+        return proba / self.nb_members
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict the class of CNVs, the most probable one
+
+        :param X: features of the CNVs, in the order used to fit the bagging
+        :type X: np.ndarray
+        :return: predicted classes
+        :rtype: np.ndarray
+        """
+        return self.classes_[np.argmax(self.predictProba(X), axis=1)]
@@ -0,0 +1,73 @@
+from digcnv.digCNV_logger import logger as dc_logger
+import numpy as np
+
+# Number of clusters each class is split into, every cluster keeping at least one CNV in the coreset
+CORESET_NB_CLUSTERS = 64
+
+
+def _allocateSizes(sizes: np.ndarray, budget: int) -> np.ndarray:
+    """Share a number of CNVs between groups proportionally to their sizes, each non empty group getting at least one CNV
+    and no group more than its size. Remaining CNVs go to the largest remainders.
+
+    :param sizes: number of CNVs of each group
+    :type sizes: np.ndarray
+    :param budget: number of CNVs to share, at least the number of non empty groups
+    :type budget: int
+    :return: number of CNVs given to each group
+    :rtype: np.ndarray
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    allocated = np.minimum(sizes, 1)
+    capacities = sizes - allocated
+    remaining = min(budget - int(allocated.sum()), int(capacities.sum()))
+    if remaining <= 0:
+        return allocated
+    quotas = capacities * remaining / capacities.sum()
+    allocated += np.floor(quotas).astype(np.int64)
+    leftover = remaining - int(np.floor(quotas).sum())
+    if leftover > 0:
+        allocated[np.argsort(np.floor(quotas) - quotas, kind="stable")[:leftover]] += 1
+    return allocated
+
+
+def buildStratifiedCoreset(features: np.ndarray, classes: np.ndarray, coreset_size: int, random_state=42) -> np.ndarray:
+    """Select a coreset of training CNVs keeping the proportion of each class and the diversity of its CNVs.
+    The CNVs of each class are clustered with a mini-batch k-means in the scaled features space, and CNVs are drawn in
+    each cluster proportionally to its size, with at least one CNV by cluster so rare kinds of CNVs are kept.
+
+    :param features: scaled features of the training CNVs, as given by `DigCnvModel.buildFeatureMatrix`
+    :type features: np.ndarray
+    :param classes: class of each training CNV
+    :type classes: np.ndarray
+    :param coreset_size: number of CNVs of the coreset
+    :type coreset_size: int
+    :param random_state: seed of the clustering and of the draws, defaults to 42
+    :type random_state: int, optional
+    :raises Exception: If the coreset can't hold one CNV of each class
+    :return: sorted rows of the CNVs in the coreset
+    :rtype: np.ndarray
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    classes = np.asarray(classes)
+    class_values, class_codes = np.unique(classes, return_inverse=True)
+    if coreset_size < class_values.shape[0]:
+        raise Exception("Coreset of {} CNVs can't hold one CNV of each of the {} classes".format(coreset_size, class_values.shape[0]))
+    if coreset_size >= classes.shape[0]:
+        return np.arange(classes.shape[0])
+    rng = np.random.default_rng(random_state)
+    class_sizes = _allocateSizes(np.bincount(class_codes), coreset_size)
+    selected = []
+    for code, class_size in enumerate(class_sizes):
+        rows = np.flatnonzero(class_codes == code)
+        if class_size >= rows.shape[0]:
+            selected.append(rows)
+            continue
+        nb_clusters = min(CORESET_NB_CLUSTERS, int(class_size))
+        clusters = MiniBatchKMeans(n_clusters=nb_clusters, n_init=3, random_state=random_state).fit_predict(features[rows])
+        cluster_sizes = _allocateSizes(np.bincount(clusters, minlength=nb_clusters), int(class_size))
+        for cluster, cluster_size in enumerate(cluster_sizes):
+            selected.append(rng.choice(rows[clusters == cluster], size=cluster_size, replace=False))
+    coreset = np.sort(np.concatenate(selected))
+    dc_logger.info("Coreset of {} CNVs selected among {} training CNVs".format(coreset.shape[0], classes.shape[0]))
+    return coreset
@@ -1,7 +1,90 @@
 from digcnv.digCNV_logger import logger as dc_logger
+from digcnv.regionIndex import loadRegionIndex, loadRegionTracks
+from digcnv.tableIO import readTable
+from digcnv import dataVerif
+from digcnv import utils
 import pandas as pd
 import numpy as np
-from os.path import exists, split, join
+import json
+import os
+from os.path import exists, split, join, abspath
+
+# Number of probes of the PFB files already counted in this process, by pathway, size and modification time
+_pfb_probe_counts = {}
+
+PROBE_COUNTS_FILE_NAME = "probe_counts.json"
+
+
+def readSampleTable(table_path: str, individual_colname="SampleID", columns=None) -> pd.DataFrame:
+    """Read a table of data by sample (ex: micro-array quality, CallRate, genotyping technology) indexed by sample
+
+    :param table_path: Pathway to the table, tsv or Parquet/Feather file
+    :type table_path: str
+    :param individual_colname: Individual column name, defaults to "SampleID"
+    :type individual_colname: str, optional
+    :param columns: columns to keep, or dictionary of the columns to keep with their new name, defaults to None to keep all columns
+    :type columns: list | dict, optional
+    :raises Exception: If the given pathway doesn't exist
+    :raises Exception: If the table contains more than one row by sample
+    :return: table of data indexed by `SampleID`
+    :rtype: pd.DataFrame
+    """
+    if not exists(table_path):
+        raise Exception("Given path doesn't exist: {}".format(table_path))
+    table = readTable(table_path).set_index(individual_colname)
+    table.index.name = "SampleID"
+    if table.index.has_duplicates:
+        raise Exception("{} must contains only unique individuals".format(table_path))
+    if isinstance(columns, dict):
+        table = table.loc[:, list(columns.keys())].rename(columns=columns)
+    elif columns is not None:
+        table = table.loc[:, list(columns)]
+    return table
+
+
+def gatherSampleTables(sample_tables: list) -> pd.DataFrame:
+    """Gather tables of data by sample into one table indexed by sample, samples missing from a table get NA values
+
+    :param sample_tables: list of tables indexed by sample, given by `readSampleTable`
+    :type sample_tables: list
+    :raises Exception: If a column is given by several tables
+    :return: table of all data indexed by `SampleID`
+    :rtype: pd.DataFrame
+    """
+    columns = pd.Index([col for table in sample_tables for col in table.columns])
+    if columns.has_duplicates:
+        raise Exception("Columns {} are given by several sample tables".format(columns[columns.duplicated()].unique().tolist()))
+    if len(sample_tables) == 1:
+        return sample_tables[0]
+    return pd.concat(sample_tables, axis=1, join="outer")
+
+
+def addSampleData(cnvs: pd.DataFrame, sample_data: pd.DataFrame, individual_colname="SampleID") -> pd.DataFrame:
+    """Add the data of their sample to CNVs. Each CNV gets the row of its sample with a single gather by sample codes,
+    columns are added to the given dataframe without copying it. CNVs of samples missing from the table get NA values.
+
+    :param cnvs: list of CNVs with their scores
+    :type cnvs: pd.DataFrame
+    :param sample_data: table of data indexed by sample, given by `readSampleTable` or `gatherSampleTables`
+    :type sample_data: pd.DataFrame
+    :param individual_colname: Individual column name of CNVs, defaults to "SampleID"
+    :type individual_colname: str, optional
+    :raises Exception: If the table contains more than one row by sample
+    :return: same list of CNVs with the sample data columns, replacing existing columns of the same name
+    :rtype: pd.DataFrame
+    """
+    if sample_data.index.has_duplicates:
+        raise Exception("Sample data must contains only unique individuals")
+    # Code of the sample of each CNV in the table, -1 for samples missing from it
+    codes = sample_data.index.get_indexer(cnvs[individual_colname])
+    nb_missing = int((codes == -1).sum())
+    if nb_missing > 0:
+        dc_logger.warning("{} CNVs have no data for their sample".format(nb_missing))
+    for col in sample_data.columns:
+        if col in cnvs.columns:
+            dc_logger.info("Clean existing {} column".format(col))
+        cnvs[col] = sample_data[col].array.take(codes, allow_fill=True)
+    return cnvs
 
 
 def addMicroArrayQualityData(cnvs: pd.DataFrame, data_path: str) -> pd.DataFrame:
@@ -9,17 +92,23 @@ def addMicroArrayQualityData(cnvs: pd.DataFrame, data_path: str) -> pd.DataFrame
 
     :param cnvs: list of CNVs and their quality scores
     :type cnvs: pd.DataFrame
-    :param data_path: pathway containing PennCNV quality chip output
+    :param data_path: pathway containing PennCNV quality chip output, tsv or Parquet/Feather file
     :type data_path: str
+    :raises Exception: If the quality file contains more than one row by sample
+    :raises Exception: If the quality file doesn't match `dataVerif.QUALITY_DATA_SCHEMA`
     :return: list of CNVs with sample quality aggregated
     :rtype: pd.DataFrame
     """
-    data = pd.read_csv(data_path, sep="\t")
+    data = readTable(data_path)
     dc_logger.info("Micro-array quality data opened")
     dc_logger.info("Add {} columns".format(data.columns.tolist()))
+    if data.shape[1] != 10:
+        raise Exception("Micro-array quality file must contain 10 columns: SampleID, LRR_mean, LRR_median, LRR_SD, BAF_mean, BAF_median, "
+                        "BAF_SD, BAF_DRIFT, WF and GCWF, {} found".format(data.shape[1]))
     data.columns = ["SampleID", "LRR_mean", "LRR_median", "LRR_SD",
                     "BAF_mean", "BAF_median", "BAF_SD", "BAF_DRIFT", "WF", "GCWF"]
-    cnvs_qc = pd.merge(cnvs, data, how="left", on='SampleID')
+    data = dataVerif.applyTableSchema(data, dataVerif.QUALITY_DATA_SCHEMA, "micro-array quality data")
+    cnvs_qc = addSampleData(cnvs, data.set_index("SampleID"))
     dc_logger.info("Micro-array quality data merged to CNV quality data")
     return cnvs_qc
 
@@ -44,7 +133,7 @@ def addCallRateToDataset(cnvs: pd.DataFrame, call_rate_path: str, callrate_colna
 
     :param cnvs: list of CNVs with their scores
     :type cnvs: pd.DataFrame
-    :param call_rate_path: Pathway to the file listing CallRate data of each microarray. The file mut be a **tsv**.
+    :param call_rate_path: Pathway to the file listing CallRate data of each microarray. The file mut be a **tsv**, or a Parquet/Feather file.
     :type call_rate_path: str
     :param callrate_colname: CallRate column name, defaults to "callRate"
     :type callrate_colname: str, optional
@@ -55,19 +144,8 @@ def addCallRateToDataset(cnvs: pd.DataFrame, call_rate_path: str, callrate_colna
     :return: list of CNVs with CallRates aggregated
     :rtype: pd.DataFrame
     """
-    if exists(call_rate_path):
-        callrates = pd.read_csv(call_rate_path, sep='\t')
-    else:
-        raise Exception("Given path doesn't exist")
-    callrates.rename(columns={callrate_colname: "CallRate"}, inplace=True)
-    if len(callrates[individual_colname].unique()) != callrates.shape[0]:
-        raise Exception("CallRates file must contains only unique individuals")
-    if "CallRate" in cnvs.columns.tolist():
-        dc_logger.info("Clean existing CallRate column")
-        cnvs.drop(columns={"CallRate"}, inplace=True)
-
-    cnvs_with_callrate = pd.merge(cnvs, callrates.loc[:, [
-                                  individual_colname, "CallRate"]], how="left", left_on=individual_colname, right_on=individual_colname)
+    callrates = readSampleTable(call_rate_path, individual_colname=individual_colname, columns={callrate_colname: "CallRate"})
+    cnvs_with_callrate = addSampleData(cnvs, callrates, individual_colname=individual_colname)
 
     if individual_colname != "SampleID":
         cnvs_with_callrate.drop(columns=[individual_colname], inplace=True)
@@ -75,9 +153,69 @@ def addCallRateToDataset(cnvs: pd.DataFrame, call_rate_path: str, callrate_colna
     return cnvs_with_callrate
 
 
-def addNbProbeByTech(cnvs: pd.DataFrame, nb_prob_tech=None, pfb_file_path=None) -> pd.DataFrame:
-    """Add the number of Probes used to genotyped individuals. **Warning**: if your data comes from multiple genotyping technologies
-    Please split your dataframe to get only one technology by dataframe before using this function.
+def _countFileLines(file_path: str, chunk_size=1 << 24) -> int:
+    """Count the lines of a file by reading it by large binary blocks"""
+    nb_lines, last_byte = 0, b"\n"
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            nb_lines += block.count(b"\n")
+            last_byte = block[-1:]
+    # A last line without end of line is counted too
+    return nb_lines + (last_byte != b"\n")
+
+
+def countPfbProbes(pfb_file_path: str, use_cache=True, cache_dir=None) -> int:
+    """Give the number of probes of a genotyping technology from its PFB file: its number of lines without the header.
+    With the cache, the count is stored by pathway, size and modification time of the file, so each file is only read again when it changes.
+
+    :param pfb_file_path: Pathway to the PFB file of the technology
+    :type pfb_file_path: str
+    :param use_cache: Use the probe counts cache, defaults to True
+    :type use_cache: bool, optional
+    :param cache_dir: Pathway of the probe counts cache, defaults to None to use the `probe_counts` DigCNV cache directory
+    :type cache_dir: str, optional
+    :raises Exception: If the given PFB pathway doesn't exist
+    :return: number of probes of the technology
+    :rtype: int
+    """
+    if not exists(pfb_file_path):
+        raise Exception("Given path doesn't exist: {}".format(pfb_file_path))
+    stat = os.stat(pfb_file_path)
+    key = "{}:{}:{}".format(abspath(pfb_file_path), stat.st_size, stat.st_mtime_ns)
+    if not use_cache:
+        return _countFileLines(pfb_file_path) - 1
+    if key in _pfb_probe_counts:
+        return _pfb_probe_counts[key]
+
+    counts, counts_path = {}, None
+    try:
+        counts_path = join(cache_dir if cache_dir is not None else utils.getCacheDirectory("probe_counts"), PROBE_COUNTS_FILE_NAME)
+        if exists(counts_path):
+            with open(counts_path) as f:
+                counts = json.load(f)
+    except (OSError, ValueError) as e:
+        dc_logger.warning("Probe counts cache unavailable ({}), counting probes of {}".format(e, pfb_file_path))
+    if key not in counts:
+        counts[key] = _countFileLines(pfb_file_path) - 1
+        dc_logger.info("{} probes counted in {}".format(counts[key], pfb_file_path))
+        if counts_path is not None:
+            # Counts of files which changed since are replaced
+            counts = {cached_key: count for cached_key, count in counts.items()
+                      if cached_key == key or cached_key.rsplit(":", 2)[0] != abspath(pfb_file_path)}
+            try:
+                with open(counts_path + ".tmp_{}".format(os.getpid()), "w") as f:
+                    json.dump(counts, f)
+                os.replace(counts_path + ".tmp_{}".format(os.getpid()), counts_path)
+            except OSError as e:
+                dc_logger.warning("Probe count of {} can't be cached ({})".format(pfb_file_path, e))
+    _pfb_probe_counts[key] = counts[key]
+    return counts[key]
+
+
+def addNbProbeByTech(cnvs: pd.DataFrame, nb_prob_tech=None, pfb_file_path=None, sample_technologies=None, technology_probes=None,
+                     individual_colname="SampleID") -> pd.DataFrame:
+    """Add the number of Probes used to genotyped individuals. Cohorts mixing several genotyping technologies are given the technology
+    of each sample and the number of probes, or PFB file, of each technology.
 
     :param cnvs: list of CNVs with their scores
     :type cnvs: pd.DataFrame
@@ -85,7 +223,15 @@ def addNbProbeByTech(cnvs: pd.DataFrame, nb_prob_tech=None, pfb_file_path=None)
     :type nb_prob_tech: int, optional
     :param pfb_file_path: Pathway to the PFB file to compute get the number of probe used by the technology, defaults to None
     :type pfb_file_path: str, optional
-    raises Exception: If none of the optional value is given. You have to set either nb_probe_tech or pfb_file_path parameter.
+    :param sample_technologies: technology of each sample, as a Series or dictionary by sample, or the pathway to a table with the
+        `SampleID` and `Technology` columns, defaults to None
+    :type sample_technologies: pd.Series | dict | str, optional
+    :param technology_probes: Number of probes, or pathway to the PFB file, of each technology, defaults to None
+    :type technology_probes: dict, optional
+    :param individual_colname: Individual column name of CNVs, defaults to "SampleID"
+    :type individual_colname: str, optional
+    raises Exception: If none of the optional value is given. You have to set either nb_probe_tech, pfb_file_path or both sample_technologies and technology_probes parameters.
+    :raises Exception: If a technology of the samples has no number of probes
     :return: list of CNVs with Nb probe used in technology column aggregated
     :rtype: pd.DataFrame
     """
@@ -94,23 +240,35 @@ def addNbProbeByTech(cnvs: pd.DataFrame, nb_prob_tech=None, pfb_file_path=None)
         dc_logger.info(
             "Number of probes in technology added thanks to the given number")
     elif pfb_file_path != None:
-        lines = 0
-        with open(pfb_file_path) as f:
-            for line in f:
-                lines = lines + 1
-        cnvs["Nb_Probe_tech"] = lines - 1
+        cnvs["Nb_Probe_tech"] = countPfbProbes(pfb_file_path)
         dc_logger.info(
             "Number of probes in technology added after counting number of lines in pfb file")
+    elif sample_technologies is not None and technology_probes is not None:
+        if isinstance(sample_technologies, str):
+            sample_technologies = readSampleTable(sample_technologies, columns=["Technology"]).Technology
+        sample_technologies = pd.Series(sample_technologies)
+        missing_technologies = set(sample_technologies.dropna().unique()) - set(technology_probes.keys())
+        if len(missing_technologies) > 0:
+            raise Exception("Number of probes of technologies {} isn't given".format(sorted(missing_technologies)))
+        probes = {technology: nb_probes if isinstance(nb_probes, (int, np.integer)) else countPfbProbes(nb_probes)
+                  for technology, nb_probes in technology_probes.items()}
+        cnvs["Nb_Probe_tech"] = cnvs[individual_colname].map(sample_technologies.map(probes))
+        nb_missing = int(cnvs.Nb_Probe_tech.isna().sum())
+        if nb_missing > 0:
+            dc_logger.warning("{} CNVs have no technology for their sample".format(nb_missing))
+        dc_logger.info(
+            "Number of probes in technology added for {} technologies".format(len(probes)))
     else:
         raise Exception(
-            "You have to give at least one of these two parameters (nb_prob_tech or pfb_file_path)")
+            "You have to give at least one of these parameters (nb_prob_tech, pfb_file_path, or sample_technologies and technology_probes)")
 
     dc_logger.info("Number of probes in technology added")
     return cnvs
 
 
-def addChromosomicAnnotation(cnvs: pd.DataFrame, centromere_list_path=None, segdup_list_path=None) -> pd.DataFrame:
-    """Compute percentage of overlap for each CNV with specific chromosomic regions: centromere and Segmental Duplication. By default the overlap is map on Hg19 Human genome.
+def addChromosomicAnnotation(cnvs: pd.DataFrame, centromere_list_path=None, segdup_list_path=None, extra_tracks=None, use_region_cache=True) -> pd.DataFrame:
+    """Compute percentage of overlap for each CNV with specific chromosomic regions: centromere and Segmental Duplication, and any other given track
+    (telomeres, assembly gaps, HLA, ...). By default the overlap is map on Hg19 Human genome.
 
     :param cnvs: list of CNVs with their scores
     :type cnvs: pd.DataFrame
@@ -118,6 +276,10 @@ def addChromosomicAnnotation(cnvs: pd.DataFrame, centromere_list_path=None, segd
     :type centromere_list_path: str, optional
     :param segdup_list_path: Pathway to a tsv file containing a list of Segmental duplication regions coordinates. By default will use the list human segmental duplication mapped on Hg19 genome, defaults to None
     :type segdup_list_path: str, optional
+    :param extra_tracks: dictionary of track names and pathways of their tsv or BED region files, each adding an `overlapCNV_<track name>` column, defaults to None
+    :type extra_tracks: dict, optional
+    :param use_region_cache: Read region files from their compiled region packs (see `regionIndex.loadRegionIndex`), defaults to True
+    :type use_region_cache: bool, optional
     :return: list of CNVs with chromosomic features columns aggregated
     :rtype: pd.DataFrame
     """
@@ -128,77 +290,83 @@ def addChromosomicAnnotation(cnvs: pd.DataFrame, centromere_list_path=None, segd
     if segdup_list_path == None:
         segdup_list_path = join(this_dir, "data", "SegDup_filtres_Ok_Oct.map")
 
-    cnvs = getCentromereOverlap(cnvs, centromere_list_path)
-    dc_logger.info("Centromere overlap added to CNVs")
-    cnvs = getSegDupOverlap(cnvs, segdup_list_path)
-    dc_logger.info("Both chromosomic annotation finished")
+    tracks = {"Centromere": centromere_list_path, "SegDup": segdup_list_path}
+    if extra_tracks is not None:
+        tracks.update(extra_tracks)
+    cnvs = addRegionTracksAnnotation(cnvs, tracks, use_region_cache)
+    dc_logger.info("All chromosomic annotation finished")
     return cnvs
 
 
-def getCentromereOverlap(cnvs: pd.DataFrame, centromeres_list_path: str) -> pd.DataFrame:
+def addRegionTracksAnnotation(cnvs: pd.DataFrame, track_paths: dict, use_region_cache=True) -> pd.DataFrame:
+    """Compute percentage of overlap for each CNV with the regions of each given track, sweeping the CNVs of each chromosome only once for all tracks.
+    CNVs on a chromosome without region in a track have a null overlap for this track.
+
+    :param cnvs: list of CNVs with their scores
+    :type cnvs: pd.DataFrame
+    :param track_paths: dictionary of track names and pathways of their tsv or BED region files
+    :type track_paths: dict
+    :param use_region_cache: Read region files from their compiled region packs, defaults to True
+    :type use_region_cache: bool, optional
+    :raises Exception: If one of the given track files doesn't exist
+    :return: list of CNVs with one `overlapCNV_<track name>` column aggregated by track
+    :rtype: pd.DataFrame
+    """
+    for path in track_paths.values():
+        if not exists(path):
+            raise Exception("File {} note found".format(path))
+    tracks = loadRegionTracks(track_paths, use_cache=use_region_cache)
+    overlaps = tracks.computeOverlaps(cnvs.CHR, cnvs.START, cnvs.STOP)
+    for i, track_name in enumerate(tracks.track_names):
+        cnvs["overlapCNV_{}".format(track_name)] = overlaps[:, i]
+    dc_logger.info("Overlap added to CNVs for tracks: {}".format(", ".join(tracks.track_names)))
+    return cnvs
+
+
+def getCentromereOverlap(cnvs: pd.DataFrame, centromeres_list_path: str, use_region_cache=True) -> pd.DataFrame:
     """Compute percentage of overlap for each CNV with centromere.
+    CNVs on a chromosome without centromere have a null overlap.
 
     :param cnvs: list of CNVs with their scores
     :type cnvs: pd.DataFrame
     :param centromeres_list_path: Pathway to a tsv file containing a list of centromere regions coordinates
     :type centromeres_list_path: str
+    :param use_region_cache: Read the region file from its compiled region pack, defaults to True
+    :type use_region_cache: bool, optional
     :raises Exception: If the given centromere list file pathway doesn't exist
     :raises Exception: If the given file hasn't mandatory columns (`CHR`, `START`, `STOP`)
     :return: list of CNVs with centromere overlap feature aggregated
     :rtype: pd.DataFrame
     """
-    if exists(centromeres_list_path):
-        centromeres = pd.read_csv(centromeres_list_path, sep='\t')
-    else:
+    if not exists(centromeres_list_path):
         raise Exception("File {} note found".format(centromeres_list_path))
-
-    # validate the necessary titles of the regions of interest file
-    nescessaryRegionTitles = ["CHR", "START", "STOP"]
-    if len(centromeres.columns.intersection(nescessaryRegionTitles)) < 3:
-        raise Exception(
-            "The input file for the regions of interest must contain the following columns: CHR, START and STOP")
-
-    centromeres.rename(columns={
-                       "CHR": "CHR_centro", "START": "START_centro", "STOP": "STOP_centro"}, inplace=True)
-    temp = pd.merge(cnvs, centromeres, left_on="CHR", right_on="CHR_centro", how="left")
-    overlap = (temp[["STOP_centro", "STOP"]].min(
-        axis=1) - temp[["START_centro", "START"]].max(axis=1) + 1)/(temp.STOP - temp.START + 1)
-    overlap = np.where(overlap > 0, overlap, 0)
+    centromere_index = loadRegionIndex(centromeres_list_path, use_cache=use_region_cache)
+    cnvs["overlapCNV_Centromere"] = centromere_index.computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP)
     dc_logger.info("Centromere overlap created")
-    cnvs["overlapCNV_Centromere"] = overlap
     return cnvs
 
 
-def getSegDupOverlap(cnvs: pd.DataFrame, segdup_list_path: str) -> pd.DataFrame:
+def getSegDupOverlap(cnvs: pd.DataFrame, segdup_list_path: str, use_region_cache=True) -> pd.DataFrame:
     """Compute percentage of overlap for each CNV with Segmental Duplication regions.
+    CNVs on a chromosome without segmental duplication have a null overlap.
 
     :param cnvs: list of CNVs with their scores
     :type cnvs: pd.DataFrame
     :param segdup_list_path: Pathway to a tsv file containing a list of centromere regions coordinates
     :type segdup_list_path: str
+    :param use_region_cache: Read the region file from its compiled region pack, defaults to True
+    :type use_region_cache: bool, optional
     :raises Exception:  If the given sgmental duplication list file pathway doesn't exist
     :return: list of CNVs with sgmental duplication overlap feature aggregated
     :rtype: pd.DataFrame
     """
-    if exists(segdup_list_path):
-        segdups = pd.read_csv(segdup_list_path, sep='\t')
-        dc_logger.info("Segmental duplication file opened")
-    else:
+    if not exists(segdup_list_path):
         raise Exception("File note found")
-    complete_cnvs = pd.DataFrame()
-
-    for chr in cnvs.CHR.unique():
-        if chr in segdups.CHR.unique():
-            cnvs_chr = cnvs[cnvs.CHR == chr].copy()
-            segdups_chr = segdups[segdups.CHR == chr].copy()
-            segdups_chr.reset_index(inplace=True)
-            vals = segdups_chr.apply(lambda x: computeOneOverlap(
-                cnvs_chr, x.START, x.STOP), axis=1)
-            overlaps = pd.DataFrame(vals.tolist())
-            cnvs_chr.loc[:, "overlapCNV_SegDup"] = overlaps.sum().tolist()
-            complete_cnvs = pd.concat([complete_cnvs, cnvs_chr])
+    segdup_index = loadRegionIndex(segdup_list_path, use_cache=use_region_cache)
+    dc_logger.info("Segmental duplication file opened")
+    cnvs["overlapCNV_SegDup"] = segdup_index.computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP)
     dc_logger.info("Segmental duplication overlap computed and CNVs annotated")
-    return complete_cnvs
+    return cnvs
 
 
 def computeOneOverlap(cnvs:pd.DataFrame, START:int, STOP:int):
@@ -228,13 +396,16 @@ def transformTwoAlgsFeatures(cnvs: pd.DataFrame) -> pd.DataFrame:
     :return: list of CNVs with the TwoAlgs column corrected if necessary
     :rtype: pd.DataFrame
     """
+    if cnvs.shape[0] == 0:
+        # No CNV to check, as a shard whose calls were all filtered gives
+        return cnvs
     if cnvs.TwoAlgs.dtype == object:
         cnvs.TwoAlgs = cnvs.TwoAlgs.str[:-1]
         cnvs.TwoAlgs = cnvs.TwoAlgs.astype(int)
-    if cnvs.TwoAlgs.describe()[7] <= 1.0:
+    if cnvs.TwoAlgs.describe().iloc[7] <= 1.0:
         cnvs.TwoAlgs = cnvs.TwoAlgs * 100
         dc_logger.info("Transform TwoAlgs function into percentage format")
-    elif cnvs.TwoAlgs.describe()[7] > 1.0 <= 100.0:
+    elif cnvs.TwoAlgs.describe().iloc[7] > 1.0 <= 100.0:
         dc_logger.info("Keep TwoAlgs function into percentage format")
     else:
         dc_logger.info(
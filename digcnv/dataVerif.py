@@ -1,8 +1,199 @@
 from typing import Optional
 from digcnv.digCNV_logger import logger as dc_logger
-import matplotlib.pyplot as plt
-import seaborn as sns
+from digcnv.qcStatistics import QCStatistics, computeQCStatistics
 import pandas as pd
+import numpy as np
+
+# Schemas of the tables read by the pipeline: for each column if it is mandatory, its type and the range of its values.
+# `category` columns are stored as categoricals, `integer` columns as int32 when their values fit and int64 otherwise, `float` columns
+# as float32 and `numeric` columns are only checked to be numbers.
+MERGED_CNVS_SCHEMA = {
+    "FID": {"type": "category"},
+    "SampleID": {"required": True, "type": "category"},
+    "CHR": {"required": True, "type": "category"},
+    "START": {"required": True, "type": "integer", "min": 0},
+    "STOP": {"required": True, "type": "integer", "min": 0},
+    "Type": {"type": "category"},
+    "SCORE": {"required": True, "type": "float"},
+    "SNP": {"required": True, "type": "integer", "min": 0},
+    "Size": {"type": "integer", "min": 0},
+    "#Algos": {"type": "integer", "min": 1},
+    "Algos": {"type": "category"},
+    "%Three Algs": {"type": "category"},
+    "TwoAlgs": {"required": True},
+    "%One Alg": {"type": "category"},
+}
+
+QUALITY_DATA_SCHEMA = {
+    "SampleID": {"required": True, "type": "category"},
+    "LRR_mean": {"required": True, "type": "float"},
+    "LRR_median": {"required": True, "type": "float"},
+    "LRR_SD": {"required": True, "type": "float", "min": 0},
+    "BAF_mean": {"required": True, "type": "float", "min": 0, "max": 1},
+    "BAF_median": {"required": True, "type": "float", "min": 0, "max": 1},
+    "BAF_SD": {"required": True, "type": "float", "min": 0},
+    "BAF_DRIFT": {"required": True, "type": "float", "min": 0},
+    "WF": {"required": True, "type": "float"},
+    "GCWF": {"required": True, "type": "float"},
+}
+
+PREPARED_CNVS_SCHEMA = dict(MERGED_CNVS_SCHEMA, **{
+    "TwoAlgs": {"required": True, "type": "numeric", "min": 0, "max": 100},
+    "SIZE": {"required": True, "type": "integer", "min": 1},
+    "DENSITY": {"required": True, "type": "numeric", "min": 0},
+    "Score_SNP": {"required": True, "type": "numeric"},
+    "WF": {"type": "numeric"},
+    "CallRate": {"type": "numeric", "min": 0, "max": 1},
+    "Nb_Probe_tech": {"type": "numeric", "min": 1},
+    "overlapCNV_Centromere": {"type": "numeric", "min": 0},
+    "overlapCNV_SegDup": {"type": "numeric", "min": 0},
+})
+
+
+def _getStageSchema(post_data_preparation: bool) -> dict:
+    """Give the schema of CNVs before or after the data preparation"""
+    return PREPARED_CNVS_SCHEMA if post_data_preparation else MERGED_CNVS_SCHEMA
+
+
+def _checkColumnRange(values: pd.Series, column: str, rules: dict, table_name: str):
+    """Check the values of a numeric column are within the range of its schema"""
+    out_of_range = np.zeros(values.shape[0], dtype=bool)
+    if "min" in rules:
+        out_of_range |= (values < rules["min"]).to_numpy(dtype=bool, na_value=False)
+    if "max" in rules:
+        out_of_range |= (values > rules["max"]).to_numpy(dtype=bool, na_value=False)
+    if out_of_range.any():
+        first = int(np.argmax(out_of_range))
+        raise Exception("{} values of column {} of the {} are out of range [{}, {}], ex: {} at row {}".format(
+            int(out_of_range.sum()), column, table_name, rules.get("min", "-inf"), rules.get("max", "inf"), values.iloc[first], first))
+
+
+def _toNumeric(values: pd.Series, column: str, table_name: str) -> pd.Series:
+    """Check a column only contains numbers, or missing values"""
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values
+    try:
+        return pd.to_numeric(values)
+    except (ValueError, TypeError):
+        numbers = pd.to_numeric(values, errors="coerce")
+        first = int(np.argmax((numbers.isna() & values.notna()).to_numpy()))
+        raise Exception("Column {} of the {} must be numeric, found {!r} at row {}".format(column, table_name, values.iloc[first], first))
+
+
+def _castColumn(values: pd.Series, column: str, rules: dict, table_name: str) -> pd.Series:
+    """Cast a column to the type of its schema, checking the range of numeric columns"""
+    column_type = rules.get("type")
+    if column_type is None:
+        return values
+    if column_type == "category":
+        return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    values = _toNumeric(values, column, table_name)
+    _checkColumnRange(values, column, rules, table_name)
+    if column_type == "float":
+        return values.astype(np.float32)
+    if column_type == "integer" and not values.isna().any():
+        if values.shape[0] == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max):
+            return values.astype(np.int32)
+        return values.astype(np.int64)
+    return values
+
+
+def applyTableSchema(table: pd.DataFrame, schema: dict, table_name="table") -> pd.DataFrame:
+    """Check a table against its schema as soon as it is read, and store its columns in the smallest types of the schema:
+    categoricals for identifiers and labels, int32 for coordinates fitting it and float32 for scores.
+    Columns which aren't in the schema are kept as they are.
+
+    :param table: the table to check, ex: merged CNVs or micro-array quality data
+    :type table: pd.DataFrame
+    :param schema: schema of the table, ex: `MERGED_CNVS_SCHEMA` or `QUALITY_DATA_SCHEMA`
+    :type schema: dict
+    :param table_name: name of the table given in error messages, defaults to "table"
+    :type table_name: str, optional
+    :raises Exception: If mandatory columns are missing
+    :raises Exception: If a numeric column contains other values or values out of its range
+    :return: the table with its columns cast to the types of the schema
+    :rtype: pd.DataFrame
+    """
+    _checkRequiredColumns(table, schema, table_name)
+    memory_before = table.memory_usage(deep=True).sum()
+    table = table.copy(deep=False)
+    for column, rules in schema.items():
+        if column in table.columns:
+            table[column] = _castColumn(table[column], column, rules, table_name)
+    dc_logger.info("{} checked, memory usage reduced from {:.1f} MB to {:.1f} MB".format(
+        table_name, memory_before / 1e6, table.memory_usage(deep=True).sum() / 1e6))
+    return table
+
+
+def _checkRequiredColumns(table: pd.DataFrame, schema: dict, table_name: str):
+    """Check all mandatory columns of a schema exist in a table"""
+    mandatory_columns = [column for column, rules in schema.items() if rules.get("required", False)]
+    missing_columns = [column for column in mandatory_columns if column not in table.columns]
+    if len(missing_columns) > 0:
+        raise Exception("\nSome columns of the {} are mandatory: {}\n{} are missing".format(table_name, mandatory_columns, missing_columns))
+
+
+def checkIfMandatoryColumnsExist(cnvs: pd.DataFrame, post_data_preparation=False):
+    """Check if mandatory columns of CNVs exist. If not, will raise an Exception.
+
+    :param cnvs: list of CNVs with their scores
+    :type cnvs: pd.DataFrame
+    :param post_data_preparation: Check the columns added by the data preparation too (derived features, `TwoAlgs` in percentage, ...), defaults to False
+    :type post_data_preparation: bool, optional
+    :raises Exception: If at least one mandatory column is missing and will give which column is missing
+    """
+    _checkRequiredColumns(cnvs, _getStageSchema(post_data_preparation), "CNVs")
+    dc_logger.info("All mandatory columns exist in the given dataframe")
+
+
+def checkColumnsformats(cnvs: pd.DataFrame, post_data_preparation=False):
+    """Check the columns of CNVs have the expected format: numeric columns only contain numbers within their range.
+    Columns aren't modified, see `applyTableSchema` to cast them.
+
+    :param cnvs: list of CNVs with their scores
+    :type cnvs: pd.DataFrame
+    :param post_data_preparation: Check the columns added by the data preparation too, defaults to False
+    :type post_data_preparation: bool, optional
+    :raises Exception: If a numeric column contains other values or values out of its range
+    """
+    for column, rules in _getStageSchema(post_data_preparation).items():
+        if column in cnvs.columns and rules.get("type") not in [None, "category"]:
+            _checkColumnRange(_toNumeric(cnvs[column], column, "CNVs"), column, rules, "CNVs")
+    dc_logger.info("All columns have the expected format")
+
+
+def splitCnvsWithNa(cnvs: pd.DataFrame, dimensions: list, remove_na_data=True) -> tuple:
+    """Split CNVs into those having all given columns and those missing at least one of them, from a single mask of missing values.
+    When CNVs are removed, the percentage of data of each column is computed among CNVs having all previous columns, as CNVs are
+    removed column after column. Otherwise it is computed among all CNVs.
+
+    :param cnvs: list of CNVs with their scores
+    :type cnvs: pd.DataFrame
+    :param dimensions: list of specific columns used next for DigCNV model.
+    :type dimensions: list
+    :param remove_na_data: Compute the percentages as if CNVs with missing data were removed column after column, defaults to True
+    :type remove_na_data: bool, optional
+    :return: tuple of the CNVs without missing data (with a new index), the CNVs with missing data (ordered by their first column with
+        missing data, with their index), and a DataFrame giving for each column the percentage of data and the number of CNVs removed
+    :rtype: tuple
+    """
+    available = cnvs.loc[:, dimensions].notna().to_numpy()
+    # CNVs still kept when each column is checked: those having all previous columns
+    kept_before = np.ones(available.shape, dtype=bool)
+    if remove_na_data and available.shape[1] > 1:
+        kept_before[:, 1:] = np.logical_and.accumulate(available, axis=1)[:, :-1]
+    nb_checked = kept_before.sum(axis=0)
+    nb_available = (kept_before & available).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Percentages are computed as (count - 1) / (number of CNVs - 1), as they always were
+        percentages = np.where(nb_checked > 1, (nb_available - 1) / (nb_checked - 1) * 100, (nb_available == nb_checked) * 100.0)
+    report = pd.DataFrame({"percentage": percentages, "nb_removed": nb_checked - nb_available}, index=pd.Index(dimensions))
+
+    first_missing = np.argmin(available, axis=1) if available.shape[1] > 0 else np.zeros(available.shape[0], dtype=np.int64)
+    with_na = ~available.all(axis=1)
+    removed_rows = np.flatnonzero(with_na)
+    removed_rows = removed_rows[np.argsort(first_missing[removed_rows], kind="stable")]
+    return cnvs[~with_na].reset_index(drop=True), cnvs.iloc[removed_rows], report
 
 
 def computeNaPercentage(cnvs: pd.DataFrame, dimensions: list, remove_na_data=True) -> Optional[tuple[pd.DataFrame, pd.DataFrame]]:  
@@ -18,41 +209,26 @@ def computeNaPercentage(cnvs: pd.DataFrame, dimensions: list, remove_na_data=Tru
     :return: If remove na option is `True` will return a tuple of Two Dataframes, a first one containing CNVs with all 
     :rtype: Optional[tuple[pd.DataFrame, pd.DataFrame]]
     """    
-    removed_cnvs = pd.DataFrame()
-    if remove_na_data:
-        cnvs_clean = cnvs.copy()
-    split_cnvs = cnvs.loc[:, dimensions]
+    cnvs_clean, removed_cnvs, report = splitCnvsWithNa(cnvs, dimensions, remove_na_data=remove_na_data)
     dc_logger.info("Check if no data is missing:")
-    i = 0
-    while i < len(split_cnvs.columns):
-        nb_line = split_cnvs.shape[0]-1
-        count = split_cnvs.iloc[:, i].count()-1
-        if count/nb_line == 1:
-            dc_logger.info("{}: 100%".format(split_cnvs.columns[i]))
+    for column, (percentage, nb_removed) in report.iterrows():
+        if percentage == 100:
+            dc_logger.info("{}: 100%".format(column))
         else:
-            dc_logger.info("{}: {:.1f}%".format(
-                split_cnvs.columns[i], count/nb_line*100))
+            dc_logger.info("{}: {:.1f}%".format(column, percentage))
             if remove_na_data:
-                removed_index = split_cnvs[split_cnvs[split_cnvs.columns[i]].isnull(
-                )].index.tolist()
                 dc_logger.info(
-                    "{} CNV removed due to Null Data".format(len(removed_index)))
-                split_cnvs = split_cnvs.drop(index=removed_index)
-                removed_cnvs = pd.concat(
-                    [removed_cnvs, cnvs_clean.iloc[removed_index]])
-                cnvs_clean = cnvs_clean.drop(index=removed_index)
-                cnvs_clean.reset_index(drop=True, inplace=True)
-                split_cnvs.reset_index(drop=True, inplace=True)
-        i += 1
+                    "{} CNV removed due to Null Data".format(int(nb_removed)))
     if remove_na_data:
         return cnvs_clean, removed_cnvs
 
 
-def plotCorrelationHeatMap(cnvs:pd.DataFrame, list_dim:list, output_path=None, plot_fig = True):
-    """Plot the correlation heatmap for the given list of features of the CNV list
+def plotCorrelationHeatMap(cnvs, list_dim:list, output_path=None, plot_fig = True):
+    """Plot the correlation heatmap for the given list of features of the CNV list. The correlation is rendered from streaming statistics,
+    given directly for cohorts read by chunks (see `qcStatistics.computeQCStatisticsFromFile`) or computed from the CNVs.
 
-    :param cnvs: list of CNVs with their scores
-    :type cnvs: pd.DataFrame
+    :param cnvs: list of CNVs with their scores, or statistics of their features
+    :type cnvs: pd.DataFrame | QCStatistics
     :param list_dim: list of specific columns used next for DigCNV model. 
     :type list_dim: list
     :param output_path: Pathway of the image could be a `PNG` or a `PDF` format, defaults to None
@@ -60,8 +236,11 @@ def plotCorrelationHeatMap(cnvs:pd.DataFrame, list_dim:list, output_path=None, p
     :param plot_fig: Option to disable plotting figure in interactive session
     :type plot_fig: bool, optional
     """    
-    data_clean = cnvs.loc[:, list_dim]
-    cor_data = data_clean.corr()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    statistics = cnvs if isinstance(cnvs, QCStatistics) else computeQCStatistics(cnvs, list_dim)
+    cor_data = statistics.getCorrelation().loc[list_dim, list_dim]
     fig, ax = plt.subplots()
     # Set the width and height
     fig.set_figwidth(20)
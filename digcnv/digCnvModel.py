@@ -1,17 +1,31 @@
-from sklearn.ensemble import RandomForestClassifier, VotingClassifier, BaggingClassifier
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn import preprocessing
+from __future__ import annotations
 
-from sklearn.metrics import roc_auc_score, accuracy_score, f1_score, RocCurveDisplay
 import joblib
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import warnings
+import time
+from typing import Iterable, Iterator, TYPE_CHECKING
+
+# scikit-learn estimators and matplotlib are imported by the methods using them, so loading a pre-trained model
+# for classification doesn't pay their import time
+if TYPE_CHECKING:
+    from sklearn.ensemble import VotingClassifier
 
 
 from digcnv import digCNV_logger
+from digcnv import tableIO
+from digcnv.flatForest import FlatForest
+from digcnv.baggedNeighbors import BaggedNearestNeighbors
+from digcnv import modelPack
+from digcnv import coreset
+
+# Type of the feature matrix given to all members: the Random Forest splits on float32 values, so it is exact for it, and it
+# takes half the memory of float64
+FEATURE_DTYPE = np.float32
+
+# Warning of scikit-learn members fitted on a DataFrame, as models saved before the feature matrix, when given the matrix
+FEATURE_NAMES_WARNING = "X does not have valid feature names"
 
 
 class DigCnvModel:
@@ -37,6 +51,12 @@ class DigCnvModel:
                     'tol': 0.008858667904100823}
 
         self._model = None
+        self._flat_forest = None
+        self._bagged_neighbors = None
+        self.use_flat_forest = True
+        self.use_bagged_neighbors = True
+        self.cascade_stats = {}
+        self.training_stats = {}
         self._dimensions = []
         self._dimensions_scales = {}
         digCNV_logger.logger.info("Empty DigCNV model created")
@@ -134,6 +154,10 @@ class DigCnvModel:
         :return: The DigCNV model created and ready for training.
         :rtype: VotingClassifier
         """
+        from sklearn.ensemble import RandomForestClassifier, VotingClassifier, BaggingClassifier
+        from sklearn.svm import SVC
+        from sklearn.neighbors import KNeighborsClassifier
+
         if rf_params is None:
             rf_params = self.rf_params
         rf_clf = RandomForestClassifier(n_estimators = rf_params["n_estimators"],
@@ -166,14 +190,26 @@ class DigCnvModel:
         voting_clf = VotingClassifier(estimators=[('Random Forest', rf_clf), (
             "Bagging KNN", knn_clf), ("SVC", svm_clf)], voting='soft')
         self._model = voting_clf
+        self._flat_forest = None
+        self._bagged_neighbors = None
         return voting_clf
 
     def openPreTrainedDigCnvModel(self, model_path: str):
         """Open a pre-trained DigCNV model and update the DigCNV object
 
-        :param model_path: Pathway to a pkl object containing the list of dimensions used in the model and the trained model. 
+        :param model_path: Pathway to a pkl object containing the list of dimensions used in the model and the trained model,
+            or to a model pack directory written by `saveDigCnvModelPack`
         :type model_path: str
         """        
+        if modelPack.isModelPack(model_path):
+            dimensions, model = modelPack.readModelPack(model_path)
+            digCNV_logger.logger.info("Pre trained model pack opened from {}".format(model_path))
+            self._dimensions = list(dimensions.keys())
+            self._dimensions_scales = dimensions
+            self._model = model
+            self._flat_forest = None
+            self._bagged_neighbors = None
+            return
         has_warning = False
         with warnings.catch_warnings(record=True) as w:
             dimensions, model = joblib.load(model_path)
@@ -187,6 +223,8 @@ class DigCnvModel:
             digCNV_logger.logger.info(
                 "Pre trained model will use {} as predictors".format(dimensions.keys()))
             self._model = model
+            self._flat_forest = None
+            self._bagged_neighbors = None
 
     def checkIfDigCnvFitted(self) -> bool:
         """Check if the DigCNV model object has been trained or not.
@@ -197,27 +235,108 @@ class DigCnvModel:
         """        
         return hasattr(self._model, "classes_")
 
-    def trainDigCnvModel(self, training_data: pd.DataFrame, training_cat: pd.Series):
-        """ Train the DigCNV model object thnaks to the given training data
+    def trainDigCnvModel(self, training_data: pd.DataFrame, training_cat: pd.Series, coreset_size=None):
+        """ Train the DigCNV model object thnaks to the given training data.
+        With a coreset size, the Random Forest of the soft voting is trained on all CNVs and the other members, the SVC
+        and the Bagging KNN whose training time grows faster than the number of CNVs, only on a stratified coreset of the CNVs,
+        see `coreset.buildStratifiedCoreset`. Number of CNVs and training time are kept in `training_stats`.
 
         :param training_data: A dataframe containing all important features to describe CNVs
         :type training_data: pd.DataFrame
         :param training_cat: A list of binary annotation for CNVs indicating if each CNV is a True CNV or an artefact, must int values.
         :type training_cat: pd.Series
+        :param coreset_size: Number of CNVs used to train the SVC and Bagging KNN members, defaults to None to train all members on all CNVs
+        :type coreset_size: int, optional
         """   
-        scaler = preprocessing.StandardScaler()
-        cols = training_data.columns
-        X_train_scale = pd.DataFrame(scaler.fit_transform(training_data, training_cat), columns=cols)
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.base import clone
+
+        start = time.perf_counter()
+        cols = training_data.columns.tolist()
+        # Scales are computed as they are used for classification, the training matrix being built like the classified ones
+        self._dimensions_scales = {col: [training_data[col].mean(), training_data[col].std()] for col in cols}
+        self._dimensions = cols
+        features = self.buildFeatureMatrix(training_data)
+        training_cat = np.asarray(training_cat)
         digCNV_logger.logger.info(
                 "Predictor scaled for training")
-        # for col in cols:
-            # self._dimensions_scales[col] = [training_data[col].min(), training_data[col].max()]         
-        for col in cols:
-            self._dimensions_scales[col] = [training_data[col].mean(), training_data[col].std()] 
-        self._dimensions = X_train_scale.columns.tolist()
-        self._model.fit(X_train_scale, training_cat)
+        forest_names = [name for name, estimator in getattr(self._model, "estimators", [])
+                        if isinstance(estimator, RandomForestClassifier)]
+        if coreset_size is None or coreset_size >= features.shape[0]:
+            nb_coreset_cnvs = features.shape[0]
+            self._model.fit(features, training_cat)
+        else:
+            coreset_rows = coreset.buildStratifiedCoreset(features, training_cat, coreset_size)
+            nb_coreset_cnvs = coreset_rows.shape[0]
+            if getattr(self._model, "voting", None) != "soft" or len(forest_names) == 0:
+                self._model.fit(features[coreset_rows], training_cat[coreset_rows])
+            else:
+                # The forest is left out of the soft vote fitted on the coreset, then fitted alone on all CNVs and put back
+                forest_name = forest_names[0]
+                estimators = dict(self._model.estimators)
+                self._model.set_params(**{forest_name: "drop"})
+                try:
+                    self._model.fit(features[coreset_rows], training_cat[coreset_rows])
+                finally:
+                    self._model.set_params(**{forest_name: estimators[forest_name]})
+                # Members are trained on the classes encoded by the soft voting
+                forest = clone(estimators[forest_name]).fit(features, self._model.le_.transform(training_cat))
+                position = [name for name, estimator in self._model.estimators if estimator != "drop"].index(forest_name)
+                self._model.estimators_.insert(position, forest)
+                self._model.named_estimators_[forest_name] = forest
+        self._flat_forest = None
+        self._bagged_neighbors = None
+        self.training_stats = {"nb_cnvs": int(features.shape[0]), "nb_coreset_cnvs": int(nb_coreset_cnvs),
+                               "training_time": time.perf_counter() - start}
         digCNV_logger.logger.info(
-                f"Model trained on the {X_train_scale.shape[0]} CNVs with {X_train_scale.shape[1]} features")
+                f"Model trained on the {features.shape[0]} CNVs with {features.shape[1]} features in {self.training_stats['training_time']:.1f}s")
+        if nb_coreset_cnvs < features.shape[0]:
+            digCNV_logger.logger.info(f"SVC and Bagging KNN trained on a coreset of {nb_coreset_cnvs} CNVs")
+
+    def validateCoreset(self, training_data: pd.DataFrame, training_cat: pd.Series, validation_data: pd.DataFrame,
+                        validation_cat: pd.Series, coreset_size: int) -> dict:
+        """Measure on labelled CNVs how training with a coreset compares with training on all CNVs, to choose the coreset size.
+        Two copies of the classifier, with its hyperparameters, are trained and evaluated on the validation CNVs, the model itself isn't changed.
+
+        :param training_data: A dataframe containing all important features to describe training CNVs
+        :type training_data: pd.DataFrame
+        :param training_cat: binary classification of the training CNVs, `0` for False CNVs and `1` for True CNVs
+        :type training_cat: pd.Series
+        :param validation_data: A dataframe containing the same features for validation CNVs
+        :type validation_data: pd.DataFrame
+        :param validation_cat: binary classification of the validation CNVs
+        :type validation_cat: pd.Series
+        :param coreset_size: Number of CNVs used to train the SVC and Bagging KNN members, see `trainDigCnvModel`
+        :type coreset_size: int
+        :raises Exception: if the classifier isn't a scikit-learn classifier, as a model pack opened for classification
+        :return: dictionary with the training time (`full_training_time`, `coreset_training_time`) and the `accuracy`, `f1` and `auc`
+            on validation CNVs of each training (ex: `full_auc`, `coreset_auc`), the differences of metrics (ex: `auc_delta`,
+            coreset minus full) and the training `speedup`
+        :rtype: dict
+        """
+        from sklearn.base import clone
+        from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+
+        if not hasattr(self._model, "get_params"):
+            raise Exception("Coreset validation needs a scikit-learn DigCNV classifier, as created by `createDigCnvClassifier`")
+        validation_cat = np.asarray(validation_cat)
+        validation = {"nb_cnvs": int(training_data.shape[0])}
+        for mode, size in [("full", None), ("coreset", coreset_size)]:
+            model = DigCnvModel()
+            model._model = clone(self._model)
+            model.trainDigCnvModel(training_data, training_cat, coreset_size=size)
+            proba = model.predictProbabilities(model.buildFeatureMatrix(validation_data))
+            predictions = model._model.classes_[np.argmax(proba, axis=1)]
+            validation["nb_{}_cnvs".format(mode)] = model.training_stats["nb_coreset_cnvs"]
+            validation["{}_training_time".format(mode)] = model.training_stats["training_time"]
+            validation["{}_accuracy".format(mode)] = float(accuracy_score(validation_cat, predictions))
+            validation["{}_f1".format(mode)] = float(f1_score(validation_cat, predictions))
+            validation["{}_auc".format(mode)] = float(roc_auc_score(validation_cat, proba[:, 1]))
+        for metric in ["accuracy", "f1", "auc"]:
+            validation["{}_delta".format(metric)] = validation["coreset_{}".format(metric)] - validation["full_{}".format(metric)]
+        validation["speedup"] = validation["full_training_time"] / validation["coreset_training_time"]
+        digCNV_logger.logger.info("Coreset validation with {} CNVs: {}".format(coreset_size, validation))
+        return validation
 
     def saveDigCnvModelToPkl(self, output_path: str):
         """Save a trained DigCNV model to a pkl file to be used later
@@ -232,26 +351,220 @@ class DigCnvModel:
             raise Exception(
                 "DigCNV model not defined!\nSaving the model impossible")
 
-    def predictCnvClasses(self, cnvs: pd.DataFrame, use_percentage=False) -> pd.DataFrame:
+    def saveDigCnvModelPack(self, output_dir: str):
+        """Save a trained DigCNV model to a model pack directory: its members as uncompressed arrays memory-mapped
+        when opened, and a JSON header with the dimensions and their scales. Opening the pack takes milliseconds, doesn't
+        need scikit-learn and concurrent processes share a single copy of the arrays.
+
+        :param output_dir: Pathway of the model pack directory
+        :type output_dir: str
+        :raises Exception: if the model isn't trained or its members can't be exported
+        """
+        if not self.checkIfDigCnvFitted():
+            raise Exception("DigCNV model not defined!\nSaving the model impossible")
+        if isinstance(self._model, modelPack.CompactDigCnvClassifier):
+            classifier = self._model
+        else:
+            classifier = modelPack.CompactDigCnvClassifier.fromVotingClassifier(self._model)
+        modelPack.writeModelPack(output_dir, self._dimensions_scales, classifier)
+
+    def scaleDimensions(self, cnvs: pd.DataFrame) -> pd.DataFrame:
+        """Select the model dimensions of the given CNVs and scale them with the mean and standard deviation of the training data
+
+        :param cnvs: DataFrame containing describing features
+        :type cnvs: pd.DataFrame
+        :return: DataFrame of the scaled dimensions, in the order used by the model
+        :rtype: pd.DataFrame
+        """
+        means = pd.Series({col: self._dimensions_scales[col][0] for col in self._dimensions})
+        stds = pd.Series({col: self._dimensions_scales[col][1] for col in self._dimensions})
+        return (cnvs.loc[:, self._dimensions] - means) / stds
+
+    def buildFeatureMatrix(self, cnvs: pd.DataFrame) -> np.ndarray:
+        """Build the matrix of the scaled model dimensions of the given CNVs, given as is to all members of the model for
+        training and classification. The C-contiguous float32 matrix is filled column by column, so the features are
+        materialized once: a float64 DataFrame of scaled dimensions took twice its memory, and was copied again by
+        each member converting it to an array (the Random Forest to float32, the Bagging KNN and the SVC to float64).
+
+        :param cnvs: DataFrame containing describing features
+        :type cnvs: pd.DataFrame
+        :return: array of shape (nb_cnvs, nb_dimensions) of the scaled dimensions, in the order used by the model
+        :rtype: np.ndarray
+        """
+        features = np.empty((cnvs.shape[0], len(self._dimensions)), dtype=FEATURE_DTYPE)
+        for i, col in enumerate(self._dimensions):
+            mean, std = self._dimensions_scales[col]
+            # Scaled in float64 then rounded, as scikit-learn rounds the scaled DataFrame for the Random Forest
+            features[:, i] = (cnvs[col].to_numpy(dtype=np.float64, na_value=np.nan) - mean) / std
+        return features
+
+    def _getMember(self, member_type):
+        """Give the fitted member of the soft voting DigCNV model of the given type
+
+        :param member_type: class of the member
+        :type member_type: type
+        :return: the member or None if the model isn't a soft voting model with such member
+        """
+        if getattr(self._model, "voting", None) != "soft" or not hasattr(self._model, "estimators_"):
+            return None
+        for estimator in self._model.estimators_:
+            if isinstance(estimator, member_type):
+                return estimator
+        return None
+
+    def getFlatForest(self) -> FlatForest:
+        """Give the Random Forest member of the trained model flattened into NumPy node arrays, exported at the first call
+
+        :raises Exception: if model isn't trained or has no Random Forest
+        :return: the flattened Random Forest
+        :rtype: FlatForest
+        """
+        from sklearn.ensemble import RandomForestClassifier
+
+        if self._flat_forest is None:
+            forest = self._getMember(RandomForestClassifier)
+            if forest is None:
+                raise Exception("DigCNV model has no trained Random Forest to flatten")
+            self._flat_forest = FlatForest.fromRandomForest(forest)
+        return self._flat_forest
+
+    def getBaggedNeighbors(self) -> BaggedNearestNeighbors:
+        """Give the Bagging KNN member of the trained model sharing a single training matrix, exported at the first call
+
+        :raises Exception: if model isn't trained or has no Bagging KNN
+        :return: the Bagging KNN sharing its training matrix
+        :rtype: BaggedNearestNeighbors
+        """
+        from sklearn.ensemble import BaggingClassifier
+
+        if self._bagged_neighbors is None:
+            bagging = self._getMember(BaggingClassifier)
+            if bagging is None:
+                raise Exception("DigCNV model has no trained Bagging KNN to export")
+            self._bagged_neighbors = BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+        return self._bagged_neighbors
+
+    def _predictMemberProbabilities(self, estimator, features: np.ndarray) -> np.ndarray:
+        """Predict the classes probabilities of the feature matrix by a member of the model, using its NumPy version when possible"""
+        from sklearn.ensemble import RandomForestClassifier, BaggingClassifier
+
+        if isinstance(estimator, RandomForestClassifier) and self.use_flat_forest:
+            return self.getFlatForest().predictProba(features)
+        if isinstance(estimator, BaggingClassifier) and self.use_bagged_neighbors:
+            return self.getBaggedNeighbors().predictProba(features)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message=FEATURE_NAMES_WARNING)
+            return estimator.predict_proba(features)
+
+    def _getVotingMembers(self):
+        """Give the members of the soft vote and their weights
+
+        :return: tuple of the list of members, as tuples (is the Random Forest, function predicting classes probabilities of
+            a feature matrix), and the list of weights. None if the model isn't a soft vote
+        :rtype: tuple
+        """
+        from sklearn.ensemble import RandomForestClassifier
+
+        if isinstance(self._model, modelPack.CompactDigCnvClassifier):
+            members = [(isinstance(member, FlatForest), member.predictProba)
+                       for _, member in self._model.members]
+            return members, self._model.weights
+        if getattr(self._model, "voting", None) != "soft":
+            return None
+        members = [(isinstance(estimator, RandomForestClassifier),
+                    lambda features, estimator=estimator: self._predictMemberProbabilities(estimator, features))
+                   for estimator in self._model.estimators_]
+        weights = self._model.weights
+        if weights is not None:
+            weights = [weight for (_, estimator), weight in zip(self._model.estimators, weights) if estimator != "drop"]
+        return members, weights
+
+    def predictProbabilities(self, features: np.ndarray) -> np.ndarray:
+        """Predict the classes probabilities of scaled CNVs. The Random Forest member is evaluated by its flattened version,
+        block of CNVs by block, and the Bagging KNN member by its version sharing a single training matrix,
+        both giving the same probabilities as scikit-learn.
+
+        :param features: scaled dimensions of CNVs, as given by `buildFeatureMatrix`. A DataFrame given by `scaleDimensions` is converted
+        :type features: np.ndarray
+        :return: classes probabilities of shape (nb_cnvs, nb_classes)
+        :rtype: np.ndarray
+        """
+        features = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+        voting = self._getVotingMembers()
+        if voting is None:
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message=FEATURE_NAMES_WARNING)
+                return self._model.predict_proba(features)
+        members, weights = voting
+        # Average as scikit-learn soft voting does
+        return np.average([predict(features) for _, predict in members], axis=0, weights=weights)
+
+    def predictCascadeProbabilities(self, features: np.ndarray, cascade_band: tuple) -> tuple:
+        """Predict the classes probabilities of scaled CNVs with a cascade: CNVs are first scored by the Random Forest,
+        the cheapest member, and only CNVs whose Random Forest probability of class `1` falls inside the uncertainty band
+        are scored by the full soft vote. Other CNVs keep the Random Forest probabilities.
+
+        :param features: scaled dimensions of CNVs, as given by `buildFeatureMatrix`. A DataFrame given by `scaleDimensions` is converted
+        :type features: np.ndarray
+        :param cascade_band: lower and upper bounds of the uncertainty band, included, for example `(0.2, 0.8)`
+        :type cascade_band: tuple
+        :raises Exception: if the model isn't a soft vote with a Random Forest or the band bounds aren't probabilities
+        :return: tuple of the classes probabilities of shape (nb_cnvs, nb_classes) and the boolean array of CNVs scored by the full soft vote
+        :rtype: tuple
+        """
+        low, high = cascade_band
+        if not 0 <= low <= high <= 1:
+            raise Exception("Cascade band bounds must be probabilities with lower bound <= upper bound, got {}".format(cascade_band))
+        voting = self._getVotingMembers()
+        if voting is None or not any(is_forest for is_forest, _ in voting[0]):
+            raise Exception("Cascade needs a soft voting DigCNV model with a Random Forest")
+        features = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+        members, weights = voting
+        forest = [is_forest for is_forest, _ in members].index(True)
+        proba = members[forest][1](features)
+        uncertain = (proba[:, 1] >= low) & (proba[:, 1] <= high)
+        if uncertain.any():
+            uncertain_cnvs = features[uncertain]
+            probas = [proba[uncertain] if i == forest else predict(uncertain_cnvs) for i, (_, predict) in enumerate(members)]
+            proba[uncertain] = np.average(probas, axis=0, weights=weights)
+        return proba, uncertain
+
+    def predictCnvClasses(self, cnvs: pd.DataFrame, use_percentage=False, cascade_band=None) -> pd.DataFrame:
         """Will predict the CNVs classification based on the dataframe of CNV features given. For pre-trained models, classes are `0` for False CNVs and `1` for True CNVs
 
         :param cnvs: DataFrame containing describing features
         :type cnvs: pd.DataFrame
         :param use_percentage: Indicate if results must be binary or probabilities, `True` if you want to have probabilities, `False` if you want only classification, defaults to False
         :type use_percentage: bool, optional
+        :param cascade_band: Uncertainty band of the cascade mode, see `predictCascadeProbabilities`. Number of CNVs taking each path is kept in `cascade_stats`, defaults to None to score all CNVs with the full soft vote
+        :type cascade_band: tuple, optional
         :raises Exception: if model isn't trained
         :return: CNVs with their classification aggregated
         :rtype: pd.DataFrame
         """        
-        split_cnvs = cnvs.loc[:, self._dimensions]
         if self.checkIfDigCnvFitted():
             
-            # Scale the data based on the training data
-            for col in split_cnvs.columns:
-                split_cnvs[col] = (split_cnvs[col] - self._dimensions_scales[col][0]) / self._dimensions_scales[col][1]
-                
+            # Scale the data based on the training data, in the single matrix given to all members
+            features = self.buildFeatureMatrix(cnvs)
+
+            if features.shape[0] == 0:
+                # scikit-learn members refuse to score no CNV, as a shard whose CNVs all have missing data gives
+                predict_proba = np.empty((0, self._model.classes_.shape[0]))
+                if cascade_band is not None:
+                    self.cascade_stats = {"nb_cnvs": 0, "nb_forest_only": 0, "nb_full_vote": 0}
+            elif cascade_band is not None:
+                predict_proba, uncertain = self.predictCascadeProbabilities(features, cascade_band)
+                nb_full_vote = int(np.count_nonzero(uncertain))
+                self.cascade_stats = {"nb_cnvs": int(uncertain.shape[0]), "nb_forest_only": int(uncertain.shape[0]) - nb_full_vote,
+                                      "nb_full_vote": nb_full_vote}
+                digCNV_logger.logger.info("Cascade: {} CNVs classified by the Random Forest only, {} by the full soft vote".format(
+                    self.cascade_stats["nb_forest_only"], nb_full_vote))
+            elif use_percentage or self._getVotingMembers() is not None:
+                predict_proba = self.predictProbabilities(features)
+            else:
+                predict_proba = None
+
             if use_percentage:
-                predict_proba = self._model.predict_proba(split_cnvs)
                 digCNV_logger.logger.info(
                     "CNVs classes are now predicted by the model")
             
@@ -261,13 +574,105 @@ class DigCnvModel:
                     "Classes probabilities added to CNV resutls")
                 digCNV_logger.logger.info(predict_proba)
                 predictions = np.where(predict_proba[:, 1] > 0.5, 1, 0)
+            elif predict_proba is not None:
+                # Most probable class as scikit-learn soft voting does
+                predictions = self._model.classes_[np.argmax(predict_proba, axis=1)]
             else:
-                predictions = self._model.predict(split_cnvs)
+                with warnings.catch_warnings():
+                    warnings.filterwarnings("ignore", message=FEATURE_NAMES_WARNING)
+                    predictions = self._model.predict(features)
             cnvs["DigCNVpred"] = predictions
         else:
             raise Exception("DigCNV model not defined!")
         return cnvs
 
+    def validateCascade(self, cnvs: pd.DataFrame, expected_values: pd.Series, cascade_band: tuple) -> dict:
+        """Measure on labelled CNVs how the cascade mode agrees with the full soft vote, to choose the uncertainty band
+
+        :param cnvs: DataFrame containing describing features of CNVs with known classification
+        :type cnvs: pd.DataFrame
+        :param expected_values: list of the Classification, with the classes used for training
+        :type expected_values: pd.Series
+        :param cascade_band: lower and upper bounds of the uncertainty band, see `predictCascadeProbabilities`
+        :type cascade_band: tuple
+        :raises Exception: if model isn't trained
+        :return: dictionary with the fraction of CNVs sent to the full soft vote (`full_vote_fraction`), the fraction of CNVs
+            classified the same way by both modes (`agreement`), the accuracy of each mode (`full_vote_accuracy`, `cascade_accuracy`)
+            and the largest difference of probabilities (`max_probability_difference`)
+        :rtype: dict
+        """
+        if not self.checkIfDigCnvFitted():
+            raise Exception("DigCNV model not defined!")
+        features = self.buildFeatureMatrix(cnvs)
+        full_proba = self.predictProbabilities(features)
+        cascade_proba, uncertain = self.predictCascadeProbabilities(features, cascade_band)
+        full_predictions = self._model.classes_[np.argmax(full_proba, axis=1)]
+        cascade_predictions = self._model.classes_[np.argmax(cascade_proba, axis=1)]
+        expected_values = np.asarray(expected_values)
+        validation = {"nb_cnvs": int(uncertain.shape[0]),
+                      "full_vote_fraction": float(np.mean(uncertain)),
+                      "agreement": float(np.mean(full_predictions == cascade_predictions)),
+                      "full_vote_accuracy": float(np.mean(full_predictions == expected_values)),
+                      "cascade_accuracy": float(np.mean(cascade_predictions == expected_values)),
+                      "max_probability_difference": float(np.abs(full_proba - cascade_proba).max(initial=0.0))}
+        digCNV_logger.logger.info("Cascade validation with band {}: {}".format(cascade_band, validation))
+        return validation
+
+    def predictCnvClassesByChunks(self, cnvs_chunks: Iterable, use_percentage=False, cascade_band=None) -> Iterator[pd.DataFrame]:
+        """Predict the CNVs classification chunk by chunk, so only one chunk of CNVs is held in memory at a time.
+        Each CNV is predicted independently so results are identical to `predictCnvClasses` on the whole dataframe.
+
+        :param cnvs_chunks: Iterable of DataFrames containing describing features, as given by `pd.read_csv(..., chunksize=...)`
+        :type cnvs_chunks: Iterable
+        :param use_percentage: Indicate if results must be binary or probabilities, defaults to False
+        :type use_percentage: bool, optional
+        :param cascade_band: Uncertainty band of the cascade mode, `cascade_stats` sums all chunks, defaults to None
+        :type cascade_band: tuple, optional
+        :raises Exception: if model isn't trained
+        :yield: each chunk of CNVs with their classification aggregated
+        :rtype: Iterator[pd.DataFrame]
+        """
+        if not self.checkIfDigCnvFitted():
+            raise Exception("DigCNV model not defined!")
+        nb_cnvs = 0
+        cascade_stats = {"nb_cnvs": 0, "nb_forest_only": 0, "nb_full_vote": 0}
+        for chunk in cnvs_chunks:
+            nb_cnvs += chunk.shape[0]
+            yield self.predictCnvClasses(chunk, use_percentage=use_percentage, cascade_band=cascade_band)
+            if cascade_band is not None:
+                cascade_stats = {path: nb + self.cascade_stats[path] for path, nb in cascade_stats.items()}
+                self.cascade_stats = cascade_stats
+            digCNV_logger.logger.info("{} CNVs classified".format(nb_cnvs))
+
+    def predictCnvFileByChunks(self, cnvs_path: str, output_path: str, chunk_size=100000, use_percentage=False, input_format=None, output_format=None, cascade_band=None) -> int:
+        """Predict the classification of CNVs listed in a file and write them to the output file, reading and writing `chunk_size` CNVs at a time.
+        Memory used stays the same whatever the number of CNVs in the file.
+
+        :param cnvs_path: Pathway of the file listing CNVs and their describing features
+        :type cnvs_path: str
+        :param output_path: Pathway of the file where CNVs and their classification will be written
+        :type output_path: str
+        :param chunk_size: Number of CNVs classified at a time, defaults to 100000
+        :type chunk_size: int, optional
+        :param use_percentage: Indicate if results must be binary or probabilities, defaults to False
+        :type use_percentage: bool, optional
+        :param input_format: {`tsv`, `csv`, `parquet`, `feather`} format of the CNV file, defaults to None to use the file extension
+        :type input_format: str, optional
+        :param output_format: {`tsv`, `csv`, `parquet`, `feather`} format of the output file, defaults to None to use the file extension
+        :type output_format: str, optional
+        :param cascade_band: Uncertainty band of the cascade mode, see `predictCascadeProbabilities`, defaults to None
+        :type cascade_band: tuple, optional
+        :return: Number of CNVs classified
+        :rtype: int
+        """
+        chunks = tableIO.readTableByChunks(cnvs_path, chunk_size, table_format=input_format)
+        with tableIO.ChunkedTableWriter(output_path, table_format=output_format) as writer:
+            for chunk in self.predictCnvClassesByChunks(chunks, use_percentage=use_percentage, cascade_band=cascade_band):
+                writer.write(chunk)
+        nb_cnvs = writer.nb_rows
+        digCNV_logger.logger.info("{} CNVs classified and saved to {}".format(nb_cnvs, output_path))
+        return nb_cnvs
+
 
     def checkIfMandatoryColumnsExist(self, cnvs: pd.DataFrame, ):
         """Check if mandatory columns for classical DigCNV model exist. If not, will raise an Exception. 
@@ -298,9 +703,15 @@ class DigCnvModel:
         :type images_dir_path: str, optional
         :raises Exception: if model isn't trained
         """        
+        from sklearn.metrics import roc_auc_score, accuracy_score, f1_score, RocCurveDisplay
+        import matplotlib.pyplot as plt
+
         split_cnvs = testing_df.loc[:, self._dimensions]
         if self.checkIfDigCnvFitted():
-            predictions = self._model.predict(split_cnvs)
+            features = self.buildFeatureMatrix(testing_df)
+            # Probabilities of the soft vote, so models opened from a pack are evaluated as pkl models
+            proba = self.predictProbabilities(features)
+            predictions = self._model.classes_[np.argmax(proba, axis=1)]
         else:
             raise Exception(
                 "DigCNV model isn't trained so you can't perform classifications")
@@ -319,14 +730,13 @@ class DigCnvModel:
         digCNV_logger.logger.info(
             f"F1 Score : {f1_score(expected_values, predictions):.3f}")
 
-        RocCurveDisplay.from_estimator(
-            self._model, testing_df, expected_values)
+        RocCurveDisplay.from_predictions(
+            expected_values, proba[:, 1])
         if images_dir_path != "":
             plt.savefig("{}/ROC_curve.pdf".format(images_dir_path))
         plt.show()
         plt.close()
 
-        proba = self._model.predict_proba(split_cnvs)
         proba = pd.DataFrame(proba)
         proba["predict"] = predictions
         proba["true_class"] = expected_values.tolist()
@@ -0,0 +1,232 @@
+from digcnv.digCNV_logger import logger as dc_logger
+import numpy as np
+
+# Number of (CNV, tree) pairs evaluated at a time, blocks of 663 CNVs for the 790 trees of DigCNV. The time per CNV
+# doesn't depend on the block size, blocks only bound the memory of the intermediate arrays to a few MB
+BATCH_PAIRS = 1 << 19
+
+# Fraction of (CNV, tree) pairs still going down under which pairs having reached their leaf are dropped
+COMPACTION_RATIO = 0.75
+
+
+def _roundDownToFloat32(thresholds: np.ndarray) -> np.ndarray:
+    """Round thresholds down to the largest single precision value under them. Features are compared in single
+    precision, a feature value is lower or equal to a threshold if and only if it is lower or equal to its rounded value.
+
+    :param thresholds: double precision thresholds
+    :type thresholds: np.ndarray
+    :return: single precision thresholds
+    :rtype: np.ndarray
+    """
+    rounded = thresholds.astype(np.float32)
+    rounded_up = rounded > thresholds
+    rounded[rounded_up] = np.nextafter(rounded[rounded_up], np.float32(-np.inf))
+    return rounded
+
+
+def _breadthFirstOrder(children_left: np.ndarray, children_right: np.ndarray) -> np.ndarray:
+    """Give the nodes of a tree in breadth first order, the two children of a node being consecutive
+
+    :param children_left: left child of each node, negative for leaves
+    :type children_left: np.ndarray
+    :param children_right: right child of each node, negative for leaves
+    :type children_right: np.ndarray
+    :return: node ids in breadth first order
+    :rtype: np.ndarray
+    """
+    order = [np.zeros(1, dtype=np.int64)]
+    frontier = order[0]
+    while True:
+        internal = frontier[children_left[frontier] >= 0]
+        if internal.size == 0:
+            break
+        frontier = np.column_stack([children_left[internal], children_right[internal]]).ravel()
+        order.append(frontier)
+    return np.concatenate(order)
+
+
+class FlatForest:
+    """Random forest flattened into contiguous NumPy node arrays, evaluated for all CNVs and all trees at once, level by level.
+    Nodes of every tree are concatenated in breadth first order and children point to global node positions. Children of
+    a node are consecutive so only the left one is stored. Leaves are their own left child, with an infinite threshold
+    so CNVs never leave them (internal nodes may also have one, splitting out missing values).
+    """
+
+    def __init__(self, roots: np.ndarray, thresholds: np.ndarray, left: np.ndarray, feature: np.ndarray,
+                 missing_go_to_left: np.ndarray, leaf_proba: np.ndarray, classes: np.ndarray, max_depth: int):
+        """Create the flattened forest from its node arrays
+
+        :param roots: global position of the root node of each tree
+        :type roots: np.ndarray
+        :param thresholds: single precision threshold of each node, CNVs with a greater feature value go to the right child
+        :type thresholds: np.ndarray
+        :param left: global position of the left child of each node
+        :type left: np.ndarray
+        :param feature: feature compared by each node
+        :type feature: np.ndarray
+        :param missing_go_to_left: indicate for each node if CNVs with a missing feature value go to the left child
+        :type missing_go_to_left: np.ndarray
+        :param leaf_proba: class probabilities of each node, of shape (nb_nodes, nb_classes)
+        :type leaf_proba: np.ndarray
+        :param classes: classes predicted by the forest
+        :type classes: np.ndarray
+        :param max_depth: depth of the deepest tree
+        :type max_depth: int
+        """
+        self.roots = roots
+        self.thresholds = thresholds
+        self.left = left
+        self.feature = feature
+        self.missing_go_to_left = missing_go_to_left
+        self.leaf_proba = leaf_proba
+        self.classes_ = classes
+        self.max_depth = max_depth
+
+    @property
+    def nb_trees(self) -> int:
+        return self.roots.shape[0]
+
+    @property
+    def nb_nodes(self) -> int:
+        return self.thresholds.shape[0]
+
+    @classmethod
+    def fromRandomForest(cls, forest) -> "FlatForest":
+        """Export a fitted scikit-learn random forest classifier into a flattened forest
+
+        :param forest: fitted random forest classifier
+        :type forest: RandomForestClassifier
+        :raises Exception: If the forest isn't fitted or predicts several outputs
+        :return: the flattened forest
+        :rtype: FlatForest
+        """
+        if not hasattr(forest, "estimators_"):
+            raise Exception("Random forest isn't fitted, it can't be flattened")
+        if forest.n_outputs_ != 1:
+            raise Exception("Only random forests predicting a single output can be flattened")
+        trees_thresholds, trees_left, trees_feature, trees_missing_go_to_left, trees_values, roots = [], [], [], [], [], []
+        nb_nodes = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            order = _breadthFirstOrder(tree.children_left, tree.children_right)
+            positions = np.empty(order.shape[0], dtype=np.int64)
+            positions[order] = np.arange(order.shape[0]) + nb_nodes
+            is_leaf = tree.children_left[order] < 0
+            trees_thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+            trees_left.append(np.where(is_leaf, positions[order], positions[np.maximum(tree.children_left[order], 0)]))
+            trees_feature.append(np.where(is_leaf, 0, tree.feature[order]))
+            # Only trees of recent scikit-learn versions route missing values, otherwise they go to the right child
+            missing_go_to_left = getattr(tree, "missing_go_to_left", None)
+            trees_missing_go_to_left.append(is_leaf if missing_go_to_left is None else is_leaf | (missing_go_to_left[order] != 0))
+            trees_values.append(tree.value[order, 0, :])
+            roots.append(nb_nodes)
+            nb_nodes += order.shape[0]
+            max_depth = max(max_depth, tree.max_depth)
+        values = np.concatenate(trees_values).astype(np.float64)
+        normalizer = values.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        flat_forest = cls(np.array(roots, dtype=np.int32), _roundDownToFloat32(np.concatenate(trees_thresholds)),
+                          np.concatenate(trees_left).astype(np.int32), np.concatenate(trees_feature).astype(np.int32),
+                          np.concatenate(trees_missing_go_to_left), values / normalizer,
+                          np.asarray(forest.classes_), max_depth)
+        dc_logger.info("Random forest of {} trees flattened into {} nodes".format(flat_forest.nb_trees, flat_forest.nb_nodes))
+        return flat_forest
+
+    def toArrays(self) -> tuple:
+        """Give the arrays and parameters describing the flattened forest, to save it
+
+        :return: dictionary of named arrays and dictionary of JSON serializable parameters
+        :rtype: tuple
+        """
+        arrays = {"roots": self.roots, "thresholds": self.thresholds, "left": self.left, "feature": self.feature,
+                  "missing_go_to_left": self.missing_go_to_left, "leaf_proba": self.leaf_proba, "classes": self.classes_}
+        return arrays, {"max_depth": int(self.max_depth)}
+
+    @classmethod
+    def fromArrays(cls, arrays: dict, params: dict) -> "FlatForest":
+        """Create the flattened forest from arrays and parameters given by `toArrays`, arrays can be memory-mapped
+
+        :param arrays: dictionary of named arrays
+        :type arrays: dict
+        :param params: dictionary of parameters
+        :type params: dict
+        :return: the flattened forest
+        :rtype: FlatForest
+        """
+        return cls(arrays["roots"], arrays["thresholds"], arrays["left"], arrays["feature"], arrays["missing_go_to_left"],
+                   arrays["leaf_proba"], arrays["classes"], params["max_depth"])
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Give the leaf reached by each CNV in each tree. All (CNV, tree) pairs go down one level at a time,
+        pairs having reached their leaf are dropped every 3 levels.
+
+        :param X: features of the CNVs, in the order used to fit the forest
+        :type X: np.ndarray
+        :return: global position of the leaves, of shape (nb_cnvs, nb_trees)
+        :rtype: np.ndarray
+        """
+        nb_cnvs, nb_features = X.shape
+        # Trees compare features in single precision, features of a CNV are read at `CNV index * nb_features + feature`
+        features = np.ascontiguousarray(X, dtype=np.float32).ravel()
+        has_missing = bool(np.isnan(features).any())
+        # Memory-mapped node arrays are viewed as plain arrays, gathered by `np.take` which is much faster than fancy indexing
+        thresholds, left, feature = np.asarray(self.thresholds), np.asarray(self.left), np.asarray(self.feature)
+        missing_go_to_left = np.asarray(self.missing_go_to_left)
+        # Pairs are ordered tree by tree, so the nodes read at a time belong to the same tree
+        current = np.repeat(self.roots, nb_cnvs).astype(np.int32)
+        # Pairs still going down once some have been dropped, their leaves are kept in `leaves`
+        pairs = None
+        offsets = np.tile(np.arange(nb_cnvs, dtype=np.int32) * np.int32(nb_features), self.nb_trees)
+        for level in range(self.max_depth):
+            children = np.take(left, current)
+            if level % 3 == 2:
+                going_down = children != current
+                nb_going_down = np.count_nonzero(going_down)
+                if nb_going_down < COMPACTION_RATIO * going_down.shape[0]:
+                    if pairs is None:
+                        leaves = current.copy()
+                    else:
+                        leaves[pairs] = current
+                    if nb_going_down == 0:
+                        return leaves.reshape(self.nb_trees, nb_cnvs).T
+                    kept = np.flatnonzero(going_down)
+                    pairs = kept if pairs is None else pairs[kept]
+                    current, children, offsets = current[kept], children[kept], offsets[kept]
+            values = np.take(features, np.take(feature, current) + offsets)
+            go_right = values > np.take(thresholds, current)
+            if has_missing:
+                go_right |= np.isnan(values) & ~np.take(missing_go_to_left, current)
+            children += go_right
+            current = children
+        if pairs is None:
+            leaves = current
+        else:
+            leaves[pairs] = current
+        return leaves.reshape(self.nb_trees, nb_cnvs).T
+
+    def predictProba(self, X: np.ndarray) -> np.ndarray:
+        """Predict class probabilities of CNVs, mean of the probabilities of each tree like scikit-learn does
+
+        :param X: features of the CNVs, in the order used to fit the forest
+        :type X: np.ndarray
+        :return: class probabilities of shape (nb_cnvs, nb_classes)
+        :rtype: np.ndarray
+        """
+        X = np.asarray(X)
+        proba = np.zeros((X.shape[0], self.leaf_proba.shape[1]))
+        batch_size = max(1, BATCH_PAIRS // self.nb_trees)
+        for start in range(0, X.shape[0], batch_size):
+            leaves = self.apply(X[start:start + batch_size])
+            proba[start:start + batch_size] = self.leaf_proba[leaves].sum(axis=1) / self.nb_trees
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict the class of CNVs, the most probable one
+
+        :param X: features of the CNVs, in the order used to fit the forest
+        :type X: np.ndarray
+        :return: predicted classes
+        :rtype: np.ndarray
+        """
+        return self.classes_[np.argmax(self.predictProba(X), axis=1)]
@@ -0,0 +1,171 @@
+from digcnv.digCNV_logger import logger as dc_logger
+from digcnv.flatForest import FlatForest
+from digcnv.baggedNeighbors import BaggedNearestNeighbors
+from digcnv.supportVectors import SupportVectorClassifier
+from os.path import join, exists, isdir
+import numpy as np
+import tempfile
+import shutil
+import json
+import os
+
+# Version of the model pack format, packs of another version can't be opened
+MODEL_PACK_VERSION = 3
+
+MEMBER_TYPES = {member_type.__name__: member_type for member_type in [FlatForest, BaggedNearestNeighbors, SupportVectorClassifier]}
+
+
+class CompactDigCnvClassifier:
+    """Soft voting of DigCNV members exported to NumPy arrays, classifying CNVs without scikit-learn.
+    Exposes `predict_proba` and `predict` like the scikit-learn voting classifier it comes from.
+    """
+
+    def __init__(self, members: list, classes: np.ndarray, weights=None):
+        """Create the classifier from its members
+
+        :param members: list of tuples (name, member), members being `FlatForest`, `BaggedNearestNeighbors` or `SupportVectorClassifier`
+        :type members: list
+        :param classes: classes predicted by the classifier
+        :type classes: np.ndarray
+        :param weights: weight of each member in the soft voting, defaults to None for uniform weights
+        :type weights: list, optional
+        """
+        self.members = members
+        self.classes_ = classes
+        self.weights = weights
+
+    @classmethod
+    def fromVotingClassifier(cls, voting) -> "CompactDigCnvClassifier":
+        """Export a fitted scikit-learn soft voting classifier made of a Random Forest, a Bagging of 1-nearest neighbors and a SVC
+
+        :param voting: fitted soft voting classifier
+        :type voting: VotingClassifier
+        :raises Exception: If the classifier isn't a fitted soft voting classifier or has members that can't be exported
+        :return: the exported classifier
+        :rtype: CompactDigCnvClassifier
+        """
+        from sklearn.ensemble import RandomForestClassifier, BaggingClassifier
+        from sklearn.svm import SVC
+
+        if getattr(voting, "voting", None) != "soft" or not hasattr(voting, "estimators_"):
+            raise Exception("Only fitted soft voting classifiers can be exported")
+        names = [name for name, estimator in voting.estimators if estimator != "drop"]
+        members = []
+        for name, estimator in zip(names, voting.estimators_):
+            if isinstance(estimator, RandomForestClassifier):
+                members.append((name, FlatForest.fromRandomForest(estimator)))
+            elif isinstance(estimator, BaggingClassifier):
+                members.append((name, BaggedNearestNeighbors.fromBaggingClassifier(estimator)))
+            elif isinstance(estimator, SVC):
+                members.append((name, SupportVectorClassifier.fromSVC(estimator)))
+            else:
+                raise Exception("Member {} of type {} can't be exported".format(name, type(estimator).__name__))
+        weights = voting.weights
+        if weights is not None:
+            weights = [weight for (_, estimator), weight in zip(voting.estimators, weights) if estimator != "drop"]
+        return cls(members, np.asarray(voting.classes_), weights)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Predict class probabilities of CNVs, average of the members probabilities
+
+        :param X: scaled features of the CNVs, in the order used to train the model
+        :type X: np.ndarray
+        :return: class probabilities of shape (nb_cnvs, nb_classes)
+        :rtype: np.ndarray
+        """
+        X = np.asarray(X, dtype=np.float64)
+        return np.average([member.predictProba(X) for _, member in self.members], axis=0, weights=self.weights)
+
+    def predict(self, X) -> np.ndarray:
+        """Predict the class of CNVs, the most probable one
+
+        :param X: scaled features of the CNVs, in the order used to train the model
+        :type X: np.ndarray
+        :return: predicted classes
+        :rtype: np.ndarray
+        """
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def isModelPack(path: str) -> bool:
+    """Check if a pathway is a DigCNV model pack directory
+
+    :param path: Pathway to check
+    :type path: str
+    :return: `True` if the pathway is a model pack
+    :rtype: bool
+    """
+    return isdir(path) and exists(join(path, "header.json"))
+
+
+def writeModelPack(pack_dir: str, dimensions_scales: dict, classifier: CompactDigCnvClassifier) -> str:
+    """Write a model pack: a directory with one uncompressed `.npy` file per array of each member and a `header.json` file
+    holding the dimensions, their scales and the members parameters. The pack is written in a temporary directory then moved,
+    an existing model pack at the same pathway is replaced.
+
+    :param pack_dir: Pathway of the model pack directory
+    :type pack_dir: str
+    :param dimensions_scales: mean and standard deviation of each dimension in the training data, in the order used by the model
+    :type dimensions_scales: dict
+    :param classifier: the classifier to save
+    :type classifier: CompactDigCnvClassifier
+    :raises Exception: If the pathway exists and isn't a model pack
+    :return: Pathway of the model pack directory
+    :rtype: str
+    """
+    if exists(pack_dir) and not isModelPack(pack_dir):
+        raise Exception("{} exists and isn't a DigCNV model pack".format(pack_dir))
+    parent_dir = os.path.dirname(os.path.abspath(pack_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp_model_")
+    try:
+        header = {"version": MODEL_PACK_VERSION,
+                  "dimensions": list(dimensions_scales.keys()),
+                  "dimensions_scales": {dim: [float(value) for value in scales] for dim, scales in dimensions_scales.items()},
+                  "classes": np.asarray(classifier.classes_).tolist(),
+                  "weights": None if classifier.weights is None else [float(weight) for weight in classifier.weights],
+                  "members": []}
+        for i, (name, member) in enumerate(classifier.members):
+            arrays, params = member.toArrays()
+            files = {}
+            for array_name, array in arrays.items():
+                files[array_name] = "member_{}_{}.npy".format(i, array_name)
+                np.save(join(tmp_dir, files[array_name]), np.ascontiguousarray(array), allow_pickle=False)
+            header["members"].append({"name": name, "type": type(member).__name__, "arrays": files, "params": params})
+        with open(join(tmp_dir, "header.json"), "w") as f:
+            json.dump(header, f, indent=1)
+        if exists(pack_dir):
+            shutil.rmtree(pack_dir)
+        os.rename(tmp_dir, pack_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    dc_logger.info("DigCNV model pack written to {}".format(pack_dir))
+    return pack_dir
+
+
+def readModelPack(pack_dir: str, mmap=True) -> tuple:
+    """Open a model pack written by `writeModelPack`. Arrays are memory-mapped, so processes opening the same pack share
+    a single page-cached copy.
+
+    :param pack_dir: Pathway of the model pack directory
+    :type pack_dir: str
+    :param mmap: memory-map the arrays, `False` reads them in memory, defaults to True
+    :type mmap: bool, optional
+    :raises Exception: If the pack was written with another pack format version or has unknown members
+    :return: tuple of the dimensions scales dictionary and the classifier
+    :rtype: tuple
+    """
+    with open(join(pack_dir, "header.json")) as f:
+        header = json.load(f)
+    if header["version"] != MODEL_PACK_VERSION:
+        raise Exception("Model pack {} has version {}, expected {}".format(pack_dir, header["version"], MODEL_PACK_VERSION))
+    members = []
+    for member in header["members"]:
+        if member["type"] not in MEMBER_TYPES:
+            raise Exception("Model pack {} has a member of unknown type {}".format(pack_dir, member["type"]))
+        arrays = {array_name: np.load(join(pack_dir, file_name), mmap_mode="r" if mmap else None, allow_pickle=False)
+                  for array_name, file_name in member["arrays"].items()}
+        members.append((member["name"], MEMBER_TYPES[member["type"]].fromArrays(arrays, member["params"])))
+    dimensions_scales = {dim: header["dimensions_scales"][dim] for dim in header["dimensions"]}
+    return dimensions_scales, CompactDigCnvClassifier(members, np.asarray(header["classes"]), header["weights"])
@@ -0,0 +1,259 @@
+from digcnv import CNVision
+from digcnv import dataPreparation
+from digcnv import dataVerif
+from digcnv import digCnvModel
+from digcnv import qcStatistics
+from digcnv import stageCache
+from digcnv.digCNV_logger import logger as dc_logger
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import heapq
+
+# Calling algorithm of each calling output of the config file
+CALLING_SOFTWARES = {"PC": "PennCNV", "QS": "QuantiSNP"}
+
+# Number of shards given to each worker, smaller shards balance the load of workers better
+SHARDS_PER_WORKER = 4
+
+# Model, parameters and stage cache of the current worker process, set by `_initWorker`
+_worker_model = None
+_worker_parameters = None
+_worker_cache = None
+
+
+def predictPreparedCnvs(cnvs: pd.DataFrame, parameters: dict, model: digCnvModel.DigCnvModel) -> tuple:
+    """Classify CNVs annotated with all their features, CNVs with missing data are kept apart
+
+    :param cnvs: CNVs annotated with the features used by the model
+    :type cnvs: pd.DataFrame
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param model: pre-trained DigCNV model
+    :type model: digCnvModel.DigCnvModel
+    :return: tuple of two dataframes, CNVs classified and CNVs with missing data that can't be classified
+    :rtype: tuple
+    """
+    dataVerif.checkIfMandatoryColumnsExist(cnvs, post_data_preparation=True)
+    dataVerif.checkColumnsformats(cnvs, post_data_preparation=True)
+    cnvs, cnvs_with_na = dataVerif.computeNaPercentage(cnvs, dimensions=model._dimensions, remove_na_data=True)
+
+    statistics = qcStatistics.computeQCStatistics(cnvs, cnvs.select_dtypes("number").columns.tolist())
+    dc_logger.info("\n{}".format(statistics.getSummary()))
+    predicted_cnvs = model.predictCnvClasses(cnvs, use_percentage=parameters['output_prob'],
+                                             cascade_band=parameters["cascade_band"])
+    cnvs_with_na["DigCNVpred"] = None
+    return predicted_cnvs, cnvs_with_na
+
+
+def getClassificationStages(parameters: dict, getModel) -> list:
+    """Give the stages of the pipeline run on merged CNVs, as used by `stageCache.runStages`: schema validation, quality data join,
+    derived features, chromosomic annotation, two algorithms features then NA filtering and prediction
+
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param getModel: function giving the pre-trained DigCNV model, only called if the classification stage runs
+    :type getModel: function
+    :return: list of tuples (name, inputs, function) of the stages
+    :rtype: list
+    """
+    tracks = parameters["tracks"]
+    return [("validation", {}, lambda cnvs: dataVerif.applyTableSchema(cnvs, dataVerif.MERGED_CNVS_SCHEMA, "merged CNVs")),
+            ("quality", {"files": [parameters["QC"]]},
+             lambda cnvs: dataPreparation.addMicroArrayQualityData(cnvs, parameters["QC"])),
+            ("derived_features", {}, dataPreparation.addDerivedFeatures),
+            ("annotation", {"files": [parameters["centromeres"], parameters["seg_dups"]] + list(tracks.values()),
+                            "values": {"tracks": list(tracks.keys())}},
+             lambda cnvs: dataPreparation.addChromosomicAnnotation(cnvs, parameters["centromeres"], parameters["seg_dups"],
+                                                                   extra_tracks=tracks)),
+            ("two_algorithms", {}, dataPreparation.transformTwoAlgsFeatures),
+            ("classification", {"files": [parameters["DigCnvModel"]],
+                                "values": {"output_prob": parameters["output_prob"], "cascade_band": parameters["cascade_band"]}},
+             lambda cnvs: predictPreparedCnvs(cnvs, parameters, getModel()))]
+
+
+def classifyMergedCnvs(cnvs: pd.DataFrame, parameters: dict, model: digCnvModel.DigCnvModel, cache=None) -> tuple:
+    """Run the DigCNV pipeline on merged CNVs: schema validation, quality data join, derived features, chromosomic annotation, NA filtering
+    and prediction.
+
+    :param cnvs: CNVs merged from the calling algorithm outputs
+    :type cnvs: pd.DataFrame
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param model: pre-trained DigCNV model, or a function giving it only if the classification has to run
+    :type model: digCnvModel.DigCnvModel
+    :param cache: cache of the stage outputs, keyed from the merged CNVs content, defaults to None to run every stage
+    :type cache: stageCache.StageCache, optional
+    :return: tuple of two dataframes, CNVs classified and CNVs with missing data that can't be classified
+    :rtype: tuple
+    """
+    getModel = model if callable(model) else lambda: model
+    return stageCache.runStages(getClassificationStages(parameters, getModel), cnvs, cache=cache)
+
+
+def assignSampleShards(sample_sizes: pd.Series, nb_shards: int) -> pd.Series:
+    """Split samples into shards of balanced number of CNVs. Samples are taken from the largest to the smallest and each one is
+    given to the shard having the fewest CNVs, ties being broken by sample and shard order so shards are always the same.
+
+    :param sample_sizes: number of CNVs of each sample, indexed by sample
+    :type sample_sizes: pd.Series
+    :param nb_shards: number of shards
+    :type nb_shards: int
+    :return: shard of each sample, indexed by sample
+    :rtype: pd.Series
+    """
+    nb_shards = max(1, min(nb_shards, sample_sizes.shape[0]))
+    order = np.lexsort((np.arange(sample_sizes.shape[0]), -sample_sizes.to_numpy()))
+    shards = np.empty(sample_sizes.shape[0], dtype=np.int64)
+    loads = [(0, shard) for shard in range(nb_shards)]
+    for sample in order:
+        load, shard = heapq.heappop(loads)
+        shards[sample] = shard
+        heapq.heappush(loads, (load + int(sample_sizes.iloc[sample]), shard))
+    return pd.Series(shards, index=sample_sizes.index)
+
+
+def getSampleKeys(cnvs: pd.DataFrame) -> pd.Series:
+    """Give the key of the sample of each CNV, merging CNVs of a sample ignores the case of its ID"""
+    return cnvs.SampleID.astype(str).str.lower()
+
+
+def sortInMergeOrder(cnvs: pd.DataFrame) -> pd.DataFrame:
+    """Sort CNVs of several shards in the order of merged CNVs: by sample, chromosome (both case insensitive) and start"""
+    if cnvs.shape[0] == 0:
+        return cnvs.reset_index(drop=True)
+    sample_codes = pd.factorize(getSampleKeys(cnvs), sort=True)[0]
+    chr_codes = pd.factorize(cnvs.CHR.astype(str).str.lower(), sort=True)[0]
+    order = np.lexsort((cnvs.START.to_numpy(), chr_codes, sample_codes))
+    return cnvs.iloc[order].reset_index(drop=True)
+
+
+def orderClassifiedCnvs(cnvs: pd.DataFrame) -> pd.DataFrame:
+    """Order CNVs gathered from several runs as a single run gives them: classified CNVs in the order of merged CNVs,
+    followed by CNVs with missing data, which have no prediction
+
+    :param cnvs: CNVs with the DigCNV prediction, or none for CNVs with missing data
+    :type cnvs: pd.DataFrame
+    :return: the ordered CNVs
+    :rtype: pd.DataFrame
+    """
+    with_na = cnvs.DigCNVpred.isna().to_numpy()
+    return pd.concat([sortInMergeOrder(cnvs[~with_na]), sortInMergeOrder(cnvs[with_na])], ignore_index=True)
+
+
+def _initWorker(parameters: dict, use_cache: bool):
+    """Set the parameters shared by all shards run by a worker process"""
+    global _worker_model, _worker_parameters, _worker_cache
+    _worker_model = None
+    _worker_parameters = parameters
+    _worker_cache = _openStageCache(parameters) if use_cache else None
+
+
+def _getWorkerModel() -> digCnvModel.DigCnvModel:
+    """Open the pre-trained model once for all shards run by a worker process"""
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = digCnvModel.DigCnvModel()
+        _worker_model.openPreTrainedDigCnvModel(_worker_parameters["DigCnvModel"])
+    return _worker_model
+
+
+def _runShard(shard: dict) -> tuple:
+    """Run the pipeline on a shard in a worker process: merge the formatted calls of its samples if needed then classify them"""
+    if "merged" in shard:
+        cnvs = shard["merged"]
+    else:
+        cnvs = CNVision.mergeFormattedCNVs(shard["formatted"], shard["tags"])
+    return classifyMergedCnvs(cnvs, _worker_parameters, _getWorkerModel, cache=_worker_cache)
+
+
+def _openStageCache(parameters: dict) -> stageCache.StageCache:
+    """Open the stage cache configured in the parameters"""
+    cache_parameters = parameters.get("cache", {})
+    return stageCache.StageCache(cache_parameters.get("directory"),
+                                 max_size_gb=cache_parameters.get("max_size_gb", stageCache.DEFAULT_MAX_SIZE_GB),
+                                 max_age_days=cache_parameters.get("max_age_days", stageCache.DEFAULT_MAX_AGE_DAYS))
+
+
+def runShardedPipeline(parameters: dict, nb_workers: int, merge_engine="python", use_cache=True) -> pd.DataFrame:
+    """Run the DigCNV pipeline with a pool of worker processes. Samples are split into shards of balanced number of CNVs,
+    every stage being independent across samples, and each worker opens the pre-trained model once. With the `python`
+    merge engine, calls are merged by the workers, the `perl` engine merges all calls before sharding.
+    Classified CNVs are merged back in the order of merged CNVs, followed by CNVs with missing data, whatever the number of workers.
+
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param nb_workers: number of worker processes
+    :type nb_workers: int
+    :param merge_engine: {`python`, `perl`} engine used to merge CNV calling outputs, defaults to "python"
+    :type merge_engine: str, optional
+    :param use_cache: reuse the stage outputs cached for the same shards, defaults to True
+    :type use_cache: bool, optional
+    :return: CNVs with their describing features and the DigCNV prediction
+    :rtype: pd.DataFrame
+    """
+    softwares = ["PennCNV", "QuantiSNP"]
+    if merge_engine == "python":
+        formatted_cnvs = [CNVision.readPennCNVOutput(parameters["PC"]), CNVision.readQuantiSNPOutput(parameters["QS"])]
+        tags = [CNVision.CNVISION_ALGORITHM_TAGS[soft] for soft in softwares]
+        sample_keys = [getSampleKeys(cnvs) for cnvs in formatted_cnvs]
+    else:
+        merged_cnvs = CNVision.mergeMultipleCNVCallingOutputs([parameters["PC"], parameters["QS"]], softwares, engine=merge_engine)
+        sample_keys = [getSampleKeys(merged_cnvs)]
+    sample_shards = assignSampleShards(pd.concat(sample_keys).value_counts().sort_index(), nb_workers * SHARDS_PER_WORKER)
+    nb_shards = int(sample_shards.max()) + 1 if sample_shards.shape[0] > 0 else 0
+    cnv_shards = [keys.map(sample_shards).to_numpy() for keys in sample_keys]
+    if merge_engine == "python":
+        shards = [{"formatted": [cnvs[shard_ids == shard] for cnvs, shard_ids in zip(formatted_cnvs, cnv_shards)], "tags": tags}
+                  for shard in range(nb_shards)]
+    else:
+        shards = [{"merged": merged_cnvs[cnv_shards[0] == shard].reset_index(drop=True)} for shard in range(nb_shards)]
+    dc_logger.info("{} samples split into {} shards run by {} workers".format(sample_shards.shape[0], nb_shards, nb_workers))
+
+    with ProcessPoolExecutor(max_workers=nb_workers, initializer=_initWorker,
+                             initargs=(parameters, use_cache)) as executor:
+        results = list(executor.map(_runShard, shards))
+    if len(results) == 0:
+        return pd.DataFrame()
+    predicted_cnvs = sortInMergeOrder(pd.concat([predicted for predicted, _ in results], ignore_index=True))
+    cnvs_with_na = sortInMergeOrder(pd.concat([with_na for _, with_na in results], ignore_index=True))
+    dc_logger.info("{} shards classified and merged back".format(nb_shards))
+    # Categories differ between shards, columns are cast again as a single run gives them
+    return dataVerif.applyTableSchema(pd.concat([predicted_cnvs, cnvs_with_na], ignore_index=True), dataVerif.MERGED_CNVS_SCHEMA,
+                                      "classified CNVs")
+
+
+def runPipeline(parameters: dict, nb_workers=1, merge_engine="python", use_cache=True) -> pd.DataFrame:
+    """Run the whole DigCNV pipeline on the calling outputs given by the parameters: merge, annotation and classification.
+    With the cache, the output of each stage is kept under a key of its inputs (input files content, parameters and DigCNV version)
+    so a run only redoes the stages whose inputs changed, ex: only the classification when the model changes.
+
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param nb_workers: number of worker processes, samples are split into shards if greater than 1, defaults to 1
+    :type nb_workers: int, optional
+    :param merge_engine: {`python`, `perl`} engine used to merge CNV calling outputs, defaults to "python"
+    :type merge_engine: str, optional
+    :param use_cache: reuse the stage outputs cached by previous runs, defaults to True
+    :type use_cache: bool, optional
+    :return: CNVs with their describing features and the DigCNV prediction, classified CNVs followed by CNVs with missing data
+    :rtype: pd.DataFrame
+    """
+    if nb_workers > 1:
+        return runShardedPipeline(parameters, nb_workers, merge_engine=merge_engine, use_cache=use_cache)
+    models = []
+
+    def getModel() -> digCnvModel.DigCnvModel:
+        if len(models) == 0:
+            models.append(digCnvModel.DigCnvModel())
+            models[0].openPreTrainedDigCnvModel(parameters["DigCnvModel"])
+        return models[0]
+
+    calling_output_files = CNVision.expandCallingOutputPaths([parameters["PC"], parameters["QS"]])
+    merge_stage = ("merge", {"files": calling_output_files, "values": {"engine": merge_engine}},
+                   lambda _: CNVision.mergeMultipleCNVCallingOutputs([parameters["PC"], parameters["QS"]], ["PennCNV", "QuantiSNP"],
+                                                                     engine=merge_engine))
+    cache = _openStageCache(parameters) if use_cache else None
+    predicted_cnvs, cnvs_with_na = stageCache.runStages([merge_stage] + getClassificationStages(parameters, getModel), cache=cache)
+    # Numbered from 0 as the sharded run does, so the output is the same whatever the number of workers
+    return pd.concat([predicted_cnvs, cnvs_with_na], ignore_index=True)
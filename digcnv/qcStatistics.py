@@ -0,0 +1,234 @@
+from digcnv.digCNV_logger import logger as dc_logger
+from digcnv.tableIO import readTableByChunks
+from typing import Iterable
+import pandas as pd
+import numpy as np
+
+# Number of values kept by each level of a quantile sketch, quantiles are exact below it and their rank error decreases with it
+QUANTILE_SKETCH_SIZE = 4096
+
+
+class QuantileSketch:
+    """Mergeable sketch of the distribution of a feature, giving approximate quantiles in a bounded memory.
+    Values are kept in levels, a value of level `i` standing for `2 ** i` values. A level holding more than the sketch size is sorted
+    and every other value is moved to the next level.
+    """
+
+    def __init__(self, sketch_size=QUANTILE_SKETCH_SIZE):
+        """Create an empty sketch
+
+        :param sketch_size: maximum number of values of a level, defaults to QUANTILE_SKETCH_SIZE
+        :type sketch_size: int, optional
+        """
+        self.sketch_size = sketch_size
+        self.levels = [np.empty(0)]
+        self._nb_compactions = 0
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            if self.levels[level].shape[0] > self.sketch_size:
+                values = np.sort(self.levels[level])
+                # An odd value stays in its level so the total weight is kept
+                kept = values[values.shape[0] - values.shape[0] % 2:]
+                # Alternate which half is kept to not bias quantiles towards low or high values
+                promoted = values[self._nb_compactions % 2:values.shape[0] - values.shape[0] % 2:2]
+                self._nb_compactions += 1
+                self.levels[level] = kept
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values: np.ndarray):
+        """Add values to the sketch, missing values being ignored"""
+        values = np.asarray(values, dtype=float)
+        self.levels[0] = np.concatenate([self.levels[0], values[~np.isnan(values)]])
+        self._compact()
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the values of another sketch, ex: of another shard"""
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self._compact()
+
+    def getQuantiles(self, quantiles: list) -> np.ndarray:
+        """Give the approximate quantiles of the values, exact as long as no level was compacted
+
+        :param quantiles: list of quantiles between 0 and 1
+        :type quantiles: list
+        :return: value of each quantile, NaN if the sketch is empty
+        :rtype: np.ndarray
+        """
+        if len(self.levels) == 1:
+            if self.levels[0].shape[0] == 0:
+                return np.full(len(quantiles), np.nan)
+            # Linear interpolation, as pandas gives quantiles
+            return np.quantile(self.levels[0], quantiles)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level_values.shape[0], 2.0 ** level) for level, level_values in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulated = np.cumsum(weights[order])
+        ranks = np.asarray(quantiles) * (cumulated[-1] - 1)
+        return values[order][np.minimum(np.searchsorted(cumulated, ranks, side="right"), values.shape[0] - 1)]
+
+
+class QCStatistics:
+    """Statistics of CNV features computed in one pass over chunks of CNVs: number of values, missing values, mean and variance,
+    minimum and maximum, approximate quantiles and correlation matrix. Statistics of several shards can be merged.
+    Means, variances and co-moments are merged chunk by chunk with the parallel form of Welford's algorithm. Each pair of features
+    is computed on the CNVs having both, as `pd.DataFrame.corr` does.
+    """
+
+    def __init__(self, columns: list, sketch_size=QUANTILE_SKETCH_SIZE):
+        """Create empty statistics
+
+        :param columns: list of the features described
+        :type columns: list
+        :param sketch_size: maximum number of values of a level of the quantile sketches, defaults to QUANTILE_SKETCH_SIZE
+        :type sketch_size: int, optional
+        """
+        nb_columns = len(columns)
+        self.columns = list(columns)
+        self.nb_rows = 0
+        # Pairwise statistics: element (i, j) describes feature i on the CNVs having features i and j
+        self._counts = np.zeros((nb_columns, nb_columns))
+        self._means = np.zeros((nb_columns, nb_columns))
+        self._m2 = np.zeros((nb_columns, nb_columns))
+        self._comoments = np.zeros((nb_columns, nb_columns))
+        self._mins = np.full(nb_columns, np.inf)
+        self._maxs = np.full(nb_columns, -np.inf)
+        self._sketches = [QuantileSketch(sketch_size) for _ in columns]
+
+    def _mergeMoments(self, counts: np.ndarray, means: np.ndarray, m2: np.ndarray, comoments: np.ndarray):
+        """Merge the pairwise moments of another set of CNVs"""
+        total = self._counts + counts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = np.where(total > 0, self._counts * counts / total, 0.0)
+            fractions = np.where(total > 0, counts / total, 0.0)
+        deltas = means - self._means
+        self._means = self._means + deltas * fractions
+        self._m2 = self._m2 + m2 + deltas ** 2 * weights
+        self._comoments = self._comoments + comoments + deltas * deltas.T * weights
+        self._counts = total
+
+    def update(self, cnvs: pd.DataFrame) -> "QCStatistics":
+        """Add a chunk of CNVs to the statistics
+
+        :param cnvs: chunk of CNVs with the described features
+        :type cnvs: pd.DataFrame
+        :return: the updated statistics
+        :rtype: QCStatistics
+        """
+        values = cnvs.loc[:, self.columns].to_numpy(dtype=float, na_value=np.nan)
+        self.nb_rows += values.shape[0]
+        if values.shape[0] == 0:
+            return self
+        available = ~np.isnan(values)
+        present = available.astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Values are centered on the chunk means so the moments of the chunk are computed without cancellation
+            nb_values = available.sum(axis=0)
+            shifts = np.where(nb_values > 0, np.where(available, values, 0.0).sum(axis=0) / np.maximum(nb_values, 1), 0.0)
+            centered = np.where(available, values - shifts, 0.0)
+            counts = present.T @ present
+            sums = centered.T @ present
+            chunk_means = np.where(counts > 0, sums / counts, 0.0)
+            m2 = (centered ** 2).T @ present - chunk_means * sums
+            comoments = centered.T @ centered - chunk_means * sums.T
+        self._mergeMoments(counts, chunk_means + shifts[:, None] * (counts > 0), m2, comoments)
+        self._mins = np.fmin(self._mins, np.where(available, values, np.inf).min(axis=0))
+        self._maxs = np.fmax(self._maxs, np.where(available, values, -np.inf).max(axis=0))
+        for i, sketch in enumerate(self._sketches):
+            sketch.update(values[available[:, i], i])
+        return self
+
+    def merge(self, other: "QCStatistics") -> "QCStatistics":
+        """Add the statistics of other CNVs, ex: computed on another shard
+
+        :param other: statistics of the same features
+        :type other: QCStatistics
+        :raises Exception: If the statistics describe other features
+        :return: the merged statistics
+        :rtype: QCStatistics
+        """
+        if other.columns != self.columns:
+            raise Exception("Statistics of features {} can't be merged with statistics of features {}".format(other.columns, self.columns))
+        self.nb_rows += other.nb_rows
+        self._mergeMoments(other._counts, other._means, other._m2, other._comoments)
+        self._mins = np.fmin(self._mins, other._mins)
+        self._maxs = np.fmax(self._maxs, other._maxs)
+        for sketch, other_sketch in zip(self._sketches, other._sketches):
+            sketch.merge(other_sketch)
+        return self
+
+    def getSummary(self, quantiles=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+        """Give the summary of each feature, as `pd.DataFrame.describe` does, with the rate of missing values
+
+        :param quantiles: list of quantiles to give, defaults to (0.25, 0.5, 0.75)
+        :type quantiles: tuple, optional
+        :return: DataFrame with one column by feature and one row by statistic: `count`, `na_rate`, `mean`, `std`, `min`, quantiles and `max`
+        :rtype: pd.DataFrame
+        """
+        counts = np.diag(self._counts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            stds = np.where(counts > 1, np.sqrt(np.diag(self._m2) / (counts - 1)), np.nan)
+            na_rates = 1 - counts / self.nb_rows if self.nb_rows > 0 else np.full(len(self.columns), np.nan)
+        rows = {"count": counts, "na_rate": na_rates, "mean": np.where(counts > 0, np.diag(self._means), np.nan), "std": stds,
+                "min": np.where(counts > 0, self._mins, np.nan)}
+        sketch_quantiles = np.array([sketch.getQuantiles(list(quantiles)) for sketch in self._sketches]).reshape(len(self.columns), -1)
+        for i, quantile in enumerate(quantiles):
+            rows["{:g}%".format(quantile * 100)] = sketch_quantiles[:, i]
+        rows["max"] = np.where(counts > 0, self._maxs, np.nan)
+        return pd.DataFrame(rows, index=self.columns).T
+
+    def getCorrelation(self) -> pd.DataFrame:
+        """Give the Pearson correlation matrix of the features, each pair being computed on the CNVs having both features
+
+        :return: correlation matrix indexed by feature
+        :rtype: pd.DataFrame
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = self._comoments / np.sqrt(self._m2 * self._m2.T)
+        correlation = np.where(self._counts > 1, np.clip(correlation, -1, 1), np.nan)
+        return pd.DataFrame(correlation, index=self.columns, columns=self.columns)
+
+
+def computeQCStatistics(cnv_chunks: Iterable, columns: list, sketch_size=QUANTILE_SKETCH_SIZE) -> QCStatistics:
+    """Compute the statistics of CNV features in one pass over chunks of CNVs
+
+    :param cnv_chunks: chunks of CNVs, or a single dataframe
+    :type cnv_chunks: Iterable
+    :param columns: list of the features described
+    :type columns: list
+    :param sketch_size: maximum number of values of a level of the quantile sketches, defaults to QUANTILE_SKETCH_SIZE
+    :type sketch_size: int, optional
+    :return: statistics of the features
+    :rtype: QCStatistics
+    """
+    statistics = QCStatistics(columns, sketch_size)
+    if isinstance(cnv_chunks, pd.DataFrame):
+        cnv_chunks = [cnv_chunks]
+    for chunk in cnv_chunks:
+        statistics.update(chunk)
+    dc_logger.info("Statistics of {} features computed on {} CNVs".format(len(columns), statistics.nb_rows))
+    return statistics
+
+
+def computeQCStatisticsFromFile(cnvs_path: str, columns: list, chunk_size=100000, table_format=None) -> QCStatistics:
+    """Compute the statistics of CNV features of a table file read chunk by chunk, only reading the described features
+
+    :param cnvs_path: Pathway of the CNVs table, tsv, csv, Parquet or Feather file
+    :type cnvs_path: str
+    :param columns: list of the features described
+    :type columns: list
+    :param chunk_size: Number of CNVs read at a time, defaults to 100000
+    :type chunk_size: int, optional
+    :param table_format: format of the table overriding the file extension, defaults to None
+    :type table_format: str, optional
+    :return: statistics of the features
+    :rtype: QCStatistics
+    """
+    return computeQCStatistics(readTableByChunks(cnvs_path, chunk_size, table_format=table_format, columns=columns), columns)
@@ -0,0 +1,347 @@
+from digcnv.digCNV_logger import logger as dc_logger
+from digcnv import utils
+from digcnv.tableIO import readTable, getTableFormat
+import pandas as pd
+import numpy as np
+import json
+import os
+import shutil
+import tempfile
+from os.path import exists, join
+
+# Version of the on-disk region pack layout, part of the pack cache key
+REGION_PACK_VERSION = 1
+
+
+class RegionIndex:
+    """Index of chromosomic regions (centromeres, segmental duplications, ...) stored as start and stop arrays sorted by start on each chromosome.
+    Used to compute the overlap between CNVs and the regions while only looking at the regions crossing each CNV.
+    """
+
+    def __init__(self, regions=None):
+        """Create the index from a dataframe of regions. Create an empty index if no region is given.
+
+        :param regions: list of regions with at least 3 mandatory columns, (`CHR`, `START`, `STOP`), defaults to None
+        :type regions: pd.DataFrame, optional
+        """
+        self._chromosomes = {}
+        self._pack_files = {}
+        if regions is None:
+            return
+        for chromosome, chr_regions in regions.groupby("CHR", sort=False):
+            starts = chr_regions.START.to_numpy(dtype=np.int64)
+            stops = chr_regions.STOP.to_numpy(dtype=np.int64)
+            order = np.argsort(starts, kind="mergesort")
+            self.addChromosome(chromosome, starts[order], stops[order])
+        dc_logger.info("Index created for {} regions on {} chromosomes".format(regions.shape[0], len(self._chromosomes)))
+
+    def addChromosome(self, chromosome: str, starts: np.ndarray, stops: np.ndarray):
+        """Add the regions of a chromosome to the index
+
+        :param chromosome: chromosome name, formatted as in the CNV list (ex: `chr1`)
+        :type chromosome: str
+        :param starts: start coordinates of the regions sorted in increasing order
+        :type starts: np.ndarray
+        :param stops: stop coordinates of the regions, in the same order as starts
+        :type stops: np.ndarray
+        """
+        # Running maximum of the stops: regions before the first one reaching a CNV start can't overlap the CNV
+        self._chromosomes[chromosome] = (starts, stops, np.maximum.accumulate(stops) if len(stops) > 0 else stops)
+
+    @classmethod
+    def fromPack(cls, pack_dir: str) -> "RegionIndex":
+        """Open a region pack created by `compileRegionPack`. Regions of a chromosome are memory-mapped only when the chromosome is first used.
+
+        :param pack_dir: Pathway of the region pack directory
+        :type pack_dir: str
+        :raises Exception: If the pack was written with another pack format version
+        :return: The index of the packed regions
+        :rtype: RegionIndex
+        """
+        with open(join(pack_dir, "index.json")) as f:
+            header = json.load(f)
+        if header["version"] != REGION_PACK_VERSION:
+            raise Exception("Region pack {} has version {}, expected {}".format(pack_dir, header["version"], REGION_PACK_VERSION))
+        index = cls()
+        index._pack_files = {chromosome: join(pack_dir, file_name) for chromosome, file_name in header["chromosomes"].items()}
+        return index
+
+    def _getChromosome(self, chromosome: str):
+        """get the sorted arrays of a chromosome, loading them from the pack if needed. Returns None if the chromosome has no region"""
+        if chromosome not in self._chromosomes and chromosome in self._pack_files:
+            starts, stops, max_stops = np.load(self._pack_files[chromosome], mmap_mode="r")
+            self._chromosomes[chromosome] = (starts, stops, max_stops)
+        return self._chromosomes.get(chromosome)
+
+    @property
+    def chromosomes(self) -> list:
+        """get the list of indexed chromosomes
+
+        :return: list of chromosome names having at least one region
+        :rtype: list
+        """
+        return list(dict.fromkeys(list(self._chromosomes.keys()) + list(self._pack_files.keys())))
+
+    def getChromosomeRegions(self, chromosome: str) -> tuple:
+        """get the sorted regions of a chromosome
+
+        :param chromosome: chromosome name
+        :type chromosome: str
+        :return: tuple of two arrays, the starts and stops of the regions sorted by start. Both empty if the chromosome has no region
+        :rtype: tuple
+        """
+        regions = self._getChromosome(chromosome)
+        if regions is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return regions[0], regions[1]
+
+    def findOverlappingPairs(self, chromosome: str, starts: np.ndarray, stops: np.ndarray) -> tuple:
+        """List every pair of CNV and region overlapping each other on a chromosome
+
+        :param chromosome: chromosome of the CNVs
+        :type chromosome: str
+        :param starts: start coordinates of the CNVs
+        :type starts: np.ndarray
+        :param stops: stop coordinates of the CNVs
+        :type stops: np.ndarray
+        :return: tuple of three arrays: the CNV positions, the region positions in the sorted regions and the number of overlapping bases of each pair
+        :rtype: tuple
+        """
+        regions = self._getChromosome(chromosome)
+        if regions is None:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        return findOverlappingPairs(regions[0], regions[1], regions[2], starts, stops)
+
+    def computeOverlap(self, chromosomes: pd.Series, starts: pd.Series, stops: pd.Series) -> np.ndarray:
+        """Compute for each CNV the sum of its overlap percentages with all indexed regions. CNVs on chromosomes without region have a null overlap.
+
+        :param chromosomes: chromosome of each CNV
+        :type chromosomes: pd.Series
+        :param starts: start coordinate of each CNV
+        :type starts: pd.Series
+        :param stops: stop coordinate of each CNV
+        :type stops: pd.Series
+        :return: An array listing the sum of overlap percentages for all given CNVs, in the same order
+        :rtype: np.ndarray
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        overlap = np.zeros(len(starts))
+        for chromosome, positions in pd.Series(np.asarray(chromosomes)).groupby(np.asarray(chromosomes), sort=False).indices.items():
+            pair_cnvs, _, overlaps = self.findOverlappingPairs(chromosome, starts[positions], stops[positions])
+            sizes = stops[positions] - starts[positions] + 1
+            overlap[positions] = np.bincount(pair_cnvs, weights=overlaps / sizes[pair_cnvs], minlength=len(positions))
+        return overlap
+
+
+class RegionTracks:
+    """Set of named region indexes (centromeres, segmental duplications, telomeres, ...) annotated together.
+    Regions of all tracks are combined by chromosome so each chromosome's CNVs are swept only once for all tracks.
+    """
+
+    def __init__(self, track_indexes: dict):
+        """Create the set of tracks
+
+        :param track_indexes: dictionary of track names and their RegionIndex
+        :type track_indexes: dict
+        """
+        self._track_names = list(track_indexes.keys())
+        self._track_indexes = list(track_indexes.values())
+        self._chromosomes = {}
+
+    @property
+    def track_names(self) -> list:
+        """get the list of track names
+
+        :return: list of track names in the order of the overlap columns
+        :rtype: list
+        """
+        return self._track_names
+
+    def _getChromosome(self, chromosome: str) -> tuple:
+        """get the regions of all tracks on a chromosome sorted by start, with the running maximum of stops and the track of each region"""
+        if chromosome not in self._chromosomes:
+            regions = [index.getChromosomeRegions(chromosome) for index in self._track_indexes]
+            starts = np.concatenate([chr_starts for chr_starts, _ in regions]).astype(np.int64)
+            stops = np.concatenate([chr_stops for _, chr_stops in regions]).astype(np.int64)
+            tracks = np.repeat(np.arange(len(regions)), [len(chr_starts) for chr_starts, _ in regions])
+            order = np.argsort(starts, kind="mergesort")
+            max_stops = np.maximum.accumulate(stops[order]) if len(stops) > 0 else stops
+            self._chromosomes[chromosome] = (starts[order], stops[order], max_stops, tracks[order])
+        return self._chromosomes[chromosome]
+
+    def computeOverlaps(self, chromosomes: pd.Series, starts: pd.Series, stops: pd.Series) -> np.ndarray:
+        """Compute for each CNV and each track the sum of its overlap percentages with the regions of the track
+
+        :param chromosomes: chromosome of each CNV
+        :type chromosomes: pd.Series
+        :param starts: start coordinate of each CNV
+        :type starts: pd.Series
+        :param stops: stop coordinate of each CNV
+        :type stops: pd.Series
+        :return: An array of shape (number of CNVs, number of tracks) listing overlap percentages, in the same order as the CNVs and tracks
+        :rtype: np.ndarray
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        nb_tracks = len(self._track_names)
+        overlaps = np.zeros((len(starts), nb_tracks))
+        for chromosome, positions in pd.Series(np.asarray(chromosomes)).groupby(np.asarray(chromosomes), sort=False).indices.items():
+            region_starts, region_stops, region_max_stops, region_tracks = self._getChromosome(chromosome)
+            pair_cnvs, pair_regions, pair_overlaps = findOverlappingPairs(region_starts, region_stops, region_max_stops,
+                                                                          starts[positions], stops[positions])
+            sizes = stops[positions] - starts[positions] + 1
+            overlaps[positions] = np.bincount(pair_cnvs * nb_tracks + region_tracks[pair_regions],
+                                              weights=pair_overlaps / sizes[pair_cnvs],
+                                              minlength=len(positions) * nb_tracks).reshape(len(positions), nb_tracks)
+        return overlaps
+
+
+def findOverlappingPairs(region_starts: np.ndarray, region_stops: np.ndarray, region_max_stops: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> tuple:
+    """List every pair of CNV and region overlapping each other on a chromosome
+
+    :param region_starts: start coordinates of the regions sorted in increasing order
+    :type region_starts: np.ndarray
+    :param region_stops: stop coordinates of the regions, in the same order as region_starts
+    :type region_stops: np.ndarray
+    :param region_max_stops: running maximum of region_stops
+    :type region_max_stops: np.ndarray
+    :param starts: start coordinates of the CNVs
+    :type starts: np.ndarray
+    :param stops: stop coordinates of the CNVs
+    :type stops: np.ndarray
+    :return: tuple of three arrays: the CNV positions, the region positions and the number of overlapping bases of each pair
+    :rtype: tuple
+    """
+    # Candidate regions start before the CNV stop and come after the last region ending before the CNV start
+    firsts = np.searchsorted(region_max_stops, starts, side="left")
+    lasts = np.searchsorted(region_starts, stops, side="right")
+    counts = np.maximum(lasts - firsts, 0)
+    pair_cnvs = np.repeat(np.arange(len(starts)), counts)
+    pair_regions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - firsts, counts)
+    overlaps = np.minimum(stops[pair_cnvs], region_stops[pair_regions]) - np.maximum(
+        starts[pair_cnvs], region_starts[pair_regions]) + 1
+    overlapping = overlaps > 0
+    return pair_cnvs[overlapping], pair_regions[overlapping], overlaps[overlapping]
+
+
+def getRegionFileFormat(region_path: str) -> str:
+    """Give the format a region file is parsed with, from its extension: `bed` for BED files, otherwise its table format
+
+    :param region_path: Pathway to a tsv or BED file containing a list of regions coordinates
+    :type region_path: str
+    :return: format of the region file, one of `bed`, `tsv`, `csv`, `parquet` or `feather`
+    :rtype: str
+    """
+    if region_path.lower().endswith((".bed", ".bed.gz")):
+        return "bed"
+    return getTableFormat(region_path)
+
+
+def readRegionFile(region_path: str) -> pd.DataFrame:
+    """Read a file listing chromosomic regions: either a tsv (or Parquet/Feather) table containing `CHR`, `START` and `STOP` columns,
+    or a BED file (`.bed` or `.bed.gz`, no header, 0-based half-open coordinates) converted to 1-based inclusive coordinates.
+
+    :param region_path: Pathway to a tsv or BED file containing a list of regions coordinates
+    :type region_path: str
+    :raises Exception: If the given file pathway doesn't exist
+    :raises Exception: If the given file hasn't mandatory columns (`CHR`, `START`, `STOP`)
+    :return: list of regions
+    :rtype: pd.DataFrame
+    """
+    if not exists(region_path):
+        raise Exception("File {} note found".format(region_path))
+    if getRegionFileFormat(region_path) == "bed":
+        regions = pd.read_csv(region_path, sep='\t', header=None, usecols=[0, 1, 2], names=["CHR", "START", "STOP"],
+                              comment="#")
+        regions = regions[~regions.CHR.astype(str).str.startswith(("track", "browser"))]
+        regions["START"] = regions.START.astype(np.int64) + 1
+        return regions
+    regions = readTable(region_path)
+    if len(regions.columns.intersection(["CHR", "START", "STOP"])) < 3:
+        raise Exception(
+            "The input file for the regions of interest must contain the following columns: CHR, START and STOP")
+    return regions
+
+
+def compileRegionPack(region_path: str, pack_dir: str) -> str:
+    """Compile a tsv file of regions into a region pack: a directory with one `.npy` file of int64 starts, stops and running maximum
+    of stops by chromosome, and an `index.json` header. The pack is written in a temporary directory then moved, so concurrent jobs
+    never read a partial pack.
+
+    :param region_path: Pathway to a tsv file containing a list of regions coordinates
+    :type region_path: str
+    :param pack_dir: Pathway of the region pack directory to create
+    :type pack_dir: str
+    :return: Pathway of the region pack directory
+    :rtype: str
+    """
+    regions = readRegionFile(region_path)
+    parent_dir = os.path.dirname(os.path.abspath(pack_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp_pack_")
+    try:
+        header = {"version": REGION_PACK_VERSION, "source": os.path.abspath(region_path), "nb_regions": int(regions.shape[0]),
+                  "chromosomes": {}}
+        for i, (chromosome, chr_arrays) in enumerate(RegionIndex(regions)._chromosomes.items()):
+            file_name = "chromosome_{}.npy".format(i)
+            np.save(join(tmp_dir, file_name), np.stack(chr_arrays))
+            header["chromosomes"][str(chromosome)] = file_name
+        with open(join(tmp_dir, "index.json"), "w") as f:
+            json.dump(header, f, indent=1)
+        os.rename(tmp_dir, pack_dir)
+        dc_logger.info("Region pack of {} compiled to {}".format(region_path, pack_dir))
+    except OSError:
+        # Another job created the same pack in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not exists(join(pack_dir, "index.json")):
+            raise
+    return pack_dir
+
+
+def loadRegionIndex(region_path: str, use_cache=True, cache_dir=None) -> RegionIndex:
+    """Load the index of a tsv file of regions. With the cache, the file is compiled once into a region pack stored under the hash of
+    its content and its format, and following calls only memory-map the chromosomes they use.
+
+    :param region_path: Pathway to a tsv file containing a list of regions coordinates
+    :type region_path: str
+    :param use_cache: Use the region pack cache, `False` reads the tsv file, defaults to True
+    :type use_cache: bool, optional
+    :param cache_dir: Pathway of the region pack cache, defaults to None to use the `region_packs` DigCNV cache directory
+    :type cache_dir: str, optional
+    :return: index of the regions
+    :rtype: RegionIndex
+    """
+    if not use_cache:
+        return RegionIndex(readRegionFile(region_path))
+    if not exists(region_path):
+        raise Exception("File {} note found".format(region_path))
+    try:
+        if cache_dir is None:
+            cache_dir = utils.getCacheDirectory("region_packs")
+        # The same content gives other regions when parsed as another format, ex: BED coordinates are shifted
+        pack_dir = join(cache_dir, "v{}_{}_{}".format(REGION_PACK_VERSION, getRegionFileFormat(region_path),
+                                                      utils.computeFileHash(region_path)))
+        if not exists(join(pack_dir, "index.json")):
+            compileRegionPack(region_path, pack_dir)
+    except OSError as e:
+        dc_logger.warning("Region pack cache unavailable ({}), reading {} directly".format(e, region_path))
+        return RegionIndex(readRegionFile(region_path))
+    dc_logger.info("Region pack {} opened for {}".format(pack_dir, region_path))
+    return RegionIndex.fromPack(pack_dir)
+
+
+def loadRegionTracks(track_paths: dict, use_cache=True, cache_dir=None) -> RegionTracks:
+    """Load a set of region tracks
+
+    :param track_paths: dictionary of track names and pathways of their tsv or BED region files
+    :type track_paths: dict
+    :param use_cache: Use the region pack cache, defaults to True
+    :type use_cache: bool, optional
+    :param cache_dir: Pathway of the region pack cache, defaults to None to use the `region_packs` DigCNV cache directory
+    :type cache_dir: str, optional
+    :return: set of region tracks
+    :rtype: RegionTracks
+    """
+    return RegionTracks({name: loadRegionIndex(path, use_cache, cache_dir) for name, path in track_paths.items()})
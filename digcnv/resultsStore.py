@@ -0,0 +1,193 @@
+from digcnv import CNVision
+from digcnv import dataVerif
+from digcnv import pipeline
+from digcnv import stageCache
+from digcnv.tableIO import readTable
+from digcnv.digCNV_logger import logger as dc_logger
+from os.path import join, exists
+import pandas as pd
+import tempfile
+import hashlib
+import pickle
+import json
+import uuid
+import os
+
+# Version of the results store format, stores of another version are rebuilt
+RESULTS_STORE_VERSION = 1
+
+INDEX_FILE_NAME = "index.json"
+
+
+class SampleResultsStore:
+    """Store of the DigCNV results of each sample, kept with the fingerprint of its inputs. Results are written by batches,
+    one pickle file per run, and an `index.json` file gives the batch of each sample. Batches no sample uses anymore are removed.
+    """
+
+    def __init__(self, store_dir: str):
+        """Open the store, it is created if needed
+
+        :param store_dir: Pathway of the store directory
+        :type store_dir: str
+        """
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.samples = {}
+        index_path = join(store_dir, INDEX_FILE_NAME)
+        if exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            if index["version"] == RESULTS_STORE_VERSION:
+                self.samples = index["samples"]
+            else:
+                dc_logger.warning("Results store {} has version {}, all samples are classified again".format(store_dir, index["version"]))
+        self._batches = {}
+
+    def getOutdatedSamples(self, fingerprints: dict) -> list:
+        """Give the samples which aren't in the store or whose results were computed from other inputs
+
+        :param fingerprints: fingerprint of the inputs of each sample, by sample key
+        :type fingerprints: dict
+        :return: keys of the outdated samples
+        :rtype: list
+        """
+        return [sample for sample, fingerprint in fingerprints.items()
+                if sample not in self.samples or self.samples[sample]["fingerprint"] != fingerprint]
+
+    def addResults(self, results: pd.DataFrame, fingerprints: dict):
+        """Add the results of samples as a new batch, replacing their previous results
+
+        :param results: CNVs of the samples with their DigCNV prediction
+        :type results: pd.DataFrame
+        :param fingerprints: fingerprint of the inputs of each sample of the batch, by sample key. Samples without any CNV have no rows.
+        :type fingerprints: dict
+        """
+        batch = "batch_{}.pkl".format(uuid.uuid4().hex)
+        tmp_path = join(self.store_dir, ".tmp_" + batch)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, join(self.store_dir, batch))
+        self._batches[batch] = results
+        for sample, fingerprint in fingerprints.items():
+            self.samples[sample] = {"fingerprint": fingerprint, "batch": batch}
+
+    def removeSamples(self, samples: list):
+        """Remove samples from the store
+
+        :param samples: keys of the samples to remove
+        :type samples: list
+        """
+        for sample in samples:
+            self.samples.pop(sample, None)
+
+    def _loadBatch(self, batch: str) -> pd.DataFrame:
+        if batch not in self._batches:
+            with open(join(self.store_dir, batch), "rb") as f:
+                self._batches[batch] = pickle.load(f)
+        return self._batches[batch]
+
+    def getResults(self, samples: list) -> pd.DataFrame:
+        """Gather the results of samples from their batches
+
+        :param samples: keys of the samples
+        :type samples: list
+        :return: CNVs of the samples with their DigCNV prediction
+        :rtype: pd.DataFrame
+        """
+        batch_samples = {}
+        for sample in samples:
+            batch_samples.setdefault(self.samples[sample]["batch"], set()).add(sample)
+        results = []
+        for batch, batch_keys in sorted(batch_samples.items()):
+            cnvs = self._loadBatch(batch)
+            if cnvs.shape[0] > 0:
+                results.append(cnvs[pipeline.getSampleKeys(cnvs).isin(batch_keys).to_numpy()])
+        if len(results) == 0:
+            return pd.DataFrame()
+        return pd.concat(results, ignore_index=True)
+
+    def save(self):
+        """Write the index of the store and remove the batches no sample uses anymore"""
+        index_path = join(self.store_dir, INDEX_FILE_NAME)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({"version": RESULTS_STORE_VERSION, "samples": self.samples}, f)
+        os.replace(index_path + ".tmp", index_path)
+        used_batches = {entry["batch"] for entry in self.samples.values()}
+        for file_name in os.listdir(self.store_dir):
+            if file_name.startswith("batch_") and file_name not in used_batches:
+                os.remove(join(self.store_dir, file_name))
+
+
+def computeSampleFingerprints(calling_outputs: dict, parameters: dict, merge_engine="python") -> dict:
+    """Compute the fingerprint of the inputs of each sample: its calling output lines, its micro-array quality data, and
+    the model, annotations and parameters shared by all samples
+
+    :param calling_outputs: header, lines and line samples of each calling output given by `CNVision.readCallingOutputLines`, by tag
+    :type calling_outputs: dict
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param merge_engine: {`python`, `perl`} engine used to merge CNV calling outputs, defaults to "python"
+    :type merge_engine: str, optional
+    :return: hexadecimal fingerprint of each sample, by sample key
+    :rtype: dict
+    """
+    shared_key = stageCache.computeStageKey(
+        "incremental", files=[parameters["DigCnvModel"], parameters["centromeres"], parameters["seg_dups"]] + list(parameters["tracks"].values()),
+        values={"tracks": list(parameters["tracks"].keys()), "output_prob": parameters["output_prob"],
+                "cascade_band": parameters["cascade_band"], "engine": merge_engine})
+    sample_hashes = {}
+    for tag, (header, lines, samples) in calling_outputs.items():
+        for line, sample in zip(lines, samples):
+            sample_hash = sample_hashes.setdefault(sample.lower(), hashlib.sha256(shared_key.encode()))
+            sample_hash.update("{}\t{}".format(tag, line).encode())
+    quality = readTable(parameters["QC"])
+    quality_keys = quality.iloc[:, 0].astype(str).str.lower().to_numpy()
+    quality_hashes = pd.util.hash_pandas_object(quality, index=False).to_numpy()
+    for sample, row_hash in zip(quality_keys, quality_hashes):
+        if sample in sample_hashes:
+            sample_hashes[sample].update(row_hash.tobytes())
+    return {sample: sample_hash.hexdigest() for sample, sample_hash in sample_hashes.items()}
+
+
+def runIncrementalPipeline(parameters: dict, store_dir: str, nb_workers=1, merge_engine="python", use_cache=True) -> pd.DataFrame:
+    """Run the DigCNV pipeline only on the samples which are new or whose inputs changed since the previous run with the same store,
+    ex: when a new genotyping batch is added to the calling outputs. Results of the other samples are taken from the store.
+    Changing the model, annotations or prediction parameters classifies all samples again.
+
+    :param parameters: parameters read from the config file by `utils.readDigCNVConfFile`
+    :type parameters: dict
+    :param store_dir: Pathway of the results store directory
+    :type store_dir: str
+    :param nb_workers: number of worker processes used for the outdated samples, defaults to 1
+    :type nb_workers: int, optional
+    :param merge_engine: {`python`, `perl`} engine used to merge CNV calling outputs, defaults to "python"
+    :type merge_engine: str, optional
+    :param use_cache: reuse the stage outputs cached by previous runs, defaults to True
+    :type use_cache: bool, optional
+    :return: CNVs of all samples with their describing features and the DigCNV prediction, in the order of a run on all samples
+    :rtype: pd.DataFrame
+    """
+    calling_outputs = {tag: CNVision.readCallingOutputLines(parameters[tag], software) for tag, software in pipeline.CALLING_SOFTWARES.items()}
+    fingerprints = computeSampleFingerprints(calling_outputs, parameters, merge_engine=merge_engine)
+    store = SampleResultsStore(store_dir)
+    outdated = store.getOutdatedSamples(fingerprints)
+    dc_logger.info("{} of {} samples are new or changed".format(len(outdated), len(fingerprints)))
+    if len(outdated) > 0:
+        outdated_keys = set(outdated)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            outdated_parameters = dict(parameters)
+            for tag, (header, lines, samples) in calling_outputs.items():
+                outdated_parameters[tag] = join(tmp_dir, "{}_allCNV.txt".format(tag))
+                with open(outdated_parameters[tag], "w") as f:
+                    if header is not None:
+                        f.write(header)
+                    f.writelines(line for line, sample in zip(lines, samples) if sample.lower() in outdated_keys)
+            results = pipeline.runPipeline(outdated_parameters, nb_workers=nb_workers, merge_engine=merge_engine, use_cache=use_cache)
+        store.addResults(results, {sample: fingerprints[sample] for sample in outdated})
+    store.removeSamples([sample for sample in store.samples if sample not in fingerprints])
+    store.save()
+    cnvs = store.getResults(list(fingerprints.keys()))
+    if cnvs.shape[0] == 0:
+        return cnvs
+    # Categories differ between batches, columns are cast again as a run on all samples gives them
+    return dataVerif.applyTableSchema(pipeline.orderClassifiedCnvs(cnvs), dataVerif.MERGED_CNVS_SCHEMA, "classified CNVs")
@@ -0,0 +1,195 @@
+from digcnv import CNVision
+from digcnv import pipeline
+from digcnv import tableIO
+from digcnv import utils
+from digcnv.digCNV_logger import logger as dc_logger
+from os.path import join, abspath, dirname, exists
+import pandas as pd
+import json
+import os
+
+# Version of the manifest format, manifests of another version can't be used
+SHARD_MANIFEST_VERSION = 1
+
+MANIFEST_FILE_NAME = "manifest.json"
+DONE_FILE_NAME = "done.json"
+
+# Extension of the shard output files of each table format
+TABLE_FORMAT_EXTENSIONS = {"tsv": ".tsv", "csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+def writeShardManifest(config_path: str, nb_shards: int, output_dir: str) -> str:
+    """Split the PennCNV and QuantiSNP outputs of a config file by sample into shards, run separately by `runManifestShard`
+    (ex: as tasks of a job array) then gathered by `reduceManifestShards`. Each shard gets a directory with its own calling
+    outputs, described with the config file in a `manifest.json` file. Samples are split into shards of balanced number of CNVs.
+
+    :param config_path: Pathway to the config file, read by `utils.readDigCNVConfFile`
+    :type config_path: str
+    :param nb_shards: number of shards, at most the number of samples
+    :type nb_shards: int
+    :param output_dir: Pathway of the directory where the manifest and shards are written
+    :type output_dir: str
+    :return: Pathway of the manifest file
+    :rtype: str
+    """
+    parameters = utils.readDigCNVConfFile(config_path)
+    calling_outputs = {tag: CNVision.readCallingOutputLines(parameters[tag], software) for tag, software in pipeline.CALLING_SOFTWARES.items()}
+    # Merging CNVs of a sample ignores the case of its ID
+    line_keys = {tag: pd.Series(samples, dtype=object).str.lower() for tag, (_, _, samples) in calling_outputs.items()}
+    sample_sizes = pd.concat(list(line_keys.values())).value_counts().sort_index()
+    sample_shards = pipeline.assignSampleShards(sample_sizes, nb_shards)
+    nb_shards = int(sample_shards.max()) + 1 if sample_shards.shape[0] > 0 else 0
+
+    output_format = tableIO.getTableFormat(parameters["output"], parameters["output_format"])
+    manifest = {"version": SHARD_MANIFEST_VERSION,
+                "config": abspath(config_path),
+                "config_sha256": utils.computeFileHash(config_path),
+                "nb_shards": nb_shards,
+                "output_format": output_format,
+                "shards": []}
+    line_shards = {tag: keys.map(sample_shards).to_numpy() for tag, keys in line_keys.items()}
+    os.makedirs(output_dir, exist_ok=True)
+    for shard in range(nb_shards):
+        shard_dir = "shard_{:04d}".format(shard)
+        os.makedirs(join(output_dir, shard_dir), exist_ok=True)
+        shard_files = {}
+        for tag, (header, lines, _) in calling_outputs.items():
+            shard_files[tag] = join(shard_dir, "{}_allCNV.txt".format(tag))
+            with open(join(output_dir, shard_files[tag]), "w") as f:
+                if header is not None:
+                    f.write(header)
+                f.writelines(line for line, line_shard in zip(lines, line_shards[tag]) if line_shard == shard)
+        samples = sample_sizes.index[sample_shards.to_numpy() == shard]
+        manifest["shards"].append({"shard": shard,
+                                   "directory": shard_dir,
+                                   "inputs": shard_files,
+                                   "nb_samples": int(samples.shape[0]),
+                                   "nb_calls": int(sample_sizes[samples].sum()),
+                                   "output": join(shard_dir, "DigCNV_output" + TABLE_FORMAT_EXTENSIONS[output_format])})
+    manifest_path = join(output_dir, MANIFEST_FILE_NAME)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    dc_logger.info("{} samples split into {} shards, manifest written to {}".format(sample_sizes.shape[0], nb_shards, manifest_path))
+    return manifest_path
+
+
+def readShardManifest(manifest_path: str) -> dict:
+    """Open a manifest written by `writeShardManifest`
+
+    :param manifest_path: Pathway of the manifest file
+    :type manifest_path: str
+    :raises Exception: If the manifest was written with another manifest format version
+    :return: the manifest
+    :rtype: dict
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest["version"] != SHARD_MANIFEST_VERSION:
+        raise Exception("Shard manifest {} has version {}, expected {}".format(manifest_path, manifest["version"], SHARD_MANIFEST_VERSION))
+    return manifest
+
+
+def _getShard(manifest: dict, shard: int) -> dict:
+    """Give the description of a shard of a manifest"""
+    if shard < 0 or shard >= manifest["nb_shards"]:
+        raise Exception("Shard {} doesn't exist, the manifest has {} shards (0 to {})".format(
+            shard, manifest["nb_shards"], manifest["nb_shards"] - 1))
+    return manifest["shards"][shard]
+
+
+def runManifestShard(manifest_path: str, shard: int, nb_workers=1, merge_engine="python", use_cache=True) -> str:
+    """Run the DigCNV pipeline on a shard of a manifest, with the parameters of the config file it was written from.
+    The shard output is written in its directory, then a `done.json` file marks the shard as finished.
+
+    :param manifest_path: Pathway of the manifest file
+    :type manifest_path: str
+    :param shard: index of the shard to run, from 0
+    :type shard: int
+    :param nb_workers: number of worker processes used for the shard, defaults to 1
+    :type nb_workers: int, optional
+    :param merge_engine: {`python`, `perl`} engine used to merge CNV calling outputs, defaults to "python"
+    :type merge_engine: str, optional
+    :param use_cache: reuse the stage outputs cached by previous runs of the shard, defaults to True
+    :type use_cache: bool, optional
+    :raises Exception: If the shard doesn't exist
+    :return: Pathway of the shard output
+    :rtype: str
+    """
+    manifest = readShardManifest(manifest_path)
+    shard_info = _getShard(manifest, shard)
+    manifest_dir = dirname(abspath(manifest_path))
+    if utils.computeFileHash(manifest["config"]) != manifest["config_sha256"]:
+        dc_logger.warning("Config file {} changed since shards were written".format(manifest["config"]))
+    parameters = utils.readDigCNVConfFile(manifest["config"])
+    parameters["PC"] = join(manifest_dir, shard_info["inputs"]["PC"])
+    parameters["QS"] = join(manifest_dir, shard_info["inputs"]["QS"])
+    done_path = join(manifest_dir, shard_info["directory"], DONE_FILE_NAME)
+    if exists(done_path):
+        os.remove(done_path)
+
+    predicted_cnvs = pipeline.runPipeline(parameters, nb_workers=nb_workers, merge_engine=merge_engine, use_cache=use_cache)
+    output_path = join(manifest_dir, shard_info["output"])
+    # The output is written under a temporary name so a killed task never leaves a partial output
+    tmp_output_path = join(manifest_dir, shard_info["directory"], ".tmp_" + os.path.basename(output_path))
+    tableIO.writeTable(predicted_cnvs, tmp_output_path, table_format=manifest["output_format"])
+    os.replace(tmp_output_path, output_path)
+    with open(done_path, "w") as f:
+        json.dump({"shard": shard, "nb_cnvs": int(predicted_cnvs.shape[0]), "output_sha256": utils.computeFileHash(output_path)}, f)
+    dc_logger.info("Shard {} of {} CNVs written to {}".format(shard, predicted_cnvs.shape[0], output_path))
+    return output_path
+
+
+def getUnfinishedShards(manifest_path: str) -> list:
+    """Give the shards of a manifest which didn't finish, or whose output changed since they finished
+
+    :param manifest_path: Pathway of the manifest file
+    :type manifest_path: str
+    :return: indexes of the unfinished shards
+    :rtype: list
+    """
+    manifest = readShardManifest(manifest_path)
+    manifest_dir = dirname(abspath(manifest_path))
+    unfinished = []
+    for shard_info in manifest["shards"]:
+        done_path = join(manifest_dir, shard_info["directory"], DONE_FILE_NAME)
+        output_path = join(manifest_dir, shard_info["output"])
+        if not exists(done_path) or not exists(output_path):
+            unfinished.append(shard_info["shard"])
+            continue
+        with open(done_path) as f:
+            done = json.load(f)
+        if done["output_sha256"] != utils.computeFileHash(output_path):
+            unfinished.append(shard_info["shard"])
+    return unfinished
+
+
+def reduceManifestShards(manifest_path: str, output_path=None, output_format=None) -> pd.DataFrame:
+    """Gather the outputs of all shards of a manifest once they all finished. CNVs are in the same order as a run
+    on all samples: classified CNVs in the merge order, followed by CNVs with missing data.
+
+    :param manifest_path: Pathway of the manifest file
+    :type manifest_path: str
+    :param output_path: Pathway of the gathered output file, defaults to None to not write it
+    :type output_path: str, optional
+    :param output_format: format of the output file overriding its extension, defaults to None
+    :type output_format: str, optional
+    :raises Exception: If some shards didn't finish
+    :return: CNVs of all shards with their describing features and the DigCNV prediction
+    :rtype: pd.DataFrame
+    """
+    manifest = readShardManifest(manifest_path)
+    unfinished = getUnfinishedShards(manifest_path)
+    if len(unfinished) > 0:
+        raise Exception("{} of {} shards didn't finish: {}".format(len(unfinished), manifest["nb_shards"],
+                                                                   ", ".join(str(shard) for shard in unfinished)))
+    manifest_dir = dirname(abspath(manifest_path))
+    shard_outputs = [tableIO.readTable(join(manifest_dir, shard_info["output"]), table_format=manifest["output_format"])
+                     for shard_info in manifest["shards"]]
+    # Columns of a shard without CNV are read without type, they would turn all gathered columns to objects
+    filled_outputs = [cnvs for cnvs in shard_outputs if cnvs.shape[0] > 0]
+    shard_cnvs = pd.concat(filled_outputs if len(filled_outputs) > 0 else shard_outputs, ignore_index=True)
+    cnvs = pipeline.orderClassifiedCnvs(shard_cnvs)
+    dc_logger.info("Outputs of {} shards gathered, {} CNVs".format(manifest["nb_shards"], cnvs.shape[0]))
+    if output_path is not None:
+        tableIO.writeTable(cnvs, output_path, table_format=output_format, index=True)
+    return cnvs
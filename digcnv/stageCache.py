@@ -0,0 +1,227 @@
+from digcnv import utils
+from digcnv.digCNV_logger import logger as dc_logger
+from os.path import join, isdir, exists
+import pandas as pd
+import hashlib
+import pickle
+import json
+import time
+import os
+
+# Version of the cache entries format, bumped when a stage output changes without a package version change
+STAGE_CACHE_VERSION = 1
+
+# Default bounds of the cache, least recently used entries are evicted beyond them
+DEFAULT_MAX_SIZE_GB = 10.0
+DEFAULT_MAX_AGE_DAYS = 30.0
+
+
+def _getPackageVersion() -> str:
+    """Give the installed DigCNV version, stage outputs of another version are never reused"""
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        return version("digcnv")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def computePathHash(path: str) -> str:
+    """Compute the SHA-256 hash of a file content, or of all files of a directory (ex: a model pack) with their names
+
+    :param path: Pathway of the file or directory to hash
+    :type path: str
+    :return: hexadecimal digest of the content
+    :rtype: str
+    """
+    if not isdir(path):
+        return utils.computeFileHash(path)
+    path_hash = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = join(root, file_name)
+            path_hash.update(os.path.relpath(file_path, path).encode())
+            path_hash.update(utils.computeFileHash(file_path).encode())
+    return path_hash.hexdigest()
+
+
+def computeTableHash(table: pd.DataFrame) -> str:
+    """Compute the SHA-256 hash of a table content, with its column names
+
+    :param table: the table to hash
+    :type table: pd.DataFrame
+    :return: hexadecimal digest of the content
+    :rtype: str
+    """
+    table_hash = hashlib.sha256(json.dumps([str(col) for col in table.columns]).encode())
+    table_hash.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+    return table_hash.hexdigest()
+
+
+def computeStageKey(stage: str, parent_key=None, files=None, values=None) -> str:
+    """Compute the key of a stage output from everything it depends on: the key of the previous stage output,
+    the content of its input files, its parameter values and the DigCNV version
+
+    :param stage: name of the stage
+    :type stage: str
+    :param parent_key: key of the output of the previous stage, defaults to None for the first stage
+    :type parent_key: str, optional
+    :param files: pathways of the files read by the stage, defaults to None
+    :type files: list, optional
+    :param values: JSON serializable parameters of the stage, defaults to None
+    :type values: dict, optional
+    :return: hexadecimal key of the stage output
+    :rtype: str
+    """
+    description = {"stage": stage, "parent": parent_key, "digcnv": _getPackageVersion(), "cache_version": STAGE_CACHE_VERSION,
+                   "files": [computePathHash(path) for path in (files or [])], "values": values or {}}
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StageCache:
+    """Local cache of pipeline stage outputs, stored under the key of everything they depend on.
+    Entries are pickle files evicted from the least recently used when the cache is too large or too old.
+    """
+
+    def __init__(self, cache_dir=None, max_size_gb=DEFAULT_MAX_SIZE_GB, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """Open the cache, its directory is created if needed
+
+        :param cache_dir: Pathway of the cache directory, defaults to None to use the `stages` DigCNV cache directory
+        :type cache_dir: str, optional
+        :param max_size_gb: maximum size of the cache in GB, defaults to DEFAULT_MAX_SIZE_GB
+        :type max_size_gb: float, optional
+        :param max_age_days: maximum number of days since an entry was last used, defaults to DEFAULT_MAX_AGE_DAYS
+        :type max_age_days: float, optional
+        """
+        if cache_dir is None:
+            cache_dir = utils.getCacheDirectory("stages")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_size_gb * 1e9
+        self.max_age_seconds = max_age_days * 24 * 3600
+
+    def _getEntryPath(self, stage: str, key: str) -> str:
+        return join(self.cache_dir, "{}_{}.pkl".format(stage, key))
+
+    def contains(self, stage: str, key: str) -> bool:
+        return exists(self._getEntryPath(stage, key))
+
+    def load(self, stage: str, key: str):
+        """Load the output of a stage
+
+        :param stage: name of the stage
+        :type stage: str
+        :param key: key of the stage output given by `computeStageKey`
+        :type key: str
+        :return: the stage output, None if it isn't in the cache or can't be read
+        """
+        entry_path = self._getEntryPath(stage, key)
+        try:
+            with open(entry_path, "rb") as f:
+                output = pickle.load(f)
+            # The access time of the entry is used to evict the least recently used ones
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            dc_logger.warning("Cache entry {} can't be read ({}), the stage is run again".format(entry_path, e))
+            return None
+        return output
+
+    def save(self, stage: str, key: str, output):
+        """Save the output of a stage. The entry is written under a temporary name then renamed, so concurrent runs never
+        read a partial entry.
+
+        :param stage: name of the stage
+        :type stage: str
+        :param key: key of the stage output given by `computeStageKey`
+        :type key: str
+        :param output: the stage output, a dataframe or a tuple of dataframes
+        """
+        entry_path = self._getEntryPath(stage, key)
+        tmp_path = "{}.tmp_{}".format(entry_path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            dc_logger.warning("Output of stage {} can't be cached ({})".format(stage, e))
+            if exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self) -> int:
+        """Remove the entries unused for more than the maximum age, then the least recently used ones until the cache
+        fits its maximum size
+
+        :return: number of entries removed
+        :rtype: int
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        now = time.time()
+        total_bytes = sum(size for _, size, _ in entries)
+        nb_removed = 0
+        for last_used, size, path in entries:
+            if now - last_used <= self.max_age_seconds and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                nb_removed += 1
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        if nb_removed > 0:
+            dc_logger.info("{} stage outputs evicted from the cache {}".format(nb_removed, self.cache_dir))
+        return nb_removed
+
+
+def _runStage(name: str, function, stage_input):
+    """Run a stage and log the shape of its output"""
+    output = function(stage_input)
+    shapes = [table.shape for table in (output if isinstance(output, tuple) else (output,)) if isinstance(table, pd.DataFrame)]
+    dc_logger.info("Stage {} done, CNVs dataframe shape = {}".format(name, ", ".join(str(shape) for shape in shapes)))
+    return output
+
+
+def runStages(stages: list, initial=None, cache=None):
+    """Run pipeline stages one after the other, each one getting the output of the previous one. With a cache, the run
+    restarts from the last stage whose output is cached with a matching key, and the outputs of the stages run are cached.
+
+    :param stages: list of tuples (name, inputs, function), `inputs` being a dictionary of the `files` and `values` the stage
+        depends on as given to `computeStageKey` and `function` computing the stage output from the previous one
+    :type stages: list
+    :param initial: input of the first stage, its content is part of the stage keys, defaults to None
+    :type initial: pd.DataFrame, optional
+    :param cache: cache of the stage outputs, defaults to None to run every stage
+    :type cache: StageCache, optional
+    :return: output of the last stage
+    """
+    if cache is None:
+        output = initial
+        for name, _, function in stages:
+            output = _runStage(name, function, output)
+        return output
+
+    keys = []
+    parent_key = None if initial is None else computeTableHash(initial)
+    for name, inputs, _ in stages:
+        keys.append(computeStageKey(name, parent_key, inputs.get("files"), inputs.get("values")))
+        parent_key = keys[-1]
+    first_stage, output = 0, initial
+    for i in reversed(range(len(stages))):
+        if cache.contains(stages[i][0], keys[i]):
+            cached_output = cache.load(stages[i][0], keys[i])
+            if cached_output is not None:
+                first_stage, output = i + 1, cached_output
+                dc_logger.info("Output of stage {} reused from the cache".format(stages[i][0]))
+                break
+    for (name, _, function), key in zip(stages[first_stage:], keys[first_stage:]):
+        output = _runStage(name, function, output)
+        cache.save(name, key, output)
+    cache.evict()
+    return output
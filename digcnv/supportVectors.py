@@ -0,0 +1,180 @@
+from digcnv.digCNV_logger import logger as dc_logger
+import numpy as np
+
+# Number of kernel values computed at a time, bounding the memory used to a few tens of MB
+BATCH_KERNEL_VALUES = 1 << 22
+
+# Bounds of the pairwise probabilities, stopping tolerance and maximum iterations of their coupling, as in libsvm
+MIN_PROBABILITY = 1e-7
+COUPLING_TOLERANCE = 0.005 / 2
+COUPLING_MAX_ITERATIONS = 100
+
+
+class SupportVectorClassifier:
+    """Binary support vector classifier with Platt scaling probabilities, computed with NumPy from the support vectors
+    and dual coefficients of a fitted scikit-learn SVC. Probabilities follow libsvm, used by scikit-learn.
+    """
+
+    def __init__(self, support_vectors: np.ndarray, dual_coef: np.ndarray, intercept: float, prob_a: float, prob_b: float,
+                 classes: np.ndarray, kernel="rbf", gamma=1.0, coef0=0.0, degree=3):
+        """Create the classifier from its support vectors and coefficients
+
+        :param support_vectors: support vectors, of shape (nb_support_vectors, nb_features)
+        :type support_vectors: np.ndarray
+        :param dual_coef: dual coefficient of each support vector, as used by libsvm
+        :type dual_coef: np.ndarray
+        :param intercept: intercept of the decision function, as used by libsvm
+        :type intercept: float
+        :param prob_a: slope of the Platt scaling sigmoid
+        :type prob_a: float
+        :param prob_b: intercept of the Platt scaling sigmoid
+        :type prob_b: float
+        :param classes: the two classes predicted by the classifier
+        :type classes: np.ndarray
+        :param kernel: {`rbf`, `linear`, `poly`, `sigmoid`} kernel of the classifier, defaults to "rbf"
+        :type kernel: str, optional
+        :param gamma: kernel coefficient, defaults to 1.0
+        :type gamma: float, optional
+        :param coef0: independent term of the `poly` and `sigmoid` kernels, defaults to 0.0
+        :type coef0: float, optional
+        :param degree: degree of the `poly` kernel, defaults to 3
+        :type degree: int, optional
+        """
+        self.support_vectors = support_vectors
+        self.dual_coef = dual_coef
+        self.intercept = intercept
+        self.prob_a = prob_a
+        self.prob_b = prob_b
+        self.classes_ = classes
+        self.kernel = kernel
+        self.gamma = gamma
+        self.coef0 = coef0
+        self.degree = degree
+
+    @classmethod
+    def fromSVC(cls, svc) -> "SupportVectorClassifier":
+        """Export a fitted scikit-learn SVC trained with `probability=True`
+
+        :param svc: fitted binary SVC with probabilities
+        :type svc: SVC
+        :raises Exception: If the SVC isn't fitted, has no probabilities, more than two classes or a precomputed or custom kernel
+        :return: the exported classifier
+        :rtype: SupportVectorClassifier
+        """
+        if not hasattr(svc, "support_vectors_"):
+            raise Exception("SVC isn't fitted, it can't be exported")
+        if getattr(svc, "_probA", np.empty(0)).size == 0:
+            raise Exception("Only SVC trained with probabilities can be exported")
+        if len(svc.classes_) != 2:
+            raise Exception("Only binary SVC can be exported")
+        if svc.kernel not in ["rbf", "linear", "poly", "sigmoid"]:
+            raise Exception("SVC with a {} kernel can't be exported".format(svc.kernel))
+        # scikit-learn exposes the opposite of libsvm's decision function for binary classifiers, libsvm's one is kept
+        classifier = cls(np.asarray(svc.support_vectors_, dtype=np.float64), np.asarray(svc._dual_coef_[0], dtype=np.float64),
+                         float(svc._intercept_[0]), float(svc._probA[0]), float(svc._probB[0]), np.asarray(svc.classes_),
+                         kernel=svc.kernel, gamma=float(svc._gamma), coef0=float(svc.coef0), degree=int(svc.degree))
+        dc_logger.info("SVC exported with {} support vectors".format(classifier.support_vectors.shape[0]))
+        return classifier
+
+    def toArrays(self) -> tuple:
+        """Give the arrays and parameters describing the classifier, to save it
+
+        :return: dictionary of named arrays and dictionary of JSON serializable parameters
+        :rtype: tuple
+        """
+        arrays = {"support_vectors": self.support_vectors, "dual_coef": self.dual_coef, "classes": self.classes_}
+        params = {"intercept": self.intercept, "prob_a": self.prob_a, "prob_b": self.prob_b, "kernel": self.kernel,
+                  "gamma": self.gamma, "coef0": self.coef0, "degree": self.degree}
+        return arrays, params
+
+    @classmethod
+    def fromArrays(cls, arrays: dict, params: dict) -> "SupportVectorClassifier":
+        """Create the classifier from arrays and parameters given by `toArrays`, arrays can be memory-mapped
+
+        :param arrays: dictionary of named arrays
+        :type arrays: dict
+        :param params: dictionary of parameters
+        :type params: dict
+        :return: the classifier
+        :rtype: SupportVectorClassifier
+        """
+        return cls(arrays["support_vectors"], arrays["dual_coef"], params["intercept"], params["prob_a"], params["prob_b"],
+                   arrays["classes"], kernel=params["kernel"], gamma=params["gamma"], coef0=params["coef0"], degree=params["degree"])
+
+    def _computeKernel(self, X: np.ndarray) -> np.ndarray:
+        """Compute the kernel between CNVs and the support vectors"""
+        products = X @ self.support_vectors.T
+        if self.kernel == "rbf":
+            distances = (X ** 2).sum(axis=1)[:, np.newaxis] + (self.support_vectors ** 2).sum(axis=1)[np.newaxis, :] - 2 * products
+            return np.exp(-self.gamma * np.maximum(distances, 0.0))
+        if self.kernel == "linear":
+            return products
+        if self.kernel == "poly":
+            return (self.gamma * products + self.coef0) ** self.degree
+        return np.tanh(self.gamma * products + self.coef0)
+
+    def decisionFunction(self, X: np.ndarray) -> np.ndarray:
+        """Compute libsvm's decision function of CNVs, positive values favour the first class
+
+        :param X: features of the CNVs, in the order used to fit the SVC
+        :type X: np.ndarray
+        :return: decision values
+        :rtype: np.ndarray
+        """
+        X = np.asarray(X, dtype=np.float64)
+        decision = np.empty(X.shape[0])
+        batch_size = max(1, BATCH_KERNEL_VALUES // max(1, self.support_vectors.shape[0]))
+        for start in range(0, X.shape[0], batch_size):
+            decision[start:start + batch_size] = self._computeKernel(X[start:start + batch_size]) @ self.dual_coef + self.intercept
+        return decision
+
+    def predictProba(self, X: np.ndarray) -> np.ndarray:
+        """Predict class probabilities of CNVs: Platt scaling of the decision values, then libsvm's pairwise coupling
+        which scikit-learn also runs for two classes
+
+        :param X: features of the CNVs, in the order used to fit the SVC
+        :type X: np.ndarray
+        :return: class probabilities of shape (nb_cnvs, 2)
+        :rtype: np.ndarray
+        """
+        scaled = self.decisionFunction(X) * self.prob_a + self.prob_b
+        exp_scaled = np.exp(-np.abs(scaled))
+        r01 = np.where(scaled >= 0, exp_scaled / (1.0 + exp_scaled), 1.0 / (1.0 + exp_scaled))
+        r01 = np.minimum(np.maximum(r01, MIN_PROBABILITY), 1 - MIN_PROBABILITY)
+        r10 = 1 - r01
+        # Q matrix of the coupling, symmetric
+        q00, q11, q01 = r10 * r10, r01 * r01, -r10 * r01
+        proba = np.full((r01.shape[0], 2), 0.5)
+        active = np.arange(r01.shape[0])
+        for _ in range(COUPLING_MAX_ITERATIONS):
+            p0, p1 = proba[active, 0], proba[active, 1]
+            qt = [(q00[active], q01[active]), (q01[active], q11[active])]
+            qp = [qt[0][0] * p0 + qt[0][1] * p1, qt[1][0] * p0 + qt[1][1] * p1]
+            pqp = p0 * qp[0] + p1 * qp[1]
+            converging = np.maximum(np.abs(qp[0] - pqp), np.abs(qp[1] - pqp)) >= COUPLING_TOLERANCE
+            if not converging.any():
+                break
+            active, pqp = active[converging], pqp[converging]
+            qt = [(q[0][converging], q[1][converging]) for q in qt]
+            qp = [values[converging] for values in qp]
+            p = [p0[converging], p1[converging]]
+            for t in range(2):
+                diff = (-qp[t] + pqp) / qt[t][t]
+                p[t] = p[t] + diff
+                pqp = (pqp + diff * (diff * qt[t][t] + 2 * qp[t])) / (1 + diff) / (1 + diff)
+                for j in range(2):
+                    qp[j] = (qp[j] + diff * qt[t][j]) / (1 + diff)
+                    p[j] = p[j] / (1 + diff)
+            proba[active, 0], proba[active, 1] = p
+        return proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict the class of CNVs from the sign of the decision function like scikit-learn does,
+        it may differ from the most probable class
+
+        :param X: features of the CNVs, in the order used to fit the SVC
+        :type X: np.ndarray
+        :return: predicted classes
+        :rtype: np.ndarray
+        """
+        return self.classes_[(self.decisionFunction(X) < 0).astype(int)]
@@ -0,0 +1,183 @@
+from digcnv.digCNV_logger import logger as dc_logger
+from typing import Iterator
+import pandas as pd
+
+# File extensions of each supported table format, compressed text tables (`.gz`, `.bz2`, ...) are handled by pandas
+TABLE_FORMAT_EXTENSIONS = {"parquet": (".parquet", ".pq"),
+                           "feather": (".feather", ".arrow", ".ipc"),
+                           "csv": (".csv", ".csv.gz", ".csv.bz2", ".csv.zip", ".csv.xz")}
+
+# Compression codec used when writing columnar tables
+COLUMNAR_COMPRESSION = "zstd"
+
+
+def getTableFormat(path: str, table_format=None) -> str:
+    """Give the format of a table file, from the given format or from its extension. Files with other extensions are tsv files.
+
+    :param path: Pathway of the table file
+    :type path: str
+    :param table_format: {`tsv`, `csv`, `parquet`, `feather`} format of the table overriding the file extension, defaults to None
+    :type table_format: str, optional
+    :raises Exception: If the given table format isn't supported
+    :return: format of the table, one of `tsv`, `csv`, `parquet` or `feather`
+    :rtype: str
+    """
+    if table_format is not None:
+        table_format = table_format.lower()
+        if table_format not in ["tsv", "csv", "parquet", "feather"]:
+            raise Exception("Table format {} isn't supported, use tsv, csv, parquet or feather".format(table_format))
+        return table_format
+    for known_format, extensions in TABLE_FORMAT_EXTENSIONS.items():
+        if str(path).lower().endswith(extensions):
+            return known_format
+    return "tsv"
+
+
+def _importPyArrow():
+    """Import pyarrow, needed for Parquet and Feather tables only"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise Exception("Parquet and Feather tables need the pyarrow package: pip install digcnv[columnar]")
+    return pyarrow
+
+
+def readTable(path: str, table_format=None, columns=None) -> pd.DataFrame:
+    """Read a table file in tsv, csv, Parquet or Feather format. Columnar formats only read the requested columns from disk.
+
+    :param path: Pathway of the table file
+    :type path: str
+    :param table_format: format of the table overriding the file extension, defaults to None
+    :type table_format: str, optional
+    :param columns: list of columns to read, defaults to None to read all columns
+    :type columns: list, optional
+    :return: the table
+    :rtype: pd.DataFrame
+    """
+    table_format = getTableFormat(path, table_format)
+    if table_format == "parquet":
+        _importPyArrow()
+        return pd.read_parquet(path, columns=columns)
+    elif table_format == "feather":
+        _importPyArrow()
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, sep="," if table_format == "csv" else "\t", usecols=columns)
+
+
+def readTableByChunks(path: str, chunk_size: int, table_format=None, columns=None) -> Iterator[pd.DataFrame]:
+    """Read a table file chunk by chunk
+
+    :param path: Pathway of the table file
+    :type path: str
+    :param chunk_size: Number of rows read at a time
+    :type chunk_size: int
+    :param table_format: format of the table overriding the file extension, defaults to None
+    :type table_format: str, optional
+    :param columns: list of columns to read, defaults to None to read all columns
+    :type columns: list, optional
+    :yield: chunks of the table, of at most chunk_size rows
+    :rtype: Iterator[pd.DataFrame]
+    """
+    table_format = getTableFormat(path, table_format)
+    if table_format == "parquet":
+        pyarrow = _importPyArrow()
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif table_format == "feather":
+        pyarrow = _importPyArrow()
+        with pyarrow.memory_map(str(path)) as source:
+            reader = pyarrow.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                for offset in range(0, batch.num_rows, chunk_size):
+                    yield batch.slice(offset, chunk_size).to_pandas()
+    else:
+        yield from pd.read_csv(path, sep="," if table_format == "csv" else "\t", usecols=columns, chunksize=chunk_size)
+
+
+def writeTable(table: pd.DataFrame, path: str, table_format=None, index=False):
+    """Write a table in tsv, csv, Parquet or Feather format. Columnar tables are compressed and keep the column types.
+
+    :param table: the table to write
+    :type table: pd.DataFrame
+    :param path: Pathway of the table file
+    :type path: str
+    :param table_format: format of the table overriding the file extension, defaults to None
+    :type table_format: str, optional
+    :param index: Write the row index as well, defaults to False
+    :type index: bool, optional
+    """
+    table_format = getTableFormat(path, table_format)
+    if table_format == "parquet":
+        _importPyArrow()
+        table.to_parquet(path, index=index, compression=COLUMNAR_COMPRESSION)
+    elif table_format == "feather":
+        _importPyArrow()
+        table = table.reset_index() if index else table.reset_index(drop=True)
+        table.to_feather(path, compression=COLUMNAR_COMPRESSION)
+    else:
+        table.to_csv(path, sep="," if table_format == "csv" else "\t", index=index)
+    dc_logger.info("Table of {} rows written to {} in {} format".format(table.shape[0], path, table_format))
+
+
+class ChunkedTableWriter:
+    """Writer appending chunks of a table to a tsv, csv, Parquet or Feather file. All chunks must have the columns of the first one.
+    To use as a context manager to close the file once all chunks are written.
+    """
+
+    def __init__(self, path: str, table_format=None):
+        """Create the writer, the file is created with the first chunk
+
+        :param path: Pathway of the table file
+        :type path: str
+        :param table_format: format of the table overriding the file extension, defaults to None
+        :type table_format: str, optional
+        """
+        self._path = path
+        self._table_format = getTableFormat(path, table_format)
+        self._writer = None
+        self._schema = None
+        self._sink = None
+        self.nb_rows = 0
+
+    def write(self, chunk: pd.DataFrame):
+        """Append a chunk to the table file
+
+        :param chunk: rows to append, with the same columns as the previous chunks
+        :type chunk: pd.DataFrame
+        """
+        if self._table_format in ["parquet", "feather"]:
+            pyarrow = _importPyArrow()
+            batch = pyarrow.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = batch.schema
+                if self._table_format == "parquet":
+                    self._writer = pyarrow.parquet.ParquetWriter(self._path, self._schema, compression=COLUMNAR_COMPRESSION)
+                else:
+                    self._sink = pyarrow.OSFile(str(self._path), "wb")
+                    self._writer = pyarrow.ipc.new_file(self._sink, self._schema, options=pyarrow.ipc.IpcWriteOptions(
+                        compression=COLUMNAR_COMPRESSION))
+            self._writer.write_table(batch)
+        else:
+            chunk.to_csv(self._path, sep="," if self._table_format == "csv" else "\t", index=False,
+                         mode="w" if self.nb_rows == 0 else "a", header=self.nb_rows == 0)
+        self.nb_rows += chunk.shape[0]
+
+    def close(self):
+        """Close the table file"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
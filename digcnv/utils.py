@@ -1,6 +1,41 @@
 from digcnv import digCNV_logger
 
 import configparser
+import hashlib
+import os
+from os.path import expanduser, join
+
+
+def getCacheDirectory(subdirectory: str) -> str:
+    """Give the pathway of a DigCNV cache directory and create it if needed. Caches are stored in the directory given by
+    the `DIGCNV_CACHE_DIR` environment variable, or `~/.cache/digcnv` by default.
+
+    Args:
+        subdirectory (str): name of the cache (ex: `region_packs`)
+
+    Returns:
+        str: pathway of the cache directory
+    """
+    cache_dir = join(os.environ.get("DIGCNV_CACHE_DIR", join(expanduser("~"), ".cache", "digcnv")), subdirectory)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def computeFileHash(file_path: str, chunk_size=1 << 20) -> str:
+    """Compute the SHA-256 hash of a file content, read by chunks
+
+    Args:
+        file_path (str): pathway of the file to hash
+        chunk_size (int, optional): number of bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: hexadecimal digest of the file content
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
 
 
 def getConfigFileExample(exmpl_conf_output: str):
@@ -57,15 +92,29 @@ def readDigCNVConfFile(conf_file_path: str) -> dict:
     parameters["centromeres"] = config_file.get('Annotations', 'centromeres')
     parameters["seg_dups"] = config_file.get('Annotations', 'seg_dups')
 
+    # Track names are used in column names so they are read with their original case
+    tracks_file = configparser.ConfigParser()
+    tracks_file.optionxform = str
+    tracks_file.read(conf_file_path)
+    parameters["tracks"] = dict(tracks_file.items('Tracks')) if tracks_file.has_section('Tracks') else {}
+
     parameters['DigCnvModel'] = config_file.get('DigCNV', 'model_path')
+    cascade_band = config_file.get('DigCNV', 'cascade_band', fallback=None)
+    parameters["cascade_band"] = None if cascade_band is None else tuple(float(bound) for bound in cascade_band.split(","))
     
     save_str = config_file.get('Output', 'Save_to_file')
     parameters["save"] = True if save_str.lower() == 'true' else False
 
     parameters["output"] = config_file.get('Output', 'Output_path')
+    parameters["output_format"] = config_file.get('Output', 'output_format', fallback=None)
 
     out_prob_str = config_file.get('Output', 'output_probabilities')
     parameters["output_prob"] = True if out_prob_str.lower() == 'true' else False
 
+    # Cache of the pipeline stage outputs, see `stageCache.StageCache`
+    parameters["cache"] = {"directory": config_file.get('Cache', 'directory', fallback=None),
+                           "max_size_gb": config_file.getfloat('Cache', 'max_size_gb', fallback=10.0),
+                           "max_age_days": config_file.getfloat('Cache', 'max_age_days', fallback=30.0)}
+
     digCNV_logger.logger.info("Set of parameters created for DigCNV")
     return parameters
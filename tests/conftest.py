@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def digcnv_cache_dir(tmp_path, monkeypatch):
+    # Keep DigCNV caches of the tests out of the user cache directory
+    monkeypatch.setenv("DIGCNV_CACHE_DIR", str(tmp_path / "digcnv_cache"))
@@ -0,0 +1,184 @@
+from digcnv import CNVision
+from shutil import which
+import gzip
+import pandas as pd
+import pytest
+
+
+PENNCNV_LINES = [
+    "chr20:44356194-44378577       numsnp=7      length=22,384      state2,cn=1 /path/to/finalreport/10001 startsnp=rs232258 endsnp=rs380421 conf=16.163\n",
+    "chr9:17583310-17622213        numsnp=21     length=38,904      state5,cn=3 /path/to/finalreport/10001 startsnp=rs1028594 endsnp=rs3808750 conf=101.052\n",
+    "chr10:47543322-47703613       numsnp=47     length=160,292     state5,cn=3 /path/to/finalreport/10001 startsnp=rs11259779 endsnp=rs4128664 conf=156.227\n",
+    "chrX:1000-50000               numsnp=12     length=49,001      state3,cn=2 /path/to/finalreport/10002 startsnp=rs1 endsnp=rs2 conf=30.000\n",
+    "chr6:4263349-4472587          numsnp=69     length=209,239     state2,cn=1 /path/to/finalreport/10002 startsnp=rs6937085 endsnp=rs7746329 conf=120.225\n",
+    "chr6:4472587-4480000          numsnp=9      length=7,414       state2,cn=1 /path/to/finalreport/10002 startsnp=rs3 endsnp=rs4 conf=12.500\n",
+    "chr6:80608294-80611616        numsnp=6      length=3,323       state2,cn=1 /path/to/finalreport/10002 startsnp=rs17833835 endsnp=rs1887571 conf=20.441\n",
+]
+
+QUANTISNP_LINES = [
+    "Sample Name\tChromosome\tStart Position (bp)\tEnd Position (bp)\tStart Probe ID\tEnd Probe ID\tLength (bp)\tNo. Probes\tCopy Number\tMax. Log BF\t"
+    "Log BF: State 0\tLog BF: State 1\tLog BF: State 2\tLog BF: State 3\tLog BF: State 4\tLog BF: State 5\tLog BF: State 6\n",
+    "10001\t20\t44350000\t44370000\trs5\trs6\t20001\t8\t1\t25.2\t0\t0\t0\t0\t0\t0\t0\n",
+    "10001\t9\t17583310\t17622213\trs1028594\trs3808750\t38904\t20\t3\t60.1\t0\t0\t0\t0\t0\t0\t0\n",
+    "10001\t1\t31943355\t31943355\trs7545865\trs7545865\t1\t1\t1\t1.2152\t0\t0\t0\t0\t0\t0\t0\n",
+    "10002\t6\t4300000\t4475000\trs7\trs8\t175001\t40\t1\t80.7\t0\t0\t0\t0\t0\t0\t0\n",
+    "10002\t23\t1000\t60000\trs9\trs10\t59001\t15\t2\t40.0\t0\t0\t0\t0\t0\t0\t0\n",
+]
+
+
+@pytest.fixture
+def calling_outputs(tmp_path):
+    pc_path = tmp_path / "PC_allCNV.txt"
+    qs_path = tmp_path / "QS_allCNV.txt"
+    pc_path.write_text("".join(PENNCNV_LINES))
+    qs_path.write_text("".join(QUANTISNP_LINES))
+    return [str(pc_path), str(qs_path)]
+
+
+def test_readPennCNVOutput(calling_outputs):
+    cnvs = CNVision.readPennCNVOutput(calling_outputs[0])
+    assert cnvs.columns.tolist() == CNVision.CNVISION_FORMAT_COLUMNS
+    # chrX CNV of copy number 2 in PAR1 is removed
+    assert cnvs.shape[0] == 6
+    assert cnvs.SampleID.tolist()[:3] == ["10001", "10001", "10001"]
+    assert cnvs.at[0, "Size"] == 22384
+    assert cnvs.at[0, "Type"] == 1
+
+
+def test_readPennCNVOutput_empty_file(calling_outputs, tmp_path):
+    empty_path = tmp_path / "PC_empty.txt"
+    empty_path.write_text("")
+    cnvs = CNVision.readPennCNVOutput(str(empty_path))
+    assert cnvs.columns.tolist() == CNVision.CNVISION_FORMAT_COLUMNS
+    assert cnvs.shape[0] == 0
+    # An empty file adds no CNV to the other files
+    pd.testing.assert_frame_equal(CNVision.readPennCNVOutput([calling_outputs[0], str(empty_path)]),
+                                  CNVision.readPennCNVOutput(calling_outputs[0]))
+
+
+def test_readQuantiSNPOutput(calling_outputs):
+    cnvs = CNVision.readQuantiSNPOutput(calling_outputs[1])
+    # Single probe CNV and chrX CNV of copy number 2 in PAR1 are removed
+    assert cnvs.shape[0] == 3
+    assert "chrX" not in cnvs.Chr.tolist()
+
+
+def test_mergeMultipleCNVCallingOutputs(calling_outputs):
+    cnvs = CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "QuantiSNP"], engine="python")
+    assert cnvs.columns.tolist() == CNVision.CNVISION_MERGED_COLUMNS
+    assert cnvs.shape[0] == 5
+    chr20 = cnvs[cnvs.CHR == "chr20"].iloc[0]
+    assert (chr20.START, chr20.STOP, chr20.Size) == (44350000, 44378577, 28577)
+    assert chr20.Algos == "PC, QS"
+    assert (chr20.TwoAlgs, chr20["%One Alg"]) == (48, "51%")
+    # Touching PennCNV calls are merged into the QuantiSNP locus
+    chr6 = cnvs[(cnvs.CHR == "chr6") & (cnvs.START == 4263349)].iloc[0]
+    assert (chr6.STOP, chr6["#Algos"], chr6.TwoAlgs, chr6["%One Alg"]) == (4480000, 2, 80, "19%")
+
+
+def test_mergeMultipleCNVCallingOutputs_wrong_engine(calling_outputs):
+    with pytest.raises(Exception):
+        CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "QuantiSNP"], engine="java")
+
+
+@pytest.mark.skipif(which("perl") is None, reason="perl is not installed")
+@pytest.mark.parametrize("engine", ["python", "perl"])
+def test_mergeMultipleCNVCallingOutputs_unsupported_software(calling_outputs, engine, monkeypatch):
+    with pytest.raises(Exception, match="CNVPartition in't support"):
+        CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "CNVPartition"], engine=engine)
+    # A caller having a tag but no Perl format step fails before any step starts
+    monkeypatch.setitem(CNVision.CNVISION_ALGORITHM_TAGS, "CNVPartition", "CP")
+    monkeypatch.setattr(CNVision, "formatPennCNVforCNVision", lambda *args: pytest.fail("format step started"))
+    with pytest.raises(Exception, match="CNVPartition isn't supported by the perl merge engine"):
+        CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "CNVPartition"], engine="perl")
+
+
+def test_mergeEnginesAreIdentical(calling_outputs):
+    perl_cnvs = CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "QuantiSNP"], engine="perl")
+    python_cnvs = CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "QuantiSNP"], engine="python")
+    pd.testing.assert_frame_equal(perl_cnvs, python_cnvs)
+
+
+def test_getHandoffDirectory(calling_outputs, tmp_path, monkeypatch):
+    monkeypatch.setattr(CNVision, "RAM_TMP_DIR", str(tmp_path))
+    assert CNVision.getHandoffDirectory(calling_outputs) == str(tmp_path)
+    monkeypatch.setattr(CNVision, "RAM_TMP_DIR", str(tmp_path / "missing"))
+    assert CNVision.getHandoffDirectory(calling_outputs) is None
+
+
+def test_readCallingOutputs_gzip_and_glob(calling_outputs, tmp_path):
+    batch_dir = tmp_path / "batches"
+    batch_dir.mkdir()
+    # Each batch has its own files, gzipped or not, QuantiSNP files having their header
+    for i, lines in enumerate([PENNCNV_LINES[:4], PENNCNV_LINES[4:]]):
+        with gzip.open(batch_dir / "batch{}_PC.txt.gz".format(i), "wt") as f:
+            f.writelines(lines)
+    (batch_dir / "batch0_QS.txt").write_text("".join(QUANTISNP_LINES[:3]))
+    with gzip.open(batch_dir / "batch1_QS.txt.gz", "wt") as f:
+        f.writelines(QUANTISNP_LINES[:1] + QUANTISNP_LINES[3:])
+
+    pc_pattern, qs_pattern = str(batch_dir / "*_PC.txt.gz"), str(batch_dir / "*_QS.txt*")
+    assert len(CNVision.expandCallingOutputPaths(pc_pattern)) == 2
+    pd.testing.assert_frame_equal(CNVision.readPennCNVOutput(pc_pattern, nb_threads=2), CNVision.readPennCNVOutput(calling_outputs[0]))
+    pd.testing.assert_frame_equal(CNVision.readQuantiSNPOutput(qs_pattern), CNVision.readQuantiSNPOutput(calling_outputs[1]))
+    header, lines, samples = CNVision.readCallingOutputLines(qs_pattern, "QuantiSNP")
+    assert header == QUANTISNP_LINES[0]
+    assert lines == QUANTISNP_LINES[1:]
+    with pytest.raises(Exception):
+        CNVision.expandCallingOutputPaths(str(batch_dir / "*.vcf"))
+
+
+@pytest.mark.skipif(which("perl") is None, reason="perl is not installed")
+def test_mergePerlEngine_gzip(calling_outputs, tmp_path):
+    gz_path = tmp_path / "PC_allCNV.txt.gz"
+    with gzip.open(gz_path, "wt") as f:
+        f.writelines(PENNCNV_LINES)
+    perl_cnvs = CNVision.mergeMultipleCNVCallingOutputs([str(gz_path), calling_outputs[1]], ["PennCNV", "QuantiSNP"], engine="perl")
+    python_cnvs = CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "QuantiSNP"], engine="python")
+    pd.testing.assert_frame_equal(perl_cnvs, python_cnvs)
+
+
+def _formattedThirdCaller():
+    return pd.DataFrame([["10001", "10001", "chr20", 44360000, 44375000, 1, 30.0, 10, 15001, "rs11", "rs12"],
+                         ["10002", "10002", "chr6", 4400000, 4470000, 1, 50.0, 25, 70001, "rs13", "rs14"],
+                         ["10002", "10002", "chr7", 1000, 5000, 3, 12.0, 4, 4001, "rs15", "rs16"]],
+                        columns=CNVision.CNVISION_FORMAT_COLUMNS)
+
+
+def test_mergeFormattedCNVs_three_callers(calling_outputs):
+    formatted_cnvs = [CNVision.readPennCNVOutput(calling_outputs[0]), CNVision.readQuantiSNPOutput(calling_outputs[1]), _formattedThirdCaller()]
+    cnvs = CNVision.mergeFormattedCNVs(formatted_cnvs, ["PC", "QS", "IP"], caller_overlaps=True)
+    assert cnvs.shape[0] == 6
+    chr20 = cnvs[cnvs.CHR == "chr20"].iloc[0]
+    assert (chr20["#Algos"], chr20.Algos, chr20["%Three Algs"]) == (3, "IP, PC, QS", "34%")
+    assert chr20.Overlap_IP == pytest.approx(15000 / 28577)
+    assert chr20.Overlap_QS == pytest.approx(20000 / 28577)
+    chr7 = cnvs[cnvs.CHR == "chr7"].iloc[0]
+    assert (chr7.Overlap_IP, chr7.Overlap_PC, chr7.Overlap_QS) == (1.0, 0.0, 0.0)
+    # Without a third algorithm, loci and overlaps are those of the two algorithm merge
+    two_callers = CNVision.mergeFormattedCNVs(formatted_cnvs[:2], ["PC", "QS"], caller_overlaps=True)
+    pd.testing.assert_frame_equal(two_callers[CNVision.CNVISION_MERGED_COLUMNS],
+                                  CNVision.mergeMultipleCNVCallingOutputs(calling_outputs, ["PennCNV", "QuantiSNP"]))
+    chr20 = two_callers[two_callers.CHR == "chr20"].iloc[0]
+    assert (chr20.Overlap_PC, chr20.Overlap_QS) == (pytest.approx(22383 / 28577), pytest.approx(20000 / 28577))
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 100])
+def test_mergeSortedCNVStreams(calling_outputs, chunk_rows):
+    formatted_cnvs = [CNVision.readPennCNVOutput(calling_outputs[0]), CNVision.readQuantiSNPOutput(calling_outputs[1]), _formattedThirdCaller()]
+    tags = ["PC", "QS", "IP"]
+    streams = [CNVision.sortFormattedCNVs(cnvs) for cnvs in formatted_cnvs]
+    # A stream can also be an iterable of chunks
+    streams[1] = iter([streams[1].iloc[:1], streams[1].iloc[1:]])
+    cnvs = pd.concat(list(CNVision.mergeSortedCNVStreams(streams, tags, chunk_rows=chunk_rows)), ignore_index=True)
+    expected = CNVision.mergeFormattedCNVs(formatted_cnvs, tags, caller_overlaps=True)
+    for col in ["FID", "SampleID", "Type"]:
+        cnvs[col] = cnvs[col].astype(str)
+        expected[col] = expected[col].astype(str)
+    pd.testing.assert_frame_equal(cnvs, expected)
+
+
+def test_mergeSortedCNVStreams_unsorted(calling_outputs):
+    cnvs = CNVision.readPennCNVOutput(calling_outputs[0])
+    with pytest.raises(Exception):
+        list(CNVision.mergeSortedCNVStreams([cnvs.iloc[::-1]], ["PC"]))
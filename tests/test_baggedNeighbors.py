@@ -0,0 +1,84 @@
+from digcnv.baggedNeighbors import BaggedNearestNeighbors
+from digcnv import baggedNeighbors
+from sklearn.ensemble import BaggingClassifier
+from sklearn.neighbors import KNeighborsClassifier
+import numpy as np
+import pickle
+import pytest
+import sklearn
+
+
+@pytest.fixture(scope="module")
+def features():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(800, 6))
+    X[:, 5] = rng.integers(0, 101, 800)
+    y = (X[:, 0] + X[:, 1] + rng.normal(scale=0.5, size=800) > 0).astype(int)
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def bagging(features):
+    X, y = features
+    return BaggingClassifier(estimator=KNeighborsClassifier(weights="distance", n_neighbors=1), bootstrap=True,
+                             bootstrap_features=True, n_estimators=25, max_samples=0.35, random_state=42).fit(X[:500], y[:500])
+
+
+def test_predictProba_matches_sklearn(features, bagging):
+    X, _ = features
+    bagged_neighbors = BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+    assert bagged_neighbors.nb_members == 25
+    assert bagged_neighbors.training_features.shape[0] <= 500
+    assert np.array_equal(bagged_neighbors.predictProba(X[500:]), bagging.predict_proba(X[500:]))
+    assert np.array_equal(bagged_neighbors.predict(X[500:]), bagging.predict(X[500:]))
+
+
+@pytest.mark.parametrize("algorithm", ["kd_tree", "brute"])
+def test_predictProba_matches_sklearn_with_ties(algorithm, monkeypatch):
+    rng = np.random.default_rng(1)
+    # Discrete features and duplicated CNVs give many equidistant training CNVs of different classes
+    X = rng.integers(0, 3, size=(900, 6)).astype(np.float32)
+    X[:, 0] = rng.normal(size=900)
+    X[:, 5] = rng.choice([0.5, 1.0, 2.0], 900)
+    X[600:700] = X[:100]
+    y = rng.integers(0, 2, 900)
+    bagging = BaggingClassifier(estimator=KNeighborsClassifier(weights="distance", n_neighbors=1, algorithm=algorithm),
+                                bootstrap=True, bootstrap_features=True, n_estimators=40, max_samples=0.35,
+                                random_state=42).fit(X[:600], y[:600])
+    bagged_neighbors = BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+    assert np.array_equal(bagged_neighbors.predictProba(X[600:]), bagging.predict_proba(X[600:]))
+    restored = BaggedNearestNeighbors.fromArrays(*bagged_neighbors.toArrays())
+    assert np.array_equal(restored.predictProba(X[600:]), bagging.predict_proba(X[600:]))
+    # Blocks of a few CNVs, the last one partial
+    monkeypatch.setattr(baggedNeighbors, "BLOCK_PAIRS", 1000)
+    assert np.array_equal(restored.predictProba(X[600:]), bagging.predict_proba(X[600:]))
+
+
+def test_pickled_model_is_smaller(features, bagging):
+    X, _ = features
+    bagged_neighbors = BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+    bagged_neighbors.predictProba(X[500:510])
+    pickled = pickle.dumps(bagged_neighbors)
+    assert len(pickled) < len(pickle.dumps(bagging)) / 3
+    assert np.array_equal(pickle.loads(pickled).predictProba(X[500:]), bagging.predict_proba(X[500:]))
+
+
+def test_fromBaggingClassifier_not_nearest_neighbor(features):
+    X, y = features
+    bagging = BaggingClassifier(estimator=KNeighborsClassifier(n_neighbors=3), n_estimators=3).fit(X, y)
+    with pytest.raises(Exception):
+        BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+    with pytest.raises(Exception):
+        BaggedNearestNeighbors.fromBaggingClassifier(BaggingClassifier())
+    bagging = BaggingClassifier(estimator=KNeighborsClassifier(n_neighbors=1, algorithm="ball_tree"), n_estimators=3).fit(X, y)
+    with pytest.raises(Exception):
+        BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+
+
+def test_fromBaggingClassifier_untested_sklearn_version(bagging, monkeypatch):
+    monkeypatch.setattr(sklearn, "__version__", "1.10.0")
+    with pytest.raises(Exception, match="use_bagged_neighbors"):
+        BaggedNearestNeighbors.fromBaggingClassifier(bagging)
+    monkeypatch.setattr(sklearn, "__version__", "0.24.2")
+    with pytest.raises(Exception):
+        BaggedNearestNeighbors.fromBaggingClassifier(bagging)
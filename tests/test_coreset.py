@@ -0,0 +1,26 @@
+from digcnv import coreset
+import numpy as np
+import pytest
+
+
+def test_allocateSizes():
+    assert coreset._allocateSizes(np.array([900, 90, 10]), 100).tolist() == [88, 10, 2]
+    assert coreset._allocateSizes(np.array([5, 0, 1]), 10).tolist() == [5, 0, 1]
+    assert coreset._allocateSizes(np.array([50, 50]), 2).tolist() == [1, 1]
+
+
+def test_buildStratifiedCoreset():
+    rng = np.random.default_rng(0)
+    # A small group of CNVs far from the others must be kept in the coreset
+    features = np.concatenate([rng.normal(size=(2000, 3)), rng.normal(loc=20, size=(5, 3))]).astype(np.float32)
+    classes = np.concatenate([rng.integers(0, 2, 2000), np.ones(5, dtype=int)])
+    rows = coreset.buildStratifiedCoreset(features, classes, 200)
+    assert rows.shape[0] == 200
+    assert np.unique(rows).shape[0] == 200
+    assert np.all(np.diff(rows) > 0)
+    assert abs(np.mean(classes[rows]) - np.mean(classes)) < 0.01
+    assert np.any(rows >= 2000)
+    assert np.array_equal(rows, coreset.buildStratifiedCoreset(features, classes, 200))
+    assert coreset.buildStratifiedCoreset(features, classes, 5000).tolist() == list(range(2005))
+    with pytest.raises(Exception):
+        coreset.buildStratifiedCoreset(features, classes, 1)
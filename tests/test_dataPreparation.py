@@ -1,6 +1,7 @@
 from digcnv import dataPreparation
 import pandas as pd
-import pytest 
+import pytest
+import os
 
 
 @pytest.fixture
@@ -32,4 +33,78 @@ def test_transformTwoAlgsFeatures(global_data):
     cnvs = dataPreparation.transformTwoAlgsFeatures(global_data)
     assert cnvs.TwoAlgs.max() == 100
     assert cnvs.TwoAlgs.min() == 0
-    
\ No newline at end of file
+    
+def test_getSegDupOverlap(tmp_path):
+    segdups = pd.DataFrame({"CHR": ["chr1", "chr1", "chr1", "chr2"],
+                            "START": [100, 150, 1000, 500],
+                            "STOP": [400, 200, 1100, 600]})
+    segdup_path = tmp_path / "segdups.map"
+    segdups.to_csv(segdup_path, sep="\t", index=False)
+    cnvs = pd.DataFrame({"CHR": ["chr1", "chr3", "chr1", "chr2", "chr1"],
+                         "START": [1, 10, 300, 601, 1050],
+                         "STOP": [199, 20, 1049, 700, 1050]})
+    cnvs = dataPreparation.getSegDupOverlap(cnvs, str(segdup_path))
+    assert cnvs.shape[0] == 5
+    for i, cnv in cnvs.iterrows():
+        chr_segdups = segdups[segdups.CHR == cnv.CHR]
+        expected = sum(dataPreparation.computeOneOverlap(cnvs.loc[[i]], row.START, row.STOP)[0]
+                       for row in chr_segdups.itertuples())
+        assert cnv.overlapCNV_SegDup == pytest.approx(expected)
+    assert cnvs.at[1, "overlapCNV_SegDup"] == 0
+
+def test_addChromosomicAnnotation_extra_tracks(tmp_path):
+    telomere_path = tmp_path / "telomeres.bed"
+    telomere_path.write_text("chr1\t0\t10000\nchr1\t249240621\t249250621\n")
+    cnvs = pd.DataFrame({"CHR": ["chr1", "chr1", "chr2"],
+                         "START": [5001, 1000000, 100],
+                         "STOP": [15000, 1001000, 200]})
+    cnvs = dataPreparation.addChromosomicAnnotation(cnvs, extra_tracks={"Telomere": str(telomere_path)})
+    assert cnvs.columns.tolist()[-3:] == ["overlapCNV_Centromere", "overlapCNV_SegDup", "overlapCNV_Telomere"]
+    assert cnvs.overlapCNV_Telomere.tolist() == [0.5, 0, 0]
+
+def test_addSampleData(tmp_path):
+    callrate_path = tmp_path / "callrates.tsv"
+    pd.DataFrame({"IID": [3, 1, 2], "callRate": [0.97, 0.99, 0.98]}).to_csv(callrate_path, sep="\t", index=False)
+    tech_path = tmp_path / "technologies.tsv"
+    pd.DataFrame({"SampleID": [1, 2], "Technology": ["GSA", "OmniExpress"]}).to_csv(tech_path, sep="\t", index=False)
+    sample_data = dataPreparation.gatherSampleTables([
+        dataPreparation.readSampleTable(str(callrate_path), individual_colname="IID", columns={"callRate": "CallRate"}),
+        dataPreparation.readSampleTable(str(tech_path))])
+    cnvs = pd.DataFrame({"SampleID": [2, 1, 2, 3], "START": [1, 2, 3, 4], "CallRate": [0, 0, 0, 0]})
+    cnvs = dataPreparation.addSampleData(cnvs, sample_data)
+    assert cnvs.columns.tolist() == ["SampleID", "START", "CallRate", "Technology"]
+    assert cnvs.CallRate.tolist() == [0.98, 0.99, 0.98, 0.97]
+    assert cnvs.Technology.tolist()[:3] == ["OmniExpress", "GSA", "OmniExpress"]
+    assert cnvs.Technology.isna().tolist() == [False, False, False, True]
+
+def test_addCallRateToDataset_duplicates(tmp_path):
+    callrate_path = tmp_path / "callrates.tsv"
+    pd.DataFrame({"SampleID": [1, 1], "callRate": [0.97, 0.99]}).to_csv(callrate_path, sep="\t", index=False)
+    with pytest.raises(Exception):
+        dataPreparation.addCallRateToDataset(pd.DataFrame({"SampleID": [1]}), str(callrate_path))
+
+def test_countPfbProbes(tmp_path):
+    pfb_path = tmp_path / "gsa.pfb"
+    pfb_path.write_text("Name\tChr\tPosition\tPFB\nrs1\t1\t100\t0.5\nrs2\t1\t200\t0.2")
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    assert dataPreparation.countPfbProbes(str(pfb_path), cache_dir=str(cache_dir)) == 2
+    assert (cache_dir / dataPreparation.PROBE_COUNTS_FILE_NAME).exists()
+    # A changed file is counted again
+    pfb_path.write_text("Name\tChr\tPosition\tPFB\nrs1\t1\t100\t0.5\n")
+    os.utime(pfb_path, ns=(0, 0))
+    assert dataPreparation.countPfbProbes(str(pfb_path), cache_dir=str(cache_dir)) == 1
+    assert dataPreparation.countPfbProbes(str(pfb_path), use_cache=False) == 1
+
+def test_addNbProbeByTech_multiple_technologies(tmp_path):
+    pfb_path = tmp_path / "omni.pfb"
+    pfb_path.write_text("Name\tChr\tPosition\tPFB\n" + "".join("rs{}\t1\t{}\t0.5\n".format(i, i) for i in range(5)))
+    technology_path = tmp_path / "technologies.tsv"
+    pd.DataFrame({"SampleID": [1, 2, 3], "Technology": ["GSA", "Omni", "GSA"]}).to_csv(technology_path, sep="\t", index=False)
+    cnvs = pd.DataFrame({"SampleID": [2, 1, 3, 4]})
+    cnvs = dataPreparation.addNbProbeByTech(cnvs, sample_technologies=str(technology_path),
+                                            technology_probes={"GSA": 654027, "Omni": str(pfb_path)})
+    assert cnvs.Nb_Probe_tech.tolist()[:3] == [5, 654027, 654027]
+    assert pd.isna(cnvs.at[3, "Nb_Probe_tech"])
+    with pytest.raises(Exception):
+        dataPreparation.addNbProbeByTech(cnvs, sample_technologies={1: "GSA", 2: "Omni"}, technology_probes={"GSA": 654027})
@@ -0,0 +1,71 @@
+from digcnv import dataVerif
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def merged_cnvs():
+    return pd.DataFrame({"SampleID": ["10001", "10001", "10002"],
+                         "CHR": ["chr1", "chr2", "chr1"],
+                         "START": [1000, 5000, 3000000000],
+                         "STOP": [2000, 9000, 3000010000],
+                         "SCORE": [16.5, 101.25, 30.0],
+                         "SNP": [7, 21, 12],
+                         "TwoAlgs": [48, 0, 100]})
+
+
+def test_applyTableSchema(merged_cnvs):
+    cnvs = dataVerif.applyTableSchema(merged_cnvs.iloc[:2], dataVerif.MERGED_CNVS_SCHEMA)
+    assert isinstance(cnvs.SampleID.dtype, pd.CategoricalDtype)
+    assert isinstance(cnvs.CHR.dtype, pd.CategoricalDtype)
+    assert (cnvs.START.dtype, cnvs.SNP.dtype, cnvs.SCORE.dtype) == (np.int32, np.int32, np.float32)
+    assert cnvs.STOP.tolist() == [2000, 9000]
+    # Coordinates not fitting in int32 are kept in int64
+    assert dataVerif.applyTableSchema(merged_cnvs, dataVerif.MERGED_CNVS_SCHEMA).START.dtype == np.int64
+    # The given table isn't modified
+    assert merged_cnvs.SampleID.dtype != "category"
+
+
+def test_applyTableSchema_bad_inputs(merged_cnvs):
+    with pytest.raises(Exception, match="missing"):
+        dataVerif.applyTableSchema(merged_cnvs.drop(columns=["SNP"]), dataVerif.MERGED_CNVS_SCHEMA)
+    with pytest.raises(Exception, match="out of range"):
+        dataVerif.applyTableSchema(merged_cnvs.assign(SNP=[7, -1, 12]), dataVerif.MERGED_CNVS_SCHEMA)
+    with pytest.raises(Exception, match="numeric"):
+        dataVerif.applyTableSchema(merged_cnvs.assign(START=["1000", "5k", "3000"]), dataVerif.MERGED_CNVS_SCHEMA)
+
+
+def test_checkColumnsformats(merged_cnvs):
+    dataVerif.checkIfMandatoryColumnsExist(merged_cnvs, post_data_preparation=False)
+    dataVerif.checkColumnsformats(merged_cnvs, post_data_preparation=False)
+    with pytest.raises(Exception):
+        dataVerif.checkIfMandatoryColumnsExist(merged_cnvs, post_data_preparation=True)
+    prepared_cnvs = merged_cnvs.assign(SIZE=[1001, 4001, 10001], DENSITY=0.007, Score_SNP=2.3, TwoAlgs=[48, 0, 130])
+    dataVerif.checkIfMandatoryColumnsExist(prepared_cnvs, post_data_preparation=True)
+    with pytest.raises(Exception, match="TwoAlgs"):
+        dataVerif.checkColumnsformats(prepared_cnvs, post_data_preparation=True)
+
+
+def test_computeNaPercentage():
+    cnvs = pd.DataFrame({"WF": [0.1, np.nan, 0.3, 0.4, np.nan],
+                         "CallRate": [0.99, 0.98, np.nan, 0.97, 0.96],
+                         "SNP": [7, 21, 12, 8, 9]},
+                        index=[10, 11, 12, 13, 14])
+    kept, removed, report = dataVerif.splitCnvsWithNa(cnvs, ["WF", "CallRate", "SNP"])
+    assert kept.index.tolist() == [0, 1]
+    assert kept.SNP.tolist() == [7, 8]
+    # CNVs with missing data are ordered by their first column missing
+    assert removed.index.tolist() == [11, 14, 12]
+    assert report.nb_removed.tolist() == [2, 1, 0]
+    assert report.percentage.tolist() == [50.0, 50.0, 100.0]
+    kept, removed = dataVerif.computeNaPercentage(cnvs, ["WF", "CallRate", "SNP"], remove_na_data=True)
+    assert (kept.shape[0], removed.shape[0]) == (2, 3)
+    assert dataVerif.computeNaPercentage(cnvs, ["WF"], remove_na_data=False) is None
+
+
+def test_computeNaPercentage_without_removing():
+    cnvs = pd.DataFrame({"a": [1, np.nan, 3, 4, 5], "b": [np.nan, np.nan, 1, 2, 3]})
+    # Percentages of all CNVs, as (count - 1) / (number of CNVs - 1)
+    assert dataVerif.splitCnvsWithNa(cnvs, ["a", "b"], remove_na_data=False)[2].percentage.tolist() == [75.0, 50.0]
+    assert dataVerif.splitCnvsWithNa(cnvs, ["a", "b"])[2].percentage.tolist() == [75.0, (2 / 3) * 100]
@@ -0,0 +1,207 @@
+from digcnv import digCnvModel
+import pandas as pd
+import numpy as np
+import pytest
+
+
+DIMENSIONS = ["WF", "Score_SNP", "DENSITY", "CallRate", "overlapCNV_SegDup", "TwoAlgs", "Nb_Probe_tech"]
+
+
+def createCnvs(nb_cnvs: int, seed: int) -> tuple:
+    rng = np.random.default_rng(seed)
+    cnvs = pd.DataFrame(rng.normal(size=(nb_cnvs, len(DIMENSIONS))), columns=DIMENSIONS)
+    cnvs["TwoAlgs"] = rng.integers(0, 101, nb_cnvs)
+    classes = pd.Series((cnvs.WF + cnvs.Score_SNP + rng.normal(scale=0.5, size=nb_cnvs) > 0).astype(int))
+    return cnvs, classes
+
+
+@pytest.fixture(scope="module")
+def trained_model():
+    model = digCnvModel.DigCnvModel()
+    model.createDigCnvClassifier(rf_params={"n_estimators": 20, "max_depth": 10, "min_samples_split": 2,
+                                            "min_samples_leaf": 1, "max_leaf_nodes": 30, "min_weight_fraction_leaf": 0.0},
+                                 bg_knn_params={"n_estimators": 10, "max_samples": 0.35, "estimator__n_neighbors": 1})
+    training_data, training_cat = createCnvs(300, seed=0)
+    model.trainDigCnvModel(training_data, training_cat)
+    return model
+
+
+@pytest.fixture
+def cnvs():
+    return createCnvs(250, seed=1)[0]
+
+
+def test_predictCnvClassesByChunks(trained_model, cnvs):
+    expected = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    chunks = [cnvs.iloc[i:i + 60].copy() for i in range(0, cnvs.shape[0], 60)]
+    predicted = pd.concat(trained_model.predictCnvClassesByChunks(chunks, use_percentage=True))
+    pd.testing.assert_frame_equal(predicted, expected, check_exact=True)
+
+
+def test_predictCnvFileByChunks(trained_model, cnvs, tmp_path):
+    cnvs_path = tmp_path / "cnvs.tsv"
+    output_path = tmp_path / "predicted.tsv"
+    cnvs.to_csv(cnvs_path, sep="\t", index=False)
+    nb_cnvs = trained_model.predictCnvFileByChunks(str(cnvs_path), str(output_path), chunk_size=70)
+    predicted = pd.read_csv(output_path, sep="\t")
+    expected = trained_model.predictCnvClasses(pd.read_csv(cnvs_path, sep="\t"))
+    assert nb_cnvs == cnvs.shape[0]
+    assert predicted.DigCNVpred.tolist() == expected.DigCNVpred.tolist()
+
+
+def test_predictCnvClassesByChunks_not_trained(cnvs):
+    model = digCnvModel.DigCnvModel()
+    with pytest.raises(Exception):
+        next(model.predictCnvClassesByChunks([cnvs]))
+
+
+def test_predictCnvClasses_numpy_members(trained_model, cnvs):
+    trained_model.use_flat_forest = False
+    trained_model.use_bagged_neighbors = False
+    expected = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    expected_classes = trained_model.predictCnvClasses(cnvs.copy())
+    trained_model.use_flat_forest = True
+    trained_model.use_bagged_neighbors = True
+    predicted = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    assert trained_model.getFlatForest().nb_trees == 20
+    assert trained_model.getBaggedNeighbors().nb_members == 10
+    pd.testing.assert_frame_equal(predicted, expected)
+    assert trained_model.predictCnvClasses(cnvs.copy()).DigCNVpred.tolist() == expected_classes.DigCNVpred.tolist()
+
+
+def test_saveDigCnvModelPack(trained_model, cnvs, tmp_path):
+    pack_dir = str(tmp_path / "model")
+    trained_model.saveDigCnvModelPack(pack_dir)
+    model = digCnvModel.DigCnvModel()
+    model.openPreTrainedDigCnvModel(pack_dir)
+    assert model.checkIfDigCnvFitted()
+    assert model._dimensions == DIMENSIONS
+    expected = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    predicted = model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    pd.testing.assert_frame_equal(predicted, expected, check_exact=False, atol=1e-9)
+
+
+def test_saveDigCnvModelPack_large_batches(trained_model, tmp_path):
+    pack_dir = str(tmp_path / "model")
+    trained_model.saveDigCnvModelPack(pack_dir)
+    model = digCnvModel.DigCnvModel()
+    model.openPreTrainedDigCnvModel(pack_dir)
+    # Every batch is classified from the memory-mapped arrays of the pack, compared to the scikit-learn members
+    cnvs = createCnvs(1200, seed=3)[0]
+    trained_model.use_flat_forest = False
+    trained_model.use_bagged_neighbors = False
+    try:
+        expected = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    finally:
+        trained_model.use_flat_forest = True
+        trained_model.use_bagged_neighbors = True
+    predicted = model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    assert isinstance(model._model.members[0][1].roots, np.memmap)
+    pd.testing.assert_frame_equal(predicted, expected, check_exact=False, atol=1e-9)
+
+
+def test_predictCnvClasses_cascade(trained_model, cnvs):
+    expected = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True)
+    # A band covering all probabilities sends every CNV to the full soft vote
+    predicted = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True, cascade_band=(0.0, 1.0))
+    pd.testing.assert_frame_equal(predicted, expected)
+    assert trained_model.cascade_stats == {"nb_cnvs": 250, "nb_forest_only": 0, "nb_full_vote": 250}
+
+    predicted = trained_model.predictCnvClasses(cnvs.copy(), use_percentage=True, cascade_band=(0.3, 0.7))
+    stats = trained_model.cascade_stats
+    assert stats["nb_forest_only"] + stats["nb_full_vote"] == 250
+    assert 0 < stats["nb_forest_only"] < 250
+    split_cnvs = trained_model.scaleDimensions(cnvs)
+    _, uncertain = trained_model.predictCascadeProbabilities(split_cnvs, (0.3, 0.7))
+    assert predicted.class_1[uncertain].tolist() == expected.class_1[uncertain].tolist()
+    forest_proba = trained_model.getFlatForest().predictProba(split_cnvs.to_numpy())
+    assert predicted.class_1[~uncertain].tolist() == forest_proba[~uncertain, 1].tolist()
+
+    chunks = [cnvs.iloc[i:i + 100].copy() for i in range(0, cnvs.shape[0], 100)]
+    list(trained_model.predictCnvClassesByChunks(chunks, cascade_band=(0.3, 0.7)))
+    assert trained_model.cascade_stats == stats
+
+    with pytest.raises(Exception):
+        trained_model.predictCnvClasses(cnvs.copy(), cascade_band=(0.8, 0.2))
+
+
+def test_validateCascade(trained_model):
+    cnvs, classes = createCnvs(200, seed=2)
+    validation = trained_model.validateCascade(cnvs, classes, (0.0, 1.0))
+    assert validation["full_vote_fraction"] == 1.0
+    assert validation["agreement"] == 1.0
+    assert validation["cascade_accuracy"] == validation["full_vote_accuracy"]
+    validation = trained_model.validateCascade(cnvs, classes, (0.4, 0.6))
+    assert validation["full_vote_fraction"] < 1.0
+    assert 0.0 <= validation["agreement"] <= 1.0
+
+
+def test_buildFeatureMatrix(trained_model, cnvs):
+    features = trained_model.buildFeatureMatrix(cnvs)
+    assert features.dtype == np.float32
+    assert features.flags.c_contiguous
+    assert features.shape == (250, len(DIMENSIONS))
+    expected = trained_model.scaleDimensions(cnvs).to_numpy().astype(np.float32)
+    assert np.array_equal(features, expected)
+    # Members are trained on the matrix, not on a DataFrame
+    assert all(not hasattr(estimator, "feature_names_in_") for estimator in trained_model._model.estimators_)
+    assert np.array_equal(trained_model.predictProbabilities(features), trained_model.predictProbabilities(trained_model.scaleDimensions(cnvs)))
+
+
+def test_trainDigCnvModel_coreset(trained_model, monkeypatch, tmp_path):
+    from sklearn.ensemble import RandomForestClassifier, BaggingClassifier
+    from sklearn.svm import SVC
+    from sklearn.base import clone
+
+    model = digCnvModel.DigCnvModel()
+    model._model = clone(trained_model._model)
+    training_data, training_cat = createCnvs(300, seed=0)
+    forest_fit = RandomForestClassifier.fit
+    fitted_sizes = []
+    monkeypatch.setattr(RandomForestClassifier, "fit", lambda forest, X, y: fitted_sizes.append(X.shape[0]) or forest_fit(forest, X, y))
+    model.trainDigCnvModel(training_data, training_cat, coreset_size=100)
+    # The forest is only fitted once, on all CNVs
+    assert fitted_sizes == [300]
+    assert [name for name, _ in model._model.estimators] == ["Random Forest", "Bagging KNN", "SVC"]
+    assert [type(estimator) for estimator in model._model.estimators_] == [RandomForestClassifier, BaggingClassifier, SVC]
+    assert all(model._model.named_estimators_[name] is estimator
+               for (name, _), estimator in zip(model._model.estimators, model._model.estimators_))
+    model.saveDigCnvModelPack(str(tmp_path / "model"))
+    assert model.training_stats["nb_cnvs"] == 300
+    assert model.training_stats["nb_coreset_cnvs"] == 100
+    assert model._getMember(SVC).shape_fit_[0] == 100
+    assert model._getMember(BaggingClassifier)._n_samples == 100
+    # The forest is trained on all CNVs, as without coreset
+    forest = model._getMember(RandomForestClassifier)
+    features = model.buildFeatureMatrix(training_data)
+    expected = trained_model._getMember(RandomForestClassifier).predict_proba(features)
+    assert np.array_equal(forest.predict_proba(features), expected)
+
+
+def test_validateCoreset(trained_model):
+    training_data, training_cat = createCnvs(300, seed=0)
+    validation_data, validation_cat = createCnvs(100, seed=3)
+    validation = trained_model.validateCoreset(training_data, training_cat, validation_data, validation_cat, 150)
+    assert validation["nb_full_cnvs"] == 300
+    assert validation["nb_coreset_cnvs"] == 150
+    assert validation["auc_delta"] == validation["coreset_auc"] - validation["full_auc"]
+    assert 0.0 <= validation["coreset_accuracy"] <= 1.0
+    assert validation["speedup"] > 0
+    with pytest.raises(Exception):
+        digCnvModel.DigCnvModel().validateCoreset(training_data, training_cat, validation_data, validation_cat, 150)
+
+
+def test_evaluateCnvClassification_model_pack(trained_model, tmp_path):
+    import matplotlib
+    matplotlib.use("Agg")
+
+    pack_dir = str(tmp_path / "model")
+    trained_model.saveDigCnvModelPack(pack_dir)
+    model = digCnvModel.DigCnvModel()
+    model.openPreTrainedDigCnvModel(pack_dir)
+    cnvs, classes = createCnvs(200, seed=4)
+    for evaluated, images_dir in [(trained_model, tmp_path / "pkl"), (model, tmp_path / "pack")]:
+        images_dir.mkdir()
+        evaluated.evaluateCnvClassification(cnvs, classes, images_dir_path=str(images_dir))
+        assert (images_dir / "ROC_curve.pdf").exists()
+        assert (images_dir / "proba_distribution.pdf").exists()
@@ -0,0 +1,71 @@
+from digcnv.flatForest import FlatForest
+from digcnv import flatForest
+from sklearn.ensemble import RandomForestClassifier
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def features():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 5))
+    y = (X[:, 0] + X[:, 1] + rng.normal(scale=0.5, size=600) > 0).astype(int)
+    return X, y
+
+
+def test_predictProba_matches_sklearn(features):
+    X, y = features
+    forest = RandomForestClassifier(n_estimators=30, max_leaf_nodes=40, random_state=42).fit(X[:400], y[:400])
+    flat_forest = FlatForest.fromRandomForest(forest)
+    assert flat_forest.nb_trees == 30
+    assert np.array_equal(flat_forest.predictProba(X[400:]), forest.predict_proba(X[400:]))
+    assert np.array_equal(flat_forest.predict(X[400:]), forest.predict(X[400:]))
+    # Leaves are their own left child
+    leaves = flat_forest.apply(X[400:])
+    assert leaves.shape == (200, 30)
+    assert np.array_equal(flat_forest.left[leaves], leaves)
+
+
+def test_predictProba_large_batches(features, monkeypatch):
+    X, y = features
+    forest = RandomForestClassifier(n_estimators=30, max_leaf_nodes=40, random_state=42).fit(X[:400], y[:400])
+    flat_forest = FlatForest.fromRandomForest(forest)
+    # Blocks of 500 CNVs, the last one partial
+    monkeypatch.setattr(flatForest, "BATCH_PAIRS", 30 * 500)
+    X_large = np.random.default_rng(3).normal(size=(1700, 5))
+    assert np.array_equal(flat_forest.predictProba(X_large), forest.predict_proba(X_large))
+
+
+def test_predictProba_values_at_thresholds(features):
+    X, y = features
+    forest = RandomForestClassifier(n_estimators=10, random_state=0).fit(X[:400], y[:400])
+    flat_forest = FlatForest.fromRandomForest(forest)
+    # Single precision values around each threshold, which are rounded down
+    thresholds = np.concatenate([estimator.tree_.threshold[estimator.tree_.children_left >= 0] for estimator in forest.estimators_])
+    around = thresholds.astype(np.float32)
+    around = np.concatenate([around, np.nextafter(around, np.float32(np.inf)), np.nextafter(around, np.float32(-np.inf))])
+    X_around = np.tile(around[:, None], (1, X.shape[1]))
+    assert np.array_equal(flat_forest.predictProba(X_around), forest.predict_proba(X_around))
+
+
+def test_predictProba_missing_values(features):
+    X, y = features
+    X = X.copy()
+    X[np.random.default_rng(1).random(X.shape) < 0.1] = np.nan
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X[:400], y[:400])
+    flat_forest = FlatForest.fromRandomForest(forest)
+    assert np.array_equal(flat_forest.predictProba(X[400:]), forest.predict_proba(X[400:]))
+
+
+def test_predictProba_multiclass(features):
+    X, _ = features
+    classes = np.array(["del", "dup", "artifact"])[np.random.default_rng(2).integers(0, 3, X.shape[0])]
+    forest = RandomForestClassifier(n_estimators=10, random_state=0).fit(X[:400], classes[:400])
+    flat_forest = FlatForest.fromRandomForest(forest)
+    assert np.array_equal(flat_forest.predictProba(X[400:]), forest.predict_proba(X[400:]))
+    assert np.array_equal(flat_forest.predict(X[400:]), forest.predict(X[400:]))
+
+
+def test_fromRandomForest_not_fitted():
+    with pytest.raises(Exception):
+        FlatForest.fromRandomForest(RandomForestClassifier())
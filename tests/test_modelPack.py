@@ -0,0 +1,61 @@
+from digcnv import modelPack
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier, BaggingClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.svm import SVC
+import numpy as np
+import json
+import pytest
+import warnings
+
+
+@pytest.fixture(scope="module")
+def features():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 4))
+    y = (X[:, 0] + X[:, 1] + rng.normal(scale=0.5, size=500) > 0).astype(int)
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def voting(features):
+    X, y = features
+    voting = VotingClassifier(estimators=[
+        ("Random Forest", RandomForestClassifier(n_estimators=10, random_state=42)),
+        ("Bagging KNN", BaggingClassifier(estimator=KNeighborsClassifier(weights="distance", n_neighbors=1), bootstrap_features=True,
+                                          n_estimators=8, max_samples=0.35, random_state=42)),
+        ("SVC", SVC(probability=True, random_state=42))], voting="soft")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return voting.fit(X[:300], y[:300])
+
+
+def test_model_pack_round_trip(features, voting, tmp_path):
+    X, _ = features
+    pack_dir = str(tmp_path / "model")
+    scales = {"A": [0.5, 2.0], "B": [1.0, 1.0], "C": [0.0, 3.0], "D": [2.0, 0.5]}
+    modelPack.writeModelPack(pack_dir, scales, modelPack.CompactDigCnvClassifier.fromVotingClassifier(voting))
+    assert modelPack.isModelPack(pack_dir)
+    dimensions_scales, classifier = modelPack.readModelPack(pack_dir)
+    assert list(dimensions_scales.keys()) == ["A", "B", "C", "D"]
+    assert dimensions_scales == scales
+    assert [name for name, _ in classifier.members] == ["Random Forest", "Bagging KNN", "SVC"]
+    assert isinstance(classifier.members[0][1].left, np.memmap)
+    assert classifier.predict_proba(X[300:]) == pytest.approx(voting.predict_proba(X[300:]), abs=1e-9)
+    assert np.array_equal(classifier.predict(X[300:]), voting.predict(X[300:]))
+
+    # Packs are replaced, other directories are never overwritten
+    modelPack.writeModelPack(pack_dir, scales, classifier)
+    with pytest.raises(Exception):
+        modelPack.writeModelPack(str(tmp_path), scales, classifier)
+
+
+def test_readModelPack_other_version(features, voting, tmp_path):
+    pack_dir = str(tmp_path / "model")
+    modelPack.writeModelPack(pack_dir, {}, modelPack.CompactDigCnvClassifier.fromVotingClassifier(voting))
+    with open(tmp_path / "model" / "header.json") as f:
+        header = json.load(f)
+    header["version"] = modelPack.MODEL_PACK_VERSION + 1
+    with open(tmp_path / "model" / "header.json", "w") as f:
+        json.dump(header, f)
+    with pytest.raises(Exception):
+        modelPack.readModelPack(pack_dir)
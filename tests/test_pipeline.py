@@ -0,0 +1,99 @@
+from digcnv import pipeline, CNVision, digCnvModel
+from tests.test_CNVision import calling_outputs, QUANTISNP_LINES
+from os.path import join, dirname
+import digcnv
+import pandas as pd
+import numpy as np
+import pytest
+
+
+QUALITY_COLUMNS = ["LRR_mean", "LRR_median", "LRR_SD", "BAF_mean", "BAF_median", "BAF_SD", "BAF_DRIFT", "WF", "GCWF"]
+
+
+@pytest.fixture
+def cohort_parameters(tmp_path):
+    rng = np.random.default_rng(0)
+    pc_lines, qs_lines = [], QUANTISNP_LINES[:1]
+    for sample in range(40):
+        sample_id = str(20000 + sample)
+        for chromosome in rng.choice(np.arange(1, 23), size=rng.integers(2, 6), replace=False):
+            start, length, nb_snps = int(rng.integers(1000000, 100000000)), int(rng.integers(20000, 500000)), int(rng.integers(5, 200))
+            cn = int(rng.choice([1, 3]))
+            pc_lines.append("chr{}:{}-{} numsnp={} length={:,} state{},cn={} /path/to/finalreport/{} startsnp=rs1 endsnp=rs2 conf={:.3f}\n".format(
+                chromosome, start, start + length - 1, nb_snps, length, 2 if cn == 1 else 5, cn, sample_id, rng.uniform(5, 150)))
+            if rng.random() < 0.6:
+                qs_start, qs_length = start + int(rng.integers(-10000, 10000)), length + int(rng.integers(-10000, 10000))
+                qs_lines.append("{}\t{}\t{}\t{}\trs3\trs4\t{}\t{}\t{}\t{:.2f}\t0\t0\t0\t0\t0\t0\t0\n".format(
+                    sample_id, chromosome, qs_start, qs_start + qs_length - 1, qs_length, nb_snps, cn, rng.uniform(5, 100)))
+    (tmp_path / "PC.txt").write_text("".join(pc_lines))
+    (tmp_path / "QS.txt").write_text("".join(qs_lines))
+    quality = pd.DataFrame(rng.uniform(0, 0.3, size=(40, len(QUALITY_COLUMNS))), columns=QUALITY_COLUMNS)
+    quality.insert(0, "File", [str(20000 + sample) for sample in range(40)])
+    # CNVs of samples without quality data have missing data
+    quality.iloc[4:].to_csv(tmp_path / "QC.tsv", sep="\t", index=False)
+
+    dimensions = ["LRR_SD", "BAF_DRIFT", "WF", "DENSITY", "Score_SNP", "TwoAlgs"]
+    training_data = pd.DataFrame(rng.normal(size=(300, len(dimensions))), columns=dimensions)
+    model = digCnvModel.DigCnvModel()
+    model.createDigCnvClassifier(rf_params={"n_estimators": 10, "max_depth": 10, "min_samples_split": 2, "min_samples_leaf": 1,
+                                            "max_leaf_nodes": 30, "min_weight_fraction_leaf": 0.0},
+                                 bg_knn_params={"n_estimators": 5, "max_samples": 0.35, "estimator__n_neighbors": 1})
+    model.trainDigCnvModel(training_data, (training_data.WF > 0).astype(int))
+    model.saveDigCnvModelToPkl(str(tmp_path / "model.pkl"))
+    data_dir = join(dirname(digcnv.__file__), "data")
+    return {"PC": str(tmp_path / "PC.txt"), "QS": str(tmp_path / "QS.txt"), "QC": str(tmp_path / "QC.tsv"),
+            "centromeres": join(data_dir, "Region_centromere_hg19.dat"), "seg_dups": join(data_dir, "SegDup_filtres_Ok_Oct.map"),
+            "tracks": {}, "DigCnvModel": str(tmp_path / "model.pkl"), "cascade_band": None, "output_prob": True, "cache": {}}
+
+
+def test_assignSampleShards():
+    sample_sizes = pd.Series([50, 10, 30, 30, 20, 5, 5], index=["a", "b", "c", "d", "e", "f", "g"])
+    shards = pipeline.assignSampleShards(sample_sizes, 3)
+    assert shards.index.tolist() == sample_sizes.index.tolist()
+    loads = sample_sizes.groupby(shards).sum()
+    assert loads.shape[0] == 3
+    assert loads.max() - loads.min() <= 10
+    # Same shards whatever the call
+    assert shards.equals(pipeline.assignSampleShards(sample_sizes, 3))
+
+
+def test_assignSampleShards_more_shards_than_samples():
+    shards = pipeline.assignSampleShards(pd.Series([3, 1], index=["a", "b"]), 8)
+    assert sorted(shards.tolist()) == [0, 1]
+
+
+def test_sharded_merge_order(calling_outputs):
+    formatted_cnvs = [CNVision.readPennCNVOutput(calling_outputs[0]), CNVision.readQuantiSNPOutput(calling_outputs[1])]
+    tags = ["PC", "QS"]
+    merged_cnvs = CNVision.mergeFormattedCNVs(formatted_cnvs, tags)
+    sample_keys = [pipeline.getSampleKeys(cnvs) for cnvs in formatted_cnvs]
+    sample_shards = pipeline.assignSampleShards(pd.concat(sample_keys).value_counts().sort_index(), 2)
+    # Shards are merged in reverse order to check the order of merged CNVs is restored
+    shard_results = []
+    for shard in reversed(range(2)):
+        shard_cnvs = [cnvs[keys.map(sample_shards).to_numpy() == shard] for cnvs, keys in zip(formatted_cnvs, sample_keys)]
+        shard_results.append(CNVision.mergeFormattedCNVs(shard_cnvs, tags))
+    sharded_cnvs = pipeline.sortInMergeOrder(pd.concat(shard_results, ignore_index=True))
+    pd.testing.assert_frame_equal(sharded_cnvs, merged_cnvs.reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize("nb_workers", [2, 10])
+def test_runPipeline_same_output_whatever_the_workers(cohort_parameters, nb_workers):
+    predicted = pipeline.runPipeline(cohort_parameters, nb_workers=1, use_cache=False)
+    # With 10 workers, each of the 40 samples is a shard, and shards of samples without quality data have no CNV to classify
+    sharded = pipeline.runPipeline(cohort_parameters, nb_workers=nb_workers, use_cache=False)
+    assert predicted.DigCNVpred.isna().sum() > 0
+    assert predicted.DigCNVpred.notna().sum() > 0
+    assert predicted.index.tolist() == list(range(predicted.shape[0]))
+    pd.testing.assert_frame_equal(sharded, predicted)
+
+
+def test_predictPreparedCnvs_no_cnv_with_all_data(cohort_parameters):
+    model = digCnvModel.DigCnvModel()
+    model.openPreTrainedDigCnvModel(cohort_parameters["DigCnvModel"])
+    cnvs = pipeline.runPipeline(cohort_parameters, use_cache=False)
+    cnvs_with_na = cnvs[cnvs.DigCNVpred.isna()].drop(columns=["DigCNVpred", "class_1", "class_0"]).reset_index(drop=True)
+    predicted_cnvs, kept_apart = pipeline.predictPreparedCnvs(cnvs_with_na, cohort_parameters, model)
+    assert predicted_cnvs.shape[0] == 0
+    assert {"DigCNVpred", "class_1", "class_0"}.issubset(predicted_cnvs.columns)
+    assert kept_apart.shape[0] == cnvs_with_na.shape[0]
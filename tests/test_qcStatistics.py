@@ -0,0 +1,51 @@
+from digcnv import qcStatistics
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def cnvs():
+    rng = np.random.default_rng(0)
+    nb_cnvs = 5000
+    wf = rng.normal(0, 0.02, nb_cnvs)
+    cnvs = pd.DataFrame({"WF": wf,
+                         "Score_SNP": 3 + 20 * wf + rng.normal(0, 0.5, nb_cnvs),
+                         "DENSITY": rng.exponential(0.001, nb_cnvs),
+                         "SNP": rng.integers(3, 200, nb_cnvs)})
+    cnvs.loc[rng.random(nb_cnvs) < 0.1, "WF"] = np.nan
+    cnvs.loc[rng.random(nb_cnvs) < 0.05, "DENSITY"] = np.nan
+    return cnvs
+
+
+def test_computeQCStatistics(cnvs):
+    chunks = (cnvs.iloc[start:start + 700] for start in range(0, cnvs.shape[0], 700))
+    statistics = qcStatistics.computeQCStatistics(chunks, cnvs.columns.tolist(), sketch_size=512)
+    pd.testing.assert_frame_equal(statistics.getCorrelation(), cnvs.corr(), check_exact=False, atol=1e-10)
+    summary = statistics.getSummary()
+    expected = cnvs.describe()
+    for row in ["count", "mean", "std", "min", "max"]:
+        np.testing.assert_allclose(summary.loc[row].to_numpy(dtype=float), expected.loc[row].to_numpy(dtype=float), rtol=1e-9)
+    assert summary.loc["na_rate", "DENSITY"] == pytest.approx(cnvs.DENSITY.isna().mean())
+    # Quantiles are approximate once the sketch is compacted
+    for col in cnvs.columns:
+        assert (cnvs[col].dropna() <= summary.loc["50%", col]).mean() == pytest.approx(0.5, abs=0.02)
+
+
+def test_mergeQCStatistics(cnvs):
+    columns = cnvs.columns.tolist()
+    shards = [qcStatistics.computeQCStatistics(cnvs.iloc[:1200], columns), qcStatistics.computeQCStatistics(cnvs.iloc[1200:], columns)]
+    statistics = shards[0].merge(shards[1])
+    whole = qcStatistics.computeQCStatistics(cnvs, columns)
+    pd.testing.assert_frame_equal(statistics.getSummary(), whole.getSummary(), check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(statistics.getCorrelation(), whole.getCorrelation(), check_exact=False, atol=1e-10)
+    with pytest.raises(Exception):
+        statistics.merge(qcStatistics.QCStatistics(["WF"]))
+
+
+def test_computeQCStatisticsFromFile(cnvs, tmp_path):
+    cnvs_path = tmp_path / "cnvs.tsv"
+    cnvs.to_csv(cnvs_path, sep="\t", index=False)
+    statistics = qcStatistics.computeQCStatisticsFromFile(str(cnvs_path), ["WF", "SNP"], chunk_size=1000)
+    assert statistics.nb_rows == cnvs.shape[0]
+    assert statistics.getSummary().loc["50%", "SNP"] == cnvs.SNP.median()
@@ -0,0 +1,86 @@
+from digcnv import regionIndex
+import pandas as pd
+import numpy as np
+import pytest
+from os import listdir
+
+
+@pytest.fixture
+def region_path(tmp_path):
+    regions = pd.DataFrame({"CHR": ["chr1", "chr2", "chr1", "chr1"],
+                            "START": [1000, 500, 100, 150],
+                            "STOP": [1100, 600, 400, 200]})
+    path = tmp_path / "regions.tsv"
+    regions.to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+@pytest.fixture
+def cnvs():
+    return pd.DataFrame({"CHR": ["chr1", "chr3", "chr1", "chr2"],
+                         "START": [1, 10, 300, 550],
+                         "STOP": [199, 20, 1049, 700]})
+
+
+def test_computeOverlap(region_path, cnvs):
+    index = regionIndex.RegionIndex(regionIndex.readRegionFile(region_path))
+    overlap = index.computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP)
+    assert overlap == pytest.approx([(100 + 50) / 199, 0, (101 + 50) / 750, 51 / 151])
+    starts, stops = index.getChromosomeRegions("chr1")
+    assert starts.tolist() == [100, 150, 1000]
+    assert stops.tolist() == [400, 200, 1100]
+
+
+def test_loadRegionIndex_uses_pack(region_path, cnvs, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    index = regionIndex.loadRegionIndex(region_path, cache_dir=cache_dir)
+    assert len(listdir(cache_dir)) == 1
+    # Chromosomes are only loaded when used
+    assert index._chromosomes == {}
+    assert sorted(index.chromosomes) == ["chr1", "chr2"]
+    expected = regionIndex.loadRegionIndex(region_path, use_cache=False).computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP)
+    assert np.array_equal(index.computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP), expected)
+    assert isinstance(index.getChromosomeRegions("chr1")[0], np.memmap)
+
+    # Same content gives the same pack, a modified file gives a new one
+    regionIndex.loadRegionIndex(region_path, cache_dir=cache_dir)
+    assert len(listdir(cache_dir)) == 1
+    with open(region_path, "a") as f:
+        f.write("chr3\t1\t15\n")
+    index = regionIndex.loadRegionIndex(region_path, cache_dir=cache_dir)
+    assert len(listdir(cache_dir)) == 2
+    assert index.computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP)[1] == pytest.approx(6 / 11)
+
+
+def test_loadRegionIndex_pack_of_each_format(cnvs, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    bed_path, table_path = tmp_path / "gaps.bed", tmp_path / "gaps.tsv"
+    for path in [bed_path, table_path]:
+        path.write_text("chr1\t0\t50\nchr2\t600\t650\n")
+    index = regionIndex.loadRegionIndex(str(bed_path), cache_dir=cache_dir)
+    assert index.getChromosomeRegions("chr1")[0].tolist() == [1]
+    # Read as a table, the same content has no CHR, START and STOP header
+    with pytest.raises(Exception, match="CHR, START and STOP"):
+        regionIndex.loadRegionIndex(str(table_path), cache_dir=cache_dir)
+    assert len(listdir(cache_dir)) == 1
+
+
+def test_readRegionFile_missing_columns(tmp_path):
+    path = tmp_path / "regions.tsv"
+    pd.DataFrame({"CHR": ["chr1"], "BEGIN": [1], "END": [2]}).to_csv(path, sep="\t", index=False)
+    with pytest.raises(Exception):
+        regionIndex.readRegionFile(str(path))
+
+
+def test_RegionTracks_matches_single_indexes(region_path, cnvs, tmp_path):
+    bed_path = tmp_path / "gaps.bed"
+    bed_path.write_text("chr1\t0\t50\nchr2\t600\t650\nchr3\t9\t12\n")
+    tracks = regionIndex.loadRegionTracks({"Regions": region_path, "Gap": str(bed_path)})
+    overlaps = tracks.computeOverlaps(cnvs.CHR, cnvs.START, cnvs.STOP)
+    assert tracks.track_names == ["Regions", "Gap"]
+    assert overlaps.shape == (4, 2)
+    for i, path in enumerate([region_path, str(bed_path)]):
+        expected = regionIndex.loadRegionIndex(path).computeOverlap(cnvs.CHR, cnvs.START, cnvs.STOP)
+        assert overlaps[:, i] == pytest.approx(expected)
+    # BED coordinates are converted to 1-based inclusive coordinates
+    assert overlaps[:, 1] == pytest.approx([50 / 199, 3 / 11, 0, 50 / 151])
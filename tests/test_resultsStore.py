@@ -0,0 +1,111 @@
+from digcnv import resultsStore, pipeline, CNVision, dataVerif
+from tests.test_CNVision import PENNCNV_LINES, QUANTISNP_LINES
+from tests.test_pipeline import cohort_parameters
+import pandas as pd
+import pytest
+
+
+QUALITY_LINES = ["File\tLRR_mean\tLRR_median\tLRR_SD\tBAF_mean\tBAF_median\tBAF_SD\tBAF_DRIFT\tWF\tGCWF\n",
+                 "10001\t0.01\t0.0\t0.2\t0.5\t0.5\t0.03\t0.0\t0.01\t0.0\n",
+                 "10002\t0.02\t0.0\t0.25\t0.5\t0.5\t0.04\t0.0\t-0.01\t0.0\n"]
+
+
+@pytest.fixture
+def parameters(tmp_path):
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(b"model")
+    annotation_path = tmp_path / "regions.tsv"
+    annotation_path.write_text("CHR\tSTART\tSTOP\n1\t100\t200\n")
+    parameters = {"PC": str(tmp_path / "PC_allCNV.txt"), "QS": str(tmp_path / "QS_allCNV.txt"), "QC": str(tmp_path / "QC.tsv"),
+                  "centromeres": str(annotation_path), "seg_dups": str(annotation_path), "tracks": {},
+                  "DigCnvModel": str(model_path), "output_prob": False, "cascade_band": None}
+    writeInputs(parameters, PENNCNV_LINES, QUANTISNP_LINES, QUALITY_LINES)
+    return parameters
+
+
+def writeInputs(parameters: dict, pc_lines: list, qs_lines: list, quality_lines: list):
+    for tag, lines in [("PC", pc_lines), ("QS", qs_lines), ("QC", quality_lines)]:
+        with open(parameters[tag], "w") as f:
+            f.writelines(lines)
+
+
+@pytest.fixture
+def classified_samples(monkeypatch):
+    classified_samples = []
+
+    def fakePipeline(parameters: dict, nb_workers=1, merge_engine="python", use_cache=True) -> pd.DataFrame:
+        cnvs = CNVision.mergeMultipleCNVCallingOutputs([parameters["PC"], parameters["QS"]], ["PennCNV", "QuantiSNP"])
+        classified_samples.append(sorted(pipeline.getSampleKeys(cnvs).unique()))
+        with_na = (cnvs.START % 2 == 0).to_numpy()
+        cnvs["DigCNVpred"] = (cnvs.STOP % 2).astype(float)
+        cnvs.loc[with_na, "DigCNVpred"] = None
+        # Columns have the types of the schema as the pipeline gives them
+        return dataVerif.applyTableSchema(pd.concat([cnvs[~with_na], cnvs[with_na]]), dataVerif.MERGED_CNVS_SCHEMA)
+
+    monkeypatch.setattr(pipeline, "runPipeline", fakePipeline)
+    return classified_samples
+
+
+def test_runIncrementalPipeline(parameters, classified_samples, tmp_path):
+    store_dir = str(tmp_path / "store")
+    first_cnvs = resultsStore.runIncrementalPipeline(parameters, store_dir)
+    assert classified_samples == [["10001", "10002"]]
+    expected_cnvs = pipeline.runPipeline(parameters).reset_index(drop=True)
+    pd.testing.assert_frame_equal(first_cnvs, expected_cnvs, check_dtype=False)
+
+    # Nothing changed, every result comes from the store
+    classified_samples.clear()
+    pd.testing.assert_frame_equal(resultsStore.runIncrementalPipeline(parameters, store_dir), first_cnvs, check_dtype=False)
+    assert classified_samples == []
+
+    # A new sample is added and the quality data of another one changes
+    new_lines = [line.replace("/10001 ", "/10003 ") for line in PENNCNV_LINES[:2]]
+    quality_lines = QUALITY_LINES[:2] + [QUALITY_LINES[2].replace("0.25", "0.3"), QUALITY_LINES[1].replace("10001", "10003")]
+    writeInputs(parameters, PENNCNV_LINES + new_lines, QUANTISNP_LINES, quality_lines)
+    cnvs = resultsStore.runIncrementalPipeline(parameters, store_dir)
+    assert classified_samples == [["10002", "10003"]]
+    classified_samples.clear()
+    pd.testing.assert_frame_equal(cnvs, pipeline.runPipeline(parameters).reset_index(drop=True), check_dtype=False)
+
+
+def test_runIncrementalPipeline_removed_sample(parameters, classified_samples, tmp_path):
+    store_dir = str(tmp_path / "store")
+    resultsStore.runIncrementalPipeline(parameters, store_dir)
+    writeInputs(parameters, PENNCNV_LINES[:3], QUANTISNP_LINES[:4], QUALITY_LINES)
+    cnvs = resultsStore.runIncrementalPipeline(parameters, store_dir)
+    assert classified_samples == [["10001", "10002"]]
+    assert pipeline.getSampleKeys(cnvs).unique().tolist() == ["10001"]
+    assert list(resultsStore.SampleResultsStore(store_dir).samples.keys()) == ["10001"]
+
+
+def test_runIncrementalPipeline_model_change(parameters, classified_samples, tmp_path):
+    store_dir = str(tmp_path / "store")
+    resultsStore.runIncrementalPipeline(parameters, store_dir)
+    with open(parameters["DigCnvModel"], "wb") as f:
+        f.write(b"new model")
+    resultsStore.runIncrementalPipeline(parameters, store_dir)
+    assert classified_samples == [["10001", "10002"], ["10001", "10002"]]
+
+
+def test_runIncrementalPipeline_new_sample_without_pennCNV_calls(cohort_parameters, tmp_path):
+    store_dir = str(tmp_path / "store")
+    resultsStore.runIncrementalPipeline(cohort_parameters, store_dir, use_cache=False)
+    # Only the new sample is run again, its PennCNV output is empty
+    with open(cohort_parameters["QS"], "a") as f:
+        f.write("30000\t5\t1000000\t1200000\trs3\trs4\t200001\t40\t1\t60.0\t0\t0\t0\t0\t0\t0\t0\n")
+    cnvs = resultsStore.runIncrementalPipeline(cohort_parameters, store_dir, use_cache=False)
+    assert "30000" in cnvs.SampleID.astype(str).tolist()
+    pd.testing.assert_frame_equal(cnvs, pipeline.runPipeline(cohort_parameters, use_cache=False))
+
+
+def test_runIncrementalPipeline_new_samples_without_quality_data(cohort_parameters, tmp_path):
+    store_dir = str(tmp_path / "store")
+    resultsStore.runIncrementalPipeline(cohort_parameters, store_dir, use_cache=False)
+    # Quality data of the new batch isn't there yet, none of its CNVs can be classified
+    with open(cohort_parameters["PC"], "a") as f:
+        for sample in ["40000", "40001"]:
+            f.write("chr3:5000000-5100000 numsnp=30 length=100,001 state2,cn=1 /path/to/finalreport/{} "
+                    "startsnp=rs1 endsnp=rs2 conf=50.000\n".format(sample))
+    cnvs = resultsStore.runIncrementalPipeline(cohort_parameters, store_dir, use_cache=False)
+    assert cnvs[cnvs.SampleID.astype(str).isin(["40000", "40001"])].DigCNVpred.isna().sum() == 2
+    pd.testing.assert_frame_equal(cnvs, pipeline.runPipeline(cohort_parameters, use_cache=False))
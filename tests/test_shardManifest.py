@@ -0,0 +1,95 @@
+from digcnv import shardManifest, pipeline, CNVision, tableIO
+from tests.test_CNVision import calling_outputs
+from tests.test_pipeline import cohort_parameters
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def config_path(tmp_path, calling_outputs):
+    path = tmp_path / "config.ini"
+    path.write_text("[Inputs]\npc_output_path = {}\npc_qc_path = QC.tsv\nqs_output_path = {}\n"
+                    "[Annotations]\ncentromeres = centromeres.tsv\nseg_dups = seg_dups.tsv\n"
+                    "[Output]\nsave_to_file = True\noutput_path = {}\noutput_probabilities = False\n"
+                    "[DigCNV]\nmodel_path = model.pkl\n".format(calling_outputs[0], calling_outputs[1], tmp_path / "output.tsv"))
+    return str(path)
+
+
+def fakePipeline(parameters: dict, nb_workers=1, merge_engine="python", use_cache=True) -> pd.DataFrame:
+    cnvs = CNVision.mergeMultipleCNVCallingOutputs([parameters["PC"], parameters["QS"]], ["PennCNV", "QuantiSNP"])
+    with_na = (cnvs.START % 2 == 0).to_numpy()
+    cnvs["DigCNVpred"] = (cnvs.STOP % 2).astype(float)
+    cnvs.loc[with_na, "DigCNVpred"] = None
+    return pd.concat([cnvs[~with_na], cnvs[with_na]])
+
+
+def test_writeShardManifest(config_path, calling_outputs, tmp_path):
+    manifest_path = shardManifest.writeShardManifest(config_path, 2, str(tmp_path / "shards"))
+    manifest = shardManifest.readShardManifest(manifest_path)
+    assert manifest["nb_shards"] == 2
+    assert sum(shard["nb_samples"] for shard in manifest["shards"]) == 2
+    shard_cnvs = [CNVision.readPennCNVOutput(str(tmp_path / "shards" / shard["inputs"]["PC"])) for shard in manifest["shards"]]
+    # Each sample is in a single shard and no CNV is lost
+    assert len(set(shard_cnvs[0].SampleID) & set(shard_cnvs[1].SampleID)) == 0
+    assert sum(cnvs.shape[0] for cnvs in shard_cnvs) == CNVision.readPennCNVOutput(calling_outputs[0]).shape[0]
+    qs_cnvs = [CNVision.readQuantiSNPOutput(str(tmp_path / "shards" / shard["inputs"]["QS"])) for shard in manifest["shards"]]
+    assert sum(cnvs.shape[0] for cnvs in qs_cnvs) == CNVision.readQuantiSNPOutput(calling_outputs[1]).shape[0]
+
+
+def test_writeShardManifest_more_shards_than_samples(config_path, tmp_path):
+    manifest_path = shardManifest.writeShardManifest(config_path, 10, str(tmp_path / "shards"))
+    assert shardManifest.readShardManifest(manifest_path)["nb_shards"] == 2
+    with pytest.raises(Exception):
+        shardManifest.runManifestShard(manifest_path, 2)
+
+
+def test_reduceManifestShards(config_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "runPipeline", fakePipeline)
+    manifest_path = shardManifest.writeShardManifest(config_path, 2, str(tmp_path / "shards"))
+    shardManifest.runManifestShard(manifest_path, 1)
+    assert shardManifest.getUnfinishedShards(manifest_path) == [0]
+    with pytest.raises(Exception):
+        shardManifest.reduceManifestShards(manifest_path)
+
+    shardManifest.runManifestShard(manifest_path, 0)
+    assert shardManifest.getUnfinishedShards(manifest_path) == []
+    output_path = tmp_path / "reduced.tsv"
+    reduced_cnvs = shardManifest.reduceManifestShards(manifest_path, output_path=str(output_path))
+    assert output_path.exists()
+    parameters = shardManifest.utils.readDigCNVConfFile(config_path)
+    expected_cnvs = fakePipeline(parameters).reset_index(drop=True)
+    pd.testing.assert_frame_equal(reduced_cnvs.loc[:, expected_cnvs.columns], expected_cnvs, check_dtype=False)
+
+
+def test_getUnfinishedShards_changed_output(config_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "runPipeline", fakePipeline)
+    manifest_path = shardManifest.writeShardManifest(config_path, 2, str(tmp_path / "shards"))
+    for shard in range(2):
+        output_path = shardManifest.runManifestShard(manifest_path, shard)
+    with open(output_path, "a") as f:
+        f.write("truncated\n")
+    assert shardManifest.getUnfinishedShards(manifest_path) == [1]
+
+
+def test_runManifestShard_one_sample_shards(cohort_parameters, tmp_path):
+    with open(cohort_parameters["QS"], "a") as f:
+        # Samples with QuantiSNP calls only, the second one losing its single call to the quality filters
+        f.write("30000\t5\t1000000\t1200000\trs3\trs4\t200001\t40\t1\t60.0\t0\t0\t0\t0\t0\t0\t0\n")
+        f.write("30001\t5\t1000000\t1000000\trs3\trs3\t1\t1\t1\t2.0\t0\t0\t0\t0\t0\t0\t0\n")
+    config_path = tmp_path / "cohort.ini"
+    config_path.write_text("[Inputs]\npc_output_path = {PC}\npc_qc_path = {QC}\nqs_output_path = {QS}\n"
+                           "[Annotations]\ncentromeres = {centromeres}\nseg_dups = {seg_dups}\n"
+                           "[Output]\nsave_to_file = True\noutput_path = output.tsv\noutput_probabilities = True\n"
+                           "[DigCNV]\nmodel_path = {DigCnvModel}\n".format(**cohort_parameters))
+    manifest_path = shardManifest.writeShardManifest(str(config_path), 42, str(tmp_path / "shards"))
+    manifest = shardManifest.readShardManifest(manifest_path)
+    assert manifest["nb_shards"] == 42
+    # Shards of samples without PennCNV calls or without quality data are run as any other shard
+    assert any((tmp_path / "shards" / shard["inputs"]["PC"]).stat().st_size == 0 for shard in manifest["shards"])
+    for shard in range(manifest["nb_shards"]):
+        shardManifest.runManifestShard(manifest_path, shard, use_cache=False)
+    reduced_cnvs = shardManifest.reduceManifestShards(manifest_path)
+
+    # Same CNVs as a run on all samples, written to the same table format
+    tableIO.writeTable(pipeline.runPipeline(cohort_parameters, use_cache=False), str(tmp_path / "unsharded.tsv"))
+    pd.testing.assert_frame_equal(reduced_cnvs, tableIO.readTable(str(tmp_path / "unsharded.tsv")))
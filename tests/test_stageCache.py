@@ -0,0 +1,104 @@
+from digcnv import stageCache
+import pandas as pd
+import pytest
+import time
+import os
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / "input.tsv"
+    path.write_text("A\tB\n1\t2\n3\t4\n")
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return stageCache.StageCache(str(tmp_path / "stages"))
+
+
+def createStages(input_path, calls: list, factor=2) -> list:
+    def readInput(_):
+        calls.append("read")
+        return pd.read_csv(input_path, sep="\t")
+
+    def double(table):
+        calls.append("double")
+        return table * 2
+
+    def scale(table):
+        calls.append("scale")
+        return table * factor
+
+    return [("read", {"files": [str(input_path)]}, readInput), ("double", {}, double),
+            ("scale", {"values": {"factor": factor}}, scale)]
+
+
+def test_computeStageKey(input_path):
+    key = stageCache.computeStageKey("read", files=[str(input_path)], values={"factor": 2})
+    assert key == stageCache.computeStageKey("read", files=[str(input_path)], values={"factor": 2})
+    assert key != stageCache.computeStageKey("read", files=[str(input_path)], values={"factor": 3})
+    assert key != stageCache.computeStageKey("read", parent_key="parent", files=[str(input_path)], values={"factor": 2})
+    input_path.write_text("A\tB\n1\t2\n")
+    assert key != stageCache.computeStageKey("read", files=[str(input_path)], values={"factor": 2})
+
+
+def test_runStages_without_cache(input_path):
+    calls = []
+    output = stageCache.runStages(createStages(input_path, calls))
+    assert output.A.tolist() == [4, 12]
+    assert calls == ["read", "double", "scale"]
+
+
+def test_runStages_reuses_cached_stages(input_path, cache):
+    calls = []
+    expected = stageCache.runStages(createStages(input_path, calls), cache=cache)
+    calls.clear()
+    pd.testing.assert_frame_equal(stageCache.runStages(createStages(input_path, calls), cache=cache), expected)
+    assert calls == []
+
+    # Only the stage whose parameters changed runs
+    output = stageCache.runStages(createStages(input_path, calls, factor=3), cache=cache)
+    assert calls == ["scale"]
+    assert output.A.tolist() == [6, 18]
+
+    # Every stage runs again once the input file changes
+    calls.clear()
+    input_path.write_text("A\tB\n5\t6\n")
+    stageCache.runStages(createStages(input_path, calls), cache=cache)
+    assert calls == ["read", "double", "scale"]
+
+
+def test_runStages_initial_input(cache):
+    calls = []
+
+    def double(table):
+        calls.append("double")
+        return table * 2
+
+    stages = [("double", {}, double)]
+    stageCache.runStages(stages, pd.DataFrame({"A": [1, 2]}), cache=cache)
+    stageCache.runStages(stages, pd.DataFrame({"A": [1, 2]}), cache=cache)
+    assert calls == ["double"]
+    output = stageCache.runStages(stages, pd.DataFrame({"A": [1, 3]}), cache=cache)
+    assert calls == ["double", "double"]
+    assert output.A.tolist() == [2, 6]
+
+
+def test_evict(input_path, tmp_path):
+    cache = stageCache.StageCache(str(tmp_path / "stages"))
+    stageCache.runStages(createStages(input_path, []), cache=cache)
+    entries = sorted(os.listdir(cache.cache_dir))
+    assert len(entries) == 3
+    assert cache.evict() == 0
+
+    # Entries unused for too long are removed
+    old_entry = os.path.join(cache.cache_dir, entries[0])
+    os.utime(old_entry, (time.time() - 40 * 24 * 3600,) * 2)
+    assert cache.evict() == 1
+    assert not os.path.exists(old_entry)
+
+    # The least recently used entries are removed until the cache fits its size
+    small_cache = stageCache.StageCache(cache.cache_dir, max_size_gb=1e-12)
+    assert small_cache.evict() == 2
+    assert os.listdir(cache.cache_dir) == []
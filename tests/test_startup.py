@@ -0,0 +1,26 @@
+import subprocess
+import sys
+import time
+
+# Wall time budget of `python -m digcnv --help`, measured at ~1.1s (3.5s before plotting and tuning dependencies were
+# imported lazily) and given some headroom for slower machines
+CLI_STARTUP_BUDGET = 2.5
+
+# Modules only needed for plotting, hyperparameter tuning or training dataset resampling
+LAZY_MODULES = ["matplotlib", "seaborn", "imblearn", "sklearn.experimental", "sklearn.svm", "sklearn.metrics"]
+
+
+def test_cli_startup_budget():
+    # The first run warms up the bytecode cache
+    subprocess.run([sys.executable, "-m", "digcnv", "--help"], check=True, capture_output=True)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "digcnv", "--help"], check=True, capture_output=True)
+    assert time.perf_counter() - start < CLI_STARTUP_BUDGET
+
+
+def test_pipeline_modules_dont_import_lazy_modules():
+    code = ("import sys\n"
+            "import digcnv.__main__, digcnv.DigCnvTunning, digcnv.DigCnvPreProcessing\n"
+            "print(','.join(m for m in {} if m in sys.modules))".format(LAZY_MODULES))
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    assert result.stdout.strip() == ""
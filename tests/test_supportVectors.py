@@ -0,0 +1,32 @@
+from digcnv.supportVectors import SupportVectorClassifier
+from sklearn.svm import SVC
+import numpy as np
+import pytest
+import warnings
+
+
+@pytest.fixture(scope="module")
+def features():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(700, 5))
+    y = (X[:, 0] + X[:, 1] + rng.normal(scale=0.5, size=700) > 0).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize("kernel", ["rbf", "linear", "poly", "sigmoid"])
+def test_predictProba_matches_sklearn(features, kernel):
+    X, y = features
+    with warnings.catch_warnings():
+        # probability=True is deprecated by recent scikit-learn versions
+        warnings.simplefilter("ignore", FutureWarning)
+        svc = SVC(kernel=kernel, gamma="scale", C=10.0, probability=True, random_state=42).fit(X[:400], y[:400])
+    classifier = SupportVectorClassifier.fromSVC(svc)
+    assert classifier.predictProba(X[400:]) == pytest.approx(svc.predict_proba(X[400:]), abs=1e-9)
+    assert classifier.decisionFunction(X[400:]) == pytest.approx(-svc.decision_function(X[400:]), abs=1e-9)
+    assert np.array_equal(classifier.predict(X[400:]), svc.predict(X[400:]))
+
+
+def test_fromSVC_without_probabilities(features):
+    X, y = features
+    with pytest.raises(Exception):
+        SupportVectorClassifier.fromSVC(SVC().fit(X, y))
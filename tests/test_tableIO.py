@@ -0,0 +1,46 @@
+from digcnv import tableIO
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def cnvs():
+    return pd.DataFrame({"SampleID": ["10001", "10001", "10002", "10003", "10003"],
+                         "CHR": pd.Categorical(["chr1", "chr2", "chr1", "chrX", "chr2"]),
+                         "START": pd.array([100, 2000, 30000, 400, 5000], dtype="int32"),
+                         "SCORE": pd.array([1.5, 20.25, 3.0, 4.75, 5.5], dtype="float32")})
+
+
+def test_getTableFormat():
+    assert tableIO.getTableFormat("cnvs.parquet") == "parquet"
+    assert tableIO.getTableFormat("cnvs.FEATHER") == "feather"
+    assert tableIO.getTableFormat("cnvs.csv.gz") == "csv"
+    assert tableIO.getTableFormat("cnvs.txt") == "tsv"
+    assert tableIO.getTableFormat("cnvs.txt", table_format="parquet") == "parquet"
+    with pytest.raises(Exception):
+        tableIO.getTableFormat("cnvs.txt", table_format="xlsx")
+
+
+@pytest.mark.parametrize("file_name", ["cnvs.parquet", "cnvs.feather"])
+def test_columnar_tables_keep_types(cnvs, tmp_path, file_name):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / file_name)
+    tableIO.writeTable(cnvs, path)
+    pd.testing.assert_frame_equal(tableIO.readTable(path), cnvs)
+    pd.testing.assert_frame_equal(tableIO.readTable(path, columns=["START"]), cnvs[["START"]])
+
+
+@pytest.mark.parametrize("file_name", ["cnvs.tsv", "cnvs.csv", "cnvs.parquet", "cnvs.feather"])
+def test_chunked_tables(cnvs, tmp_path, file_name):
+    if not file_name.endswith("sv"):
+        pytest.importorskip("pyarrow")
+    path = str(tmp_path / file_name)
+    with tableIO.ChunkedTableWriter(path) as writer:
+        writer.write(cnvs.iloc[:2])
+        writer.write(cnvs.iloc[2:])
+    assert writer.nb_rows == 5
+    chunks = list(tableIO.readTableByChunks(path, chunk_size=2))
+    assert [chunk.shape[0] for chunk in chunks] == [2, 2, 1]
+    table = pd.concat(chunks, ignore_index=True)
+    assert table.START.tolist() == cnvs.START.tolist()
+    assert table.CHR.astype(str).tolist() == cnvs.CHR.astype(str).tolist()